@@ -22,6 +22,11 @@ login_manager.login_message_category = 'info'
 # Import routes and auth after app creation to avoid circular imports
 from auth import *
 from routes import *
+from bulk_punches import *
+from export_jobs import *
+from live_dashboard import *
+from kiosk import *
+from metrics import *
 from database import init_db
 
 # Initialize database
@@ -0,0 +1,202 @@
+"""Arquivo anual dos pontos em bancos SQLite separados.
+
+Os anos fechados saem da tabela pontos do banco principal para um arquivo
+por ano (pontos_2024.db, pontos_2025.db, ...) em ARCHIVE_DIR, que por padrão
+é a pasta do banco principal. O banco principal fica só com o período atual
+e a tabela quente cabe no page cache; a tabela arquivos_pontos lista os anos
+já arquivados.
+
+As consultas que leem pontos por período usam segment_rows: o período é
+dividido em trechos, cada ano arquivado é um trecho, e cada trecho é lido da
+sua fonte. O arquivo do ano é anexado (ATTACH) à conexão só quando um
+trecho precisa dele. Se a tabela quente ainda tiver pontos daquele ano
+(arquivamento em andamento ou ponto lançado depois), a fonte é um UNION ALL
+das duas tabelas, em que o arquivo ignora os ids que ainda estão na quente.
+O SQLite empurra o filtro de data para dentro de cada lado do UNION ALL,
+então cada banco usa os próprios índices. Nenhum trecho anexa mais de um
+arquivo, e os anexos ficam na conexão do pool para as próximas consultas.
+
+O arquivamento (archive_year) copia e remove um mês por vez, com commit a
+cada passo, para que os pontos continuem sendo registrados enquanto roda.
+
+archive_year roda pelo comando `flask archive-pontos`; a leitura por trechos
+recebe qualquer conexão, inclusive as somente leitura dos jobs de exportação.
+"""
+import os
+
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR')
+# Arquivos anexados ao mesmo tempo por conexão (o limite do SQLite é 10)
+MAX_ATTACHED_ARCHIVES = int(os.environ.get('MAX_ATTACHED_ARCHIVES', 8))
+
+PONTOS_COLUMNS = 'id, usuario_id, data, tipo, hora, observacao, created_at'
+
+# Linhas lidas do cursor por vez em segment_rows
+FETCH_ROWS = 1000
+
+# Limites usados quando a consulta não tem início ou fim
+FIRST_DAY = '0001-01-01'
+LAST_DAY = '9999-12-31'
+
+# Mesmas colunas e índices da tabela pontos do banco principal
+ARCHIVE_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS {schema}.pontos (
+        id INTEGER PRIMARY KEY,
+        usuario_id INTEGER NOT NULL,
+        data DATE NOT NULL,
+        tipo TEXT NOT NULL CHECK (tipo IN ('entrada', 'saida_almoco', 'volta_almoco', 'saida_final')),
+        hora TIME NOT NULL,
+        observacao TEXT,
+        created_at TIMESTAMP
+    )
+    ''',
+    'CREATE UNIQUE INDEX IF NOT EXISTS {schema}.uq_pontos_usuario_data_tipo ON pontos (usuario_id, data, tipo)',
+    'CREATE INDEX IF NOT EXISTS {schema}.idx_pontos_data_hora ON pontos (data, hora)',
+    'CREATE INDEX IF NOT EXISTS {schema}.idx_pontos_usuario_data_hora ON pontos (usuario_id, data, hora)',
+    'CREATE INDEX IF NOT EXISTS {schema}.idx_pontos_data_usuario_tipo_hora ON pontos (data, usuario_id, tipo, hora)',
+]
+
+def archive_filename(year):
+    return f'pontos_{year}.db'
+
+def archive_dir(db):
+    """ARCHIVE_DIR ou a pasta do banco principal da conexão"""
+    if ARCHIVE_DIR:
+        return ARCHIVE_DIR
+    main = next(row for row in db.execute('PRAGMA database_list') if row[1] == 'main')
+    return os.path.dirname(main[2])
+
+def attach_archive(db, year):
+    """Anexa o arquivo do ano à conexão (se ainda não estiver) e retorna o nome do schema.
+
+    Não pode rodar dentro de uma transação. Passando de
+    MAX_ATTACHED_ARCHIVES, os outros arquivos anexados são desanexados.
+    """
+    schema = f'arquivo_{int(year)}'
+    attached = [row[1] for row in db.execute('PRAGMA database_list') if row[1].startswith('arquivo_')]
+    if schema in attached:
+        return schema
+    for other in attached[:max(0, len(attached) - MAX_ATTACHED_ARCHIVES + 1)]:
+        db.execute(f'DETACH DATABASE {other}')
+    db.execute(f'ATTACH DATABASE ? AS {schema}',
+               (os.path.join(archive_dir(db), archive_filename(year)),))
+    return schema
+
+def archived_years(db, start_date_db=FIRST_DAY, end_date_db=LAST_DAY):
+    """Anos arquivados que têm algum dia entre as datas (YYYY-MM-DD), em ordem crescente"""
+    return [row[0] for row in db.execute('''
+        SELECT ano FROM arquivos_pontos
+        WHERE printf('%04d-12-31', ano) >= ? AND printf('%04d-01-01', ano) <= ?
+        ORDER BY ano
+    ''', (start_date_db, end_date_db))]
+
+def archive_source(db, year):
+    """Fonte dos pontos de um ano arquivado, para usar no FROM"""
+    schema = attach_archive(db, year)
+    hot = db.execute('SELECT 1 FROM pontos WHERE data BETWEEN ? AND ? LIMIT 1',
+                     (f'{year}-01-01', f'{year}-12-31')).fetchone()
+    if not hot:
+        return f'{schema}.pontos'
+    return f'''(
+        SELECT {PONTOS_COLUMNS} FROM main.pontos
+        UNION ALL
+        SELECT {PONTOS_COLUMNS} FROM {schema}.pontos a
+        WHERE NOT EXISTS (SELECT 1 FROM main.pontos h WHERE h.id = a.id)
+    )'''
+
+def pontos_segments(db, start_date_db=None, end_date_db=None, newest_first=False):
+    """Divide o período em trechos e gera (início, fim, fonte) de cada um.
+
+    Cada ano arquivado vira um trecho próprio; os intervalos entre eles são
+    lidos só da tabela quente. Sem anos arquivados no período há um único
+    trecho com a tabela pontos. A fonte de cada trecho (e o ATTACH do
+    arquivo) só é resolvida quando o trecho é consumido.
+    """
+    start = start_date_db or FIRST_DAY
+    end = end_date_db or LAST_DAY
+    segments = []
+    cursor = start
+    for year in archived_years(db, start, end):
+        year_start, year_end = max(start, f'{year:04d}-01-01'), min(end, f'{year:04d}-12-31')
+        if cursor < year_start:
+            segments.append((cursor, f'{year - 1:04d}-12-31', None))
+        segments.append((year_start, year_end, year))
+        cursor = f'{year + 1:04d}-01-01'
+    if cursor <= end:
+        segments.append((cursor, end, None))
+
+    if newest_first:
+        segments.reverse()
+    for first, last, year in segments:
+        yield first, last, 'pontos' if year is None else archive_source(db, year)
+
+def segment_rows(db, sql, params=(), start_date_db=None, end_date_db=None, newest_first=False):
+    """Executa ``sql`` em cada trecho do período e gera as linhas de todos.
+
+    ``sql`` lê de ``{pontos}`` e os dois primeiros parâmetros são o início e
+    o fim do trecho (``p.data BETWEEN ? AND ?``); ``params`` vêm depois. Com
+    ``ORDER BY data`` na consulta, ``newest_first`` deve acompanhar a ordem.
+    """
+    for first, last, source in pontos_segments(db, start_date_db, end_date_db, newest_first):
+        cursor = db.execute(sql.format(pontos=source), (first, last, *params))
+        rows = cursor.fetchmany(FETCH_ROWS)
+        while rows:
+            yield from rows
+            rows = cursor.fetchmany(FETCH_ROWS)
+
+def archive_year(db, year):
+    """Move os pontos de ``year`` para o arquivo do ano e retorna quantos saíram da tabela quente.
+
+    Cada mês é copiado (commit no arquivo) e só então removido do banco
+    principal (commit no principal). Entre os dois passos o UNION ALL de
+    archive_source não duplica nada, e se o processo parar no meio basta
+    rodar de novo. Pontos lançados depois do arquivamento são movidos na
+    próxima execução. O resumo_diario dos dias arquivados continua no banco
+    principal.
+    """
+    schema = attach_archive(db, year)
+    for statement in ARCHIVE_SCHEMA:
+        db.execute(statement.format(schema=schema))
+    db.execute(f'PRAGMA {schema}.journal_mode = WAL')
+    db.execute('INSERT INTO arquivos_pontos (ano, arquivo) VALUES (?, ?) ON CONFLICT (ano) DO NOTHING',
+               (year, archive_filename(year)))
+    db.commit()
+
+    moved = 0
+    for month in range(1, 13):
+        first, last = f'{year:04d}-{month:02d}-01', f'{year:04d}-{month:02d}-31'
+        db.execute(f'''
+            INSERT OR IGNORE INTO {schema}.pontos ({PONTOS_COLUMNS})
+            SELECT {PONTOS_COLUMNS} FROM main.pontos WHERE data BETWEEN ? AND ?
+        ''', (first, last))
+        db.commit()
+
+        # A linha em arquivamento faz o trigger de pontos manter o
+        # resumo_diario desses dias; ela sai na mesma transação
+        try:
+            db.execute('INSERT INTO main.arquivamento (ano) VALUES (?)', (year,))
+            moved += db.execute(f'''
+                DELETE FROM main.pontos
+                WHERE data BETWEEN ? AND ?
+                  AND id IN (SELECT id FROM {schema}.pontos WHERE data BETWEEN ? AND ?)
+            ''', (first, last, first, last)).rowcount
+            db.execute('DELETE FROM main.arquivamento WHERE ano = ?', (year,))
+            db.execute(f'''
+                UPDATE arquivos_pontos
+                SET linhas = (SELECT COUNT(*) FROM {schema}.pontos), updated_at = CURRENT_TIMESTAMP
+                WHERE ano = ?
+            ''', (year,))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    return moved
+
+def closed_years(db, today):
+    """Anos anteriores ao de ``today`` que ainda têm pontos na tabela quente"""
+    row = db.execute('SELECT MIN(data) FROM pontos WHERE data < ?', (f'{today.year:04d}-01-01',)).fetchone()
+    if not row[0]:
+        return []
+    return [year for year in range(int(row[0][:4]), today.year)
+            if db.execute('SELECT 1 FROM pontos WHERE data BETWEEN ? AND ? LIMIT 1',
+                          (f'{year:04d}-01-01', f'{year:04d}-12-31')).fetchone()]
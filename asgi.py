@@ -0,0 +1,350 @@
+"""Modo de atendimento assíncrono (ASGI).
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000 --workers 2 \
+        --proxy-headers --forwarded-allow-ips 127.0.0.1
+
+As rotas quentes (/punch, /employee, /admin/status e /admin/stream) são
+atendidas por corrotinas, sem prender um thread enquanto esperam. As demais
+rotas vão para o app Flask de sempre, executado em ASYNC_WSGI_THREADS
+threads, então um único servidor ASGI serve a aplicação inteira.
+
+Acesso ao banco: as consultas rodam em ASYNC_DB_THREADS threads com
+conexões do pool de leitura, e os pontos vão para o thread de group commit
+de punch_writer.py (sempre, independente de PUNCH_GROUP_COMMIT): a
+requisição aguarda o Future do seu ponto sem ocupar thread nenhum.
+
+Atrás de um proxy: --proxy-headers faz o uvicorn usar o X-Forwarded-For e o
+X-Forwarded-Proto de quem está em --forwarded-allow-ips (o IP do proxy), e o
+environ das rotas assíncronas passa pelo mesmo ProxyFix de app.py que as
+rotas do Flask (X-Forwarded-Proto e X-Forwarded-Host), então
+request.remote_addr, o esquema e url_for(_external=True) saem iguais nos
+dois caminhos.
+
+Login: a sessão é o mesmo cookie assinado do Flask e o usuário é resolvido
+pelo Flask-Login com o user_loader de auth.py, em um contexto de requisição
+do próprio app; as mensagens (flash) e a renderização dos templates também,
+nos threads de ASYNC_WSGI_THREADS, fora do event loop: uma página lenta não
+atrasa os streams e os pontos das outras conexões. Quem faz login pelo Flask continua logado nas rotas assíncronas e vice-versa.
+
+Um stream SSE parado é só uma corrotina esperando a sua fila, alimentada
+pelo thread do LiveFeed de live_dashboard.py, então milhares de painéis
+abertos cabem em um processo. As rotas assíncronas não passam pelos
+histogramas de metrics.py.
+"""
+import asyncio
+import contextvars
+import functools
+import io
+import os
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import g, flash, redirect, render_template, session, url_for, jsonify
+from flask_login import current_user
+from werkzeug.http import parse_etags
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from app import app, login_manager
+from database import READ_POOL_SIZE, read_pool
+from live_dashboard import (LIVE_HEARTBEAT, LIVE_POLL_INTERVAL, LIVE_QUEUE_SIZE, get_employees_today,
+                            live_feed, sse_event, status_etag, status_response)
+from punch_writer import punch_writer
+from routes import PUNCH_NAMES, get_brasilia_date, get_employee_day, next_punch_params
+
+ASYNC_DB_THREADS = int(os.environ.get('ASYNC_DB_THREADS', READ_POOL_SIZE))
+ASYNC_WSGI_THREADS = int(os.environ.get('ASYNC_WSGI_THREADS', 8))
+
+db_executor = ThreadPoolExecutor(ASYNC_DB_THREADS, thread_name_prefix='async-db')
+wsgi_executor = ThreadPoolExecutor(ASYNC_WSGI_THREADS, thread_name_prefix='async-wsgi')
+
+# --- Acesso ao banco ---
+
+def _with_read_connection(query, args):
+    db = read_pool.acquire()
+    try:
+        return query(db, *args)
+    finally:
+        read_pool.release(db)
+
+async def read(query, *args):
+    """Roda ``query(db, *args)`` em um thread com uma conexão do pool de leitura"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, _with_read_connection, query, args)
+
+# --- Ponte com o Flask ---
+
+def _proxied(environ, start_response):
+    return environ
+
+# Mesmos cabeçalhos X-Forwarded-* que app.py confia para as rotas do Flask
+proxy_fix = ProxyFix(_proxied, **{
+    name: getattr(app.wsgi_app, name, 0) for name in ('x_for', 'x_proto', 'x_host', 'x_port', 'x_prefix')
+})
+
+def wsgi_environ(scope, body):
+    """environ WSGI equivalente ao ``scope`` HTTP do ASGI"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-type':
+            key = 'CONTENT_TYPE'
+        elif name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    # O corpo já foi lido inteiro (inclusive se veio em chunked)
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+def proxied_environ(scope, body):
+    """wsgi_environ depois do ProxyFix, como o Flask o vê pelo app.wsgi_app"""
+    return proxy_fix(wsgi_environ(scope, body), None)
+
+async def read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    return bytes(body)
+
+def response_start(status, headers):
+    return {'type': 'http.response.start', 'status': status,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]}
+
+async def send_response(send, response):
+    await send(response_start(response.status_code, response.headers.to_wsgi_list()))
+    await send({'type': 'http.response.body', 'body': response.get_data()})
+
+def open_request(environ):
+    """Resolve o usuário logado pelo Flask-Login (roda em um thread).
+
+    Retorna (usuário ou None, formulário, sessão alterada ou None); o
+    Flask-Login pode mexer na sessão (cookie "lembrar-me", proteção de
+    sessão), e essas alterações são gravadas na resposta por render.
+    """
+    with app.request_context(environ) as ctx:
+        user = current_user._get_current_object()
+        form = ctx.request.form.to_dict() if ctx.request.method == 'POST' else {}
+        changed = dict(session) if session.modified else None
+        return (user if user.is_authenticated else None), form, changed
+
+def render(state, view, *args, **kwargs):
+    """Roda ``view(*args, **kwargs)`` no contexto de requisição do Flask e retorna a Response.
+
+    O usuário já resolvido por open_request vira o current_user, então nada
+    aqui consulta o banco; a sessão (com as mensagens de flash) é gravada
+    no cookie da resposta como o Flask faria.
+    """
+    environ, user, form, changed = state
+    with app.request_context(environ) as ctx:
+        if changed is not None:
+            ctx.session.clear()
+            ctx.session.update(changed)
+        g._login_user = user if user is not None else login_manager.anonymous_user()
+        response = app.make_response(view(*args, **kwargs))
+        app.session_interface.save_session(app, ctx.session, response)
+        return response
+
+async def respond(state, view, *args, **kwargs):
+    """render em um thread de ASYNC_WSGI_THREADS: templates e views não prendem o event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(wsgi_executor, functools.partial(render, state, view, *args, **kwargs))
+
+async def call_wsgi(scope, receive, send):
+    """Atende a requisição pelo app Flask em um thread, repassando a resposta em partes"""
+    environ = wsgi_environ(scope, await read_body(receive))
+    loop = asyncio.get_running_loop()
+    # O mesmo contexto em todos os passos, para o stream_with_context das exportações
+    context = contextvars.copy_context()
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = headers
+
+    def run():
+        iterable = app(environ, start_response)
+        return iterable, iter(iterable)
+
+    iterable, chunks = await loop.run_in_executor(wsgi_executor, context.run, run)
+    try:
+        await send(response_start(started['status'], started['headers']))
+        while True:
+            chunk = await loop.run_in_executor(wsgi_executor, context.run, next, chunks, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(iterable, 'close'):
+            await loop.run_in_executor(wsgi_executor, context.run, iterable.close)
+
+# --- Rotas assíncronas ---
+
+async def employee_dashboard(state):
+    user = state[1]
+    if user is None:
+        return await respond(state, login_manager.unauthorized)
+    if user.perfil != 'colaborador':
+        return await respond(state, redirect_to, 'admin_dashboard')
+
+    today_punches, next_punch = await read(get_employee_day, user.id, get_brasilia_date().strftime('%Y-%m-%d'))
+    return await respond(state, render_template, 'employee_dashboard.html',
+                  today_punches=today_punches, next_punch=next_punch,
+                  today=get_brasilia_date().strftime('%d-%m-%Y'))
+
+async def register_punch(state):
+    user, form = state[1], state[2]
+    if user is None:
+        return await respond(state, login_manager.unauthorized)
+    if user.perfil != 'colaborador':
+        return await respond(state, flash_redirect, 'Acesso negado!', 'danger', 'admin_dashboard')
+
+    params = next_punch_params(user.id, form.get('observacao', '').strip())
+    try:
+        inserted = await asyncio.wrap_future(punch_writer.submit(params))
+    except sqlite3.IntegrityError:
+        return await respond(state, flash_redirect, 'Este ponto já foi registrado!', 'warning', 'employee_dashboard')
+    except Exception as e:
+        app.logger.error(f'Error registering punch: {e}')
+        return await respond(state, flash_redirect, 'Erro ao registrar ponto!', 'danger', 'employee_dashboard')
+
+    if not inserted:
+        return await respond(state, flash_redirect, 'Todos os pontos do dia já foram registrados!', 'warning',
+                      'employee_dashboard')
+    return await respond(state, flash_redirect,
+                  f'{PUNCH_NAMES[inserted["tipo"]]} registrada com sucesso às {inserted["hora"]}!', 'success',
+                  'employee_dashboard')
+
+async def admin_status(state):
+    environ, user = state[0], state[1]
+    if user is None:
+        return await respond(state, login_manager.unauthorized)
+    if user.perfil != 'admin':
+        return await respond(state, access_denied)
+
+    today_db = get_brasilia_date().strftime('%Y-%m-%d')
+    etag = await read(status_etag, today_db)
+    if etag in parse_etags(environ.get('HTTP_IF_NONE_MATCH')):
+        return await respond(state, status_response, etag)
+    employees = await read(get_employees_today, today_db)
+    return await respond(state, status_response, etag, employees)
+
+async def admin_stream(state, receive, send):
+    """Fluxo SSE com os pontos registrados hoje, sem thread por conexão"""
+    user = state[1]
+    if user is None or user.perfil != 'admin':
+        await send_response(send, await respond(state, login_manager.unauthorized if user is None else access_denied))
+        return
+
+    subscriber = live_feed.subscribe(AsyncSubscriber(asyncio.get_running_loop()))
+    disconnected = asyncio.ensure_future(receive())
+    try:
+        await send(response_start(200, [('Content-Type', 'text/event-stream'), ('Cache-Control', 'no-cache'),
+                                        ('X-Accel-Buffering', 'no')]))
+        chunk = f'retry: {int(LIVE_POLL_INTERVAL * 1000)}\n\n'
+        while True:
+            await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+            event = asyncio.ensure_future(subscriber.queue.get())
+            done, pending = await asyncio.wait({event, disconnected}, timeout=LIVE_HEARTBEAT,
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                event.cancel()
+                return
+            if event in done:
+                chunk = sse_event(*event.result())
+            else:
+                # Comentário SSE: mantém a conexão aberta atrás de proxies
+                event.cancel()
+                chunk = ': ping\n\n'
+    finally:
+        live_feed.unsubscribe(subscriber)
+        disconnected.cancel()
+
+def redirect_to(endpoint):
+    return redirect(url_for(endpoint))
+
+def flash_redirect(message, category, endpoint):
+    flash(message, category)
+    return redirect(url_for(endpoint))
+
+def access_denied():
+    return jsonify({'error': 'Acesso negado!'}), 403
+
+class AsyncSubscriber:
+    """Fila de um stream SSE assíncrono, alimentada pelo thread do LiveFeed"""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=LIVE_QUEUE_SIZE)
+
+    def put_nowait(self, item):
+        self.loop.call_soon_threadsafe(self._put, item)
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # Navegador lento: descarta a fila e pede para recarregar tudo
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(('reset', {}))
+
+ASYNC_ROUTES = {
+    ('GET', '/employee'): employee_dashboard,
+    ('POST', '/punch'): register_punch,
+    ('GET', '/admin/status'): admin_status,
+}
+
+async def application(scope, receive, send):
+    """Aplicação ASGI: rotas quentes em corrotinas, o resto pelo Flask"""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    key = (scope['method'], scope['path'])
+    if key not in ASYNC_ROUTES and key != ('GET', '/admin/stream'):
+        await call_wsgi(scope, receive, send)
+        return
+
+    loop = asyncio.get_running_loop()
+    # Depois do corpo, o próximo receive() só volta quando o cliente desconectar
+    environ = proxied_environ(scope, await read_body(receive))
+    user, form, changed = await loop.run_in_executor(db_executor, open_request, environ)
+    state = (environ, user, form, changed)
+    if key == ('GET', '/admin/stream'):
+        await admin_stream(state, receive, send)
+    else:
+        await send_response(send, await ASYNC_ROUTES[key](state))
@@ -1,8 +1,96 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
 from flask_login import UserMixin
 from flask import current_app
-from database import get_db
+from database import get_read_db
 from app import login_manager
 
+# Cache of User objects used by the user_loader (per worker process)
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 300))
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+# How often to look for user changes made by other workers (0 disables)
+USER_CACHE_CHECK_INTERVAL = float(os.environ.get('USER_CACHE_CHECK_INTERVAL', 5))
+
+class UserCache:
+    """TTL + LRU cache of User objects keyed by id.
+    
+    Entries expire after ``ttl`` seconds and the least recently used ones are
+    evicted beyond ``max_size``. Changes made by this worker invalidate the
+    entry directly; changes made by other workers are picked up through the
+    ``version_keys`` of versoes_datas ('*', bumped by the usuarios triggers,
+    by default), read at most once every ``check_interval`` seconds.
+    """
+    
+    def __init__(self, ttl=USER_CACHE_TTL, max_size=USER_CACHE_SIZE,
+                 check_interval=USER_CACHE_CHECK_INTERVAL, version_keys=('*',)):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.check_interval = check_interval
+        self.version_keys = tuple(version_keys)
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+        self._version = None
+        self._checked_at = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry and entry[0] > now:
+                self._users.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+    
+    def put(self, user_id, user):
+        with self._lock:
+            self._users[user_id] = (time.monotonic() + self.ttl, user)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+    
+    def invalidate(self, user_id=None):
+        """Drop one user, or every user when ``user_id`` is None"""
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(str(user_id), None)
+    
+    def check_version(self, connect):
+        """Clear the cache if another worker bumped one of the version keys since the last check.
+        
+        ``connect`` returns the connection to read versoes_datas from; it is
+        only called when a check is due, so cache hits between checks never
+        touch the database.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if not self.check_interval or now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+        placeholders = ', '.join('?' * len(self.version_keys))
+        version = connect().execute(
+            f'SELECT COALESCE(MAX(versao), 0) FROM versoes_datas WHERE data IN ({placeholders})',
+            self.version_keys
+        ).fetchone()[0]
+        with self._lock:
+            if self._version is not None and version != self._version:
+                self._users.clear()
+            self._version = version
+    
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._users), 'hits': self.hits, 'misses': self.misses}
+
+user_cache = UserCache()
+
 class User(UserMixin):
     def __init__(self, id, nome, cpf, funcao, login, perfil):
         self.id = id
@@ -14,13 +102,20 @@ class User(UserMixin):
     
     @staticmethod
     def get(user_id):
-        db = get_db()
+        user_id = str(user_id)
+        if user_cache.ttl > 0:
+            user_cache.check_version(get_read_db)
+            user = user_cache.get(user_id)
+            if user:
+                return user
+        
+        db = get_read_db()
         user_data = db.execute(
             'SELECT * FROM usuarios WHERE id = ?', (user_id,)
         ).fetchone()
         
         if user_data:
-            return User(
+            user = User(
                 id=user_data['id'],
                 nome=user_data['nome'],
                 cpf=user_data['cpf'],
@@ -28,11 +123,14 @@ class User(UserMixin):
                 login=user_data['login'],
                 perfil=user_data['perfil']
             )
+            if user_cache.ttl > 0:
+                user_cache.put(user_id, user)
+            return user
         return None
     
     @staticmethod
     def get_by_login(login):
-        db = get_db()
+        db = get_read_db()
         user_data = db.execute(
             'SELECT * FROM usuarios WHERE login = ?', (login,)
         ).fetchone()
@@ -51,7 +149,7 @@ class User(UserMixin):
     @staticmethod
     def check_password(login, password):
         from werkzeug.security import check_password_hash
-        db = get_db()
+        db = get_read_db()
         user_data = db.execute(
             'SELECT senha FROM usuarios WHERE login = ?', (login,)
         ).fetchone()
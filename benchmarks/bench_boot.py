@@ -0,0 +1,180 @@
+"""Boot benchmark: how long a fresh worker takes to import the app.
+
+Every measurement runs in a new interpreter, like a gunicorn worker spawn or
+an autoscaling cold start. For the database in ``--dir`` (default: a new,
+empty one in a temp dir) it reports:
+
+- the first start, which creates the schema (only with an empty database);
+- ``import app`` with the schema already at SCHEMA_VERSION, both timed inside
+  the process and as the whole process wall time;
+- what a forced ``init_db`` costs on that database (the work now skipped);
+- cumulative ``-X importtime`` of the app modules and the heavy libraries,
+  and which heavy libraries are already loaded after boot.
+
+Results can be saved as JSON and compared against an earlier baseline, like
+bench_routes.py.
+
+Usage:
+    python benchmarks/bench_boot.py --runs 10 --output boot.json
+    python benchmarks/bench_boot.py --dir /var/tmp/bench/100k --compare boot.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from generate_data import load_app
+
+# Libraries only the reports and exports need
+HEAVY_MODULES = ['numpy', 'reportlab', 'openpyxl']
+APP_MODULES = sorted(name[:-3] for name in os.listdir(ROOT) if name.endswith('.py'))
+
+IMPORTTIME_LINE = re.compile(r'import time:\s+\d+ \|\s+(\d+) \|(\s*)(\S+)')
+
+
+def run_worker(workdir, force_init):
+    """Import the app in this fresh process; returns a dict of timings in ms."""
+    start = time.perf_counter()
+    app = load_app(workdir)
+    boot_ms = (time.perf_counter() - start) * 1000
+    heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    result = {'boot_ms': round(boot_ms, 1), 'heavy_modules': heavy}
+    if force_init:
+        from database import init_db
+        with app.app_context():
+            start = time.perf_counter()
+            init_db(force=True)
+            result['init_db_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+def spawn_worker(workdir, force_init=False):
+    command = [sys.executable, os.path.abspath(__file__), '--worker', workdir]
+    if force_init:
+        command.append('--force-init')
+    start = time.perf_counter()
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+def import_times(workdir):
+    """Cumulative import time (ms) of the app modules and heavy libraries."""
+    command = [sys.executable, '-X', 'importtime', '-c',
+               f'import sys; sys.path.insert(0, {ROOT!r}); '
+               'import logging; logging.disable(logging.CRITICAL); import app']
+    stderr = subprocess.run(command, cwd=workdir, check=True, capture_output=True, text=True).stderr
+    times = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match and match.group(3) in APP_MODULES + HEAVY_MODULES:
+            times[match.group(3)] = round(int(match.group(1)) / 1000, 1)
+    return times
+
+
+def summarize(runs, key):
+    values = sorted(run[key] for run in runs)
+    return {'best_ms': values[0], 'median_ms': values[len(values) // 2]}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(workdir, runs):
+    results = {}
+    if not os.path.exists(os.path.join(workdir, 'timetracking.db')):
+        results['first_start'] = spawn_worker(workdir)
+
+    boots = [spawn_worker(workdir) for _ in range(runs)]
+    results['boot'] = summarize(boots, 'boot_ms')
+    results['process'] = summarize(boots, 'process_ms')
+    results['heavy_modules'] = boots[-1]['heavy_modules']
+    results['init_db_forced'] = summarize([spawn_worker(workdir, True) for _ in range(runs)], 'init_db_ms')
+    results['import_ms'] = import_times(workdir)
+    return results
+
+
+def print_results(results):
+    if 'first_start' in results:
+        print(f'primeira inicialização (cria o schema): {results["first_start"]["boot_ms"]:.0f} ms')
+    for label, key in (('import app', 'boot'), ('processo inteiro', 'process'),
+                       ('init_db forçado', 'init_db_forced')):
+        print(f'{label:<40}melhor {results[key]["best_ms"]:>7.1f} ms   mediana {results[key]["median_ms"]:>7.1f} ms')
+    print(f'bibliotecas pesadas carregadas no boot: {", ".join(results["heavy_modules"]) or "nenhuma"}')
+    print('\nimport (acumulado):')
+    for name, ms in sorted(results['import_ms'].items(), key=lambda item: -item[1]):
+        print(f'  {name:<20}{ms:>8.1f} ms')
+
+
+def compare(results, baseline, threshold):
+    """Print the boot changes; returns True when the median boot regressed."""
+    before, after = baseline['boot']['median_ms'], results['boot']['median_ms']
+    ratio = after / before if before else 1
+    print(f'\nComparação com {baseline["meta"].get("revision") or "baseline"}: '
+          f'import app {before:.1f} -> {after:.1f} ms ({ratio:.2f}x)')
+    new_heavy = sorted(set(results['heavy_modules']) - set(baseline['heavy_modules']))
+    if new_heavy:
+        print(f'novas bibliotecas pesadas no boot: {", ".join(new_heavy)}')
+    return ratio > 1 + threshold or bool(new_heavy)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dir', help='directory holding timetracking.db (default: new empty database)')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed median boot slowdown before flagging a regression')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--force-init', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.force_init)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = os.path.abspath(args.dir or tmp)
+        results = measure(workdir, args.runs)
+
+    results['meta'] = {
+        'revision': git_revision(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'runs': args.runs,
+        'database': args.dir,
+    }
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'\nResultados salvos em {args.output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(results, json.load(f), args.threshold):
+                print('Inicialização mais lenta que o baseline.')
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Scaling benchmark for the bulk timesheet ZIP (bulk_timesheets.build_timesheets).
+
+Generates (or reuses) a synthetic database and builds every employee's
+timesheet for the last ``--days`` working days once per worker count, so
+the speedup over one process can be compared with the number of cores.
+
+Usage:
+    python benchmarks/bench_bulk_timesheets.py --employees 500 --workers 1,2,4,8
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from generate_data import generate, load_app, working_days
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dir', help='directory holding timetracking.db (default: temp dir)')
+    parser.add_argument('--employees', type=int, default=500)
+    parser.add_argument('--days', type=int, default=22)
+    parser.add_argument('--workers', default=f'1,{os.cpu_count() or 1}',
+                        help='comma-separated worker counts to try')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        load_app(os.path.abspath(args.dir or tmp))
+        from bulk_timesheets import build_timesheets
+        from database import pool
+        from routes import get_brasilia_date
+
+        db = pool.acquire()
+        try:
+            if not db.execute("SELECT 1 FROM usuarios WHERE login = 'bench1'").fetchone():
+                generate(db, args.employees, args.days)
+
+            days = working_days(args.days, get_brasilia_date())
+            params = {'start_date': days[0].strftime('%d-%m-%Y'), 'end_date': days[-1].strftime('%d-%m-%Y')}
+            baseline = None
+            for workers in sorted({int(w) for w in args.workers.split(',') if w.strip()}):
+                output = io.BytesIO()
+                start = time.perf_counter()
+                build_timesheets(db, params, output, workers=workers)
+                elapsed = time.perf_counter() - start
+                baseline = baseline or elapsed
+                print(f'{workers:>3} processo(s): {elapsed:6.1f}s  '
+                      f'({baseline / elapsed:.1f}x, ZIP de {len(output.getvalue()) / 1024 / 1024:.1f} MB)')
+        finally:
+            pool.release(db)
+
+
+if __name__ == '__main__':
+    main()
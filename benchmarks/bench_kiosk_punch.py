@@ -0,0 +1,115 @@
+"""Throughput benchmark for the kiosk punch endpoint.
+
+Creates a throwaway database with ``--employees`` colaboradores, each with a
+badge and PIN, registers one kiosk device and sends punches to
+``/kiosk/punch`` through the Flask test client (one worker, no network),
+then does the same with ``/login`` + ``/punch`` for comparison.
+``--group-commit`` runs the same rounds with the punches batched by
+punch_writer.py.
+
+Usage:
+    python benchmarks/bench_kiosk_punch.py --employees 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app(workdir):
+    """Import the app with its relative DATABASE path pointing at workdir."""
+    sys.path.insert(0, ROOT)
+    os.chdir(workdir)
+    import logging
+    logging.disable(logging.CRITICAL)
+    from app import app
+    return app
+
+
+def create_employees(app, count):
+    from werkzeug.security import generate_password_hash
+    from database import pool
+    import kiosk
+
+    db = pool.acquire()
+    senha = generate_password_hash('senha')
+    db.executemany('''
+        INSERT INTO usuarios (nome, cpf, funcao, login, senha, perfil)
+        VALUES (?, ?, ?, ?, ?, 'colaborador')
+    ''', ((f'Funcionario {i}', f'{i:011d}', 'Operador', f'func{i}', senha) for i in range(1, count + 1)))
+    db.execute('''
+        INSERT INTO credenciais_quiosque (usuario_id, cracha, pin_hash)
+        SELECT id, 'C' || id, '' FROM usuarios WHERE perfil = 'colaborador'
+    ''')
+    ids = [row[0] for row in db.execute("SELECT id FROM usuarios WHERE perfil = 'colaborador'")]
+    db.executemany('UPDATE credenciais_quiosque SET pin_hash = ? WHERE usuario_id = ?',
+                   ((kiosk.hash_pin(i, '1234'), i) for i in ids))
+    db.commit()
+    pool.release(db)
+    return ids
+
+
+def register_device(app):
+    client = app.test_client()
+    client.post('/login', data={'login': 'admin', 'password': 'admin123'})
+    return client.post('/kiosk/devices', json={'nome': 'Portaria'}).get_json()['token']
+
+
+def run(label, total, workers, send):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        statuses = list(executor.map(send, range(total)))
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for status in statuses if status == 200)
+    print(f'{label:<28}{total:>7}{ok:>7}{elapsed:>10.2f}s{total / elapsed:>12.0f}/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--employees', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--login-sample', type=int, default=50,
+                        help='punches measured through /login + /punch')
+    parser.add_argument('--group-commit', action='store_true',
+                        help='write punches through the group-commit thread (PUNCH_GROUP_COMMIT=1)')
+    args = parser.parse_args()
+    if args.group_commit:
+        os.environ['PUNCH_GROUP_COMMIT'] = '1'
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = load_app(workdir)
+        ids = create_employees(app, args.employees)
+        token = register_device(app)
+        headers = {'Authorization': f'Bearer {token}'}
+
+        def kiosk_punch(i):
+            client = app.test_client()
+            badge = f'C{ids[i % len(ids)]}'
+            return client.post('/kiosk/punch', headers=headers,
+                               json={'cracha': badge, 'pin': '1234'}).status_code
+
+        def login_punch(i):
+            client = app.test_client()
+            client.post('/login', data={'login': f'func{ids[i]}', 'password': 'senha'})
+            response = client.post('/punch')
+            return 200 if response.status_code == 302 else response.status_code
+
+        print(f'{"rota":<28}{"pontos":>7}{"ok":>7}{"tempo":>11}{"vazão":>13}')
+        # Primeira rodada: entrada de todos (cache de credenciais frio)
+        run('kiosk (cache frio)', len(ids), args.threads, kiosk_punch)
+        # Segunda e terceira rodadas: saída/volta do almoço (cache quente)
+        run('kiosk (cache quente)', 2 * len(ids), args.threads, kiosk_punch)
+        run('kiosk (1 thread)', len(ids), 1, kiosk_punch)
+        run('login + punch', min(args.login_sample, len(ids)), args.threads, login_punch)
+        if args.group_commit:
+            from punch_writer import punch_writer
+            stats = punch_writer.stats()
+            print(f'\n{stats["punches"]} pontos em {stats["batches"]} commits')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Idle-connection benchmark for the ASGI serving mode (asgi.py).
+
+Drives ``asgi.application`` in-process (no server, no network) against a
+throwaway database: logs in through the Flask fallback, opens ``--streams``
+/admin/stream connections and reports how long that took, the threads and
+resident memory they cost, and how long a punch sent through the async
+/punch route takes to reach every open stream. Then ``--employees``
+colaboradores punch concurrently through /punch.
+
+Usage:
+    python benchmarks/bench_live_streams.py --streams 5000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.cookies import SimpleCookie
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from generate_data import generate, load_app
+
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+class Client:
+    """Cookie jar plus ASGI request helper for one browser."""
+
+    def __init__(self, application):
+        self.application = application
+        self.cookies = {}
+
+    def scope(self, method, path, body):
+        headers = [(b'host', b'bench'),
+                   (b'cookie', '; '.join(f'{k}={v}' for k, v in self.cookies.items()).encode())]
+        if body:
+            headers.append((b'content-type', b'application/x-www-form-urlencoded'))
+        return {'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'root_path': '',
+                'http_version': '1.1', 'scheme': 'http', 'server': ('bench', 80),
+                'client': ('127.0.0.1', 40000), 'headers': headers}
+
+    def start(self, method, path, body=b''):
+        """Start a request; returns (task, response dict, event that disconnects it)."""
+        pending = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        gone = asyncio.Event()
+        response = {'status': None, 'body': b''}
+
+        async def receive():
+            if pending:
+                return pending.pop()
+            await gone.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                for name, value in message['headers']:
+                    if name == b'set-cookie':
+                        cookie = SimpleCookie()
+                        cookie.load(value.decode('latin-1'))
+                        self.cookies.update((key, morsel.value) for key, morsel in cookie.items())
+            else:
+                response['body'] += message.get('body', b'')
+
+        task = asyncio.ensure_future(self.application(self.scope(method, path, body), receive, send))
+        return task, response, gone
+
+    async def request(self, method, path, body=b''):
+        task, response, gone = self.start(method, path, body)
+        await task
+        return response
+
+
+async def run(application, args):
+    admin = Client(application)
+    await admin.request('POST', '/login', b'login=admin&password=admin123')
+
+    threads, memory = threading.active_count(), rss_mb()
+    start = time.perf_counter()
+    streams = [admin.start('GET', '/admin/stream') for _ in range(args.streams)]
+    while any(response['status'] is None for task, response, gone in streams):
+        await asyncio.sleep(0.01)
+    opened = time.perf_counter() - start
+    print(f'{args.streams} streams abertos em {opened:.2f}s; threads +{threading.active_count() - threads}, '
+          f'RSS +{rss_mb() - memory:.0f} MB ({(rss_mb() - memory) * 1024 / args.streams:.1f} KB por stream)')
+
+    employees = []
+    for i in range(1, args.employees + 1):
+        employee = Client(application)
+        await employee.request('POST', '/login', f'login=bench{i}&password=bench'.encode())
+        employees.append(employee)
+
+    start = time.perf_counter()
+    response = await employees[0].request('POST', '/punch')
+    punched = time.perf_counter() - start
+    while sum(b'event: ' in response['body'] for task, response, gone in streams) < args.streams:
+        await asyncio.sleep(0.005)
+    delivered = time.perf_counter() - start
+    print(f'ponto registrado em {punched * 1000:.1f} ms (HTTP {response["status"]}); '
+          f'entregue aos {args.streams} streams em {delivered:.2f}s (intervalo de consulta do feed incluso)')
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(employee.request('POST', '/punch') for employee in employees[1:]))
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for response in results if response['status'] == 302)
+    print(f'{len(results)} pontos simultâneos: {ok} ok em {elapsed:.2f}s ({len(results) / elapsed:.0f}/s)')
+
+    for task, response, gone in streams:
+        gone.set()
+    await asyncio.gather(*(task for task, response, gone in streams))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--streams', type=int, default=2000)
+    parser.add_argument('--employees', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        load_app(workdir)
+        from database import pool
+        db = pool.acquire()
+        # Employees only: with no punches today every /punch records an entrada
+        generate(db, args.employees, 0)
+        pool.release(db)
+
+        from asgi import application
+        asyncio.run(run(application, args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""Before/after benchmark for the ISO date migration and pontos indexes.
+
+Builds a synthetic ``pontos`` table with legacy DD-MM-YYYY dates, times the
+dashboard, history and report queries, runs ``migrate_pontos_iso_dates`` and
+``create_pontos_indexes`` and times the same queries again.
+
+Usage:
+    python benchmarks/bench_pontos_indexes.py --punches 10000000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PUNCH_TYPES = [
+    ('entrada', '08:00:00'),
+    ('saida_almoco', '12:00:00'),
+    ('volta_almoco', '13:00:00'),
+    ('saida_final', '17:00:00'),
+]
+
+SCHEMA = '''
+    CREATE TABLE usuarios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT NOT NULL,
+        funcao TEXT NOT NULL,
+        perfil TEXT NOT NULL
+    );
+    CREATE TABLE pontos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        data DATE NOT NULL,
+        tipo TEXT NOT NULL,
+        hora TIME NOT NULL,
+        observacao TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+'''
+
+QUERIES = {
+    'dashboard_hoje': '''
+        SELECT u.nome, COUNT(CASE WHEN p.tipo = 'entrada' THEN 1 END)
+        FROM usuarios u
+        LEFT JOIN pontos p ON u.id = p.usuario_id AND p.data = :today
+        WHERE u.perfil = 'colaborador'
+        GROUP BY u.id
+    ''',
+    'pontos_do_dia': '''
+        SELECT tipo, hora FROM pontos
+        WHERE usuario_id = :user AND data = :today ORDER BY hora
+    ''',
+    'historico_usuario': '''
+        SELECT data, tipo, hora FROM pontos
+        WHERE usuario_id = :user ORDER BY data DESC, hora DESC LIMIT 100
+    ''',
+    'relatorio_mes_usuario': '''
+        SELECT data, tipo, hora FROM pontos
+        WHERE usuario_id = :user AND data BETWEEN :start AND :end
+        ORDER BY data, hora
+    ''',
+    'relatorio_mes_todos': '''
+        SELECT usuario_id, COUNT(DISTINCT data), COUNT(id) FROM pontos
+        WHERE data BETWEEN :start AND :end
+        GROUP BY usuario_id
+    ''',
+}
+
+
+def load_database_module(workdir):
+    """Import database.py with its relative DATABASE path pointing at workdir."""
+    sys.path.insert(0, ROOT)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import database
+    finally:
+        os.chdir(cwd)
+    return database
+
+
+def build_table(db, punches, employees):
+    days = max(1, punches // (employees * len(PUNCH_TYPES)))
+    first_day = date.today() - timedelta(days=days - 1)
+
+    db.executemany(
+        'INSERT INTO usuarios (id, nome, funcao, perfil) VALUES (?, ?, ?, ?)',
+        ((i, f'Funcionario {i}', 'Operador', 'colaborador') for i in range(1, employees + 1))
+    )
+
+    def rows():
+        for d in range(days):
+            legacy = (first_day + timedelta(days=d)).strftime('%d-%m-%Y')
+            for user_id in range(1, employees + 1):
+                for tipo, hora in PUNCH_TYPES:
+                    yield (user_id, legacy, tipo, hora)
+
+    db.executemany('INSERT INTO pontos (usuario_id, data, tipo, hora) VALUES (?, ?, ?, ?)', rows())
+    db.commit()
+    return days
+
+
+def time_queries(db, params, repeat):
+    results = {}
+    for name, sql in QUERIES.items():
+        plan = ' | '.join(row[3] for row in db.execute('EXPLAIN QUERY PLAN ' + sql, params))
+        start = time.perf_counter()
+        for _ in range(repeat):
+            db.execute(sql, params).fetchall()
+        results[name] = ((time.perf_counter() - start) / repeat * 1000, plan)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--punches', type=int, default=10_000_000)
+    parser.add_argument('--employees', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        database = load_database_module(workdir)
+        db = sqlite3.connect(os.path.join(workdir, 'bench.db'))
+        db.row_factory = sqlite3.Row
+        db.executescript(SCHEMA)
+
+        start = time.perf_counter()
+        days = build_table(db, args.punches, args.employees)
+        total = db.execute('SELECT COUNT(*) FROM pontos').fetchone()[0]
+        print(f'{total} pontos ({args.employees} funcionarios x {days} dias) '
+              f'gerados em {time.perf_counter() - start:.1f}s')
+
+        today = date.today()
+        month_start = today.replace(day=1)
+        legacy = {'user': args.employees // 2, 'today': today.strftime('%d-%m-%Y'),
+                  'start': month_start.strftime('%d-%m-%Y'), 'end': today.strftime('%d-%m-%Y')}
+        iso = {'user': args.employees // 2, 'today': today.isoformat(),
+               'start': month_start.isoformat(), 'end': today.isoformat()}
+
+        before = time_queries(db, legacy, args.repeat)
+
+        start = time.perf_counter()
+        database.migrate_pontos_iso_dates(db)
+        migrated = time.perf_counter() - start
+        start = time.perf_counter()
+        database.create_pontos_indexes(db)
+        db.commit()
+        indexed = time.perf_counter() - start
+        print(f'migracao: {migrated:.1f}s, indices: {indexed:.1f}s')
+
+        after = time_queries(db, iso, args.repeat)
+        db.close()
+
+    print(f'\n{"consulta":<24}{"antes (ms)":>12}{"depois (ms)":>14}')
+    for name in QUERIES:
+        print(f'{name:<24}{before[name][0]:>12.2f}{after[name][0]:>14.2f}')
+    print()
+    for name in QUERIES:
+        print(f'{name}:\n  antes:  {before[name][1]}\n  depois: {after[name][1]}')
+
+
+if __name__ == '__main__':
+    main()
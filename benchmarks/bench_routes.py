@@ -0,0 +1,269 @@
+"""Route benchmark suite: latency percentiles, peak RSS and query counts.
+
+For each scale (see generate_data.SCALES) a synthetic timetracking.db is
+generated once under ``--data-dir`` and every route below is driven through
+the Flask test client in a fresh process, logged in as admin. Results are
+printed and saved as a JSON baseline; ``--compare`` checks them against an
+earlier baseline and exits with status 1 when a route got slower than
+``--threshold``.
+
+Usage:
+    python benchmarks/bench_routes.py --scales 1k,100k --output baseline.json
+    python benchmarks/bench_routes.py --scales 1k,100k --compare baseline.json
+    python benchmarks/bench_routes.py --scales 10m --data-dir /var/tmp/bench
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from generate_data import SCALES, load_app
+
+# (name, url, heavy): heavy routes read the whole history and run fewer times
+ROUTES = [
+    ('admin_dashboard', '/admin', False),
+    ('admin_status', '/admin/status', False),
+    ('punch_history', '/punch_history', False),
+    ('punch_history_funcionario', '/punch_history?employee_id={employee_id}', False),
+    ('reports_mes', '/reports?start_date={month_start}&end_date={today}', False),
+    ('reports_funcionario', '/reports?start_date={month_start}&end_date={today}&employee_id={employee_id}', False),
+    ('print_report', '/print_report?start_date={month_start}&end_date={today}&employee_id={employee_id}', False),
+    ('export_reports_csv', '/export_reports?format=csv&start_date={month_start}&end_date={today}', False),
+    ('export_reports_excel', '/export_reports?format=excel&start_date={month_start}&end_date={today}', False),
+    ('export_reports_pdf', '/export_reports?format=pdf&start_date={month_start}&end_date={today}', False),
+    ('export_reports_pdf_funcionario',
+     '/export_reports?format=pdf&start_date={month_start}&end_date={today}&employee_id={employee_id}', False),
+    ('export_history_csv_funcionario', '/export_history?format=csv&employee_id={employee_id}', False),
+    ('export_history_excel_funcionario', '/export_history?format=excel&employee_id={employee_id}', False),
+    ('export_history_pdf_funcionario', '/export_history?format=pdf&employee_id={employee_id}', False),
+    ('export_history_csv', '/export_history?format=csv', True),
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def install_query_counter(database):
+    """Count the SQL statements run on the pools' connections (trigger steps excluded)."""
+    counter = {'queries': 0}
+    traced = set()
+
+    def count(statement):
+        if not statement.startswith('--'):
+            counter['queries'] += 1
+
+    def counting(acquire):
+        def counting_acquire(*args, **kwargs):
+            db = acquire(*args, **kwargs)
+            if id(db) not in traced:
+                db.set_trace_callback(count)
+                traced.add(id(db))
+            return db
+        return counting_acquire
+
+    for connection_pool in (database.pool, database.read_pool):
+        connection_pool.acquire = counting(connection_pool.acquire)
+    return counter
+
+
+def run_worker(workdir, iterations, heavy_iterations, pattern, warm_cache):
+    """Benchmark every route against workdir/timetracking.db; returns a dict."""
+    app = load_app(workdir)
+    import database
+    from report_cache import report_cache
+    from routes import get_brasilia_date
+
+    db = sqlite3.connect('timetracking.db')
+    punches = db.execute('SELECT COUNT(*) FROM pontos').fetchone()[0]
+    employee_id = db.execute("SELECT id FROM usuarios WHERE login = 'bench1'").fetchone()[0]
+    db.close()
+
+    today = get_brasilia_date()
+    values = {'employee_id': employee_id, 'today': today.strftime('%d-%m-%Y'),
+              'month_start': today.replace(day=1).strftime('%d-%m-%Y')}
+
+    counter = install_query_counter(database)
+    client = app.test_client()
+    client.post('/login', data={'login': 'admin', 'password': 'admin123'})
+
+    routes = {}
+    for name, url, heavy in ROUTES:
+        if pattern and not re.search(pattern, name):
+            continue
+        url = url.format(**values)
+        latencies = []
+        queries = []
+        statuses = set()
+        size = 0
+        rss_before = peak_rss_mb()
+        for _ in range(heavy_iterations if heavy else iterations):
+            if not warm_cache:
+                report_cache.clear()
+            counter['queries'] = 0
+            start = time.perf_counter()
+            try:
+                response = client.get(url)
+                size = len(response.get_data())
+                statuses.add(response.status_code)
+            except Exception as e:
+                statuses.add(type(e).__name__)
+            latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(counter['queries'])
+        routes[name] = {
+            'url': url,
+            'iterations': len(latencies),
+            'status': sorted(str(status) for status in statuses),
+            'bytes': size,
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p90_ms': round(percentile(latencies, 90), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'max_ms': round(max(latencies), 2),
+            'queries': percentile(queries, 50),
+            'peak_rss_mb': peak_rss_mb(),
+            'rss_growth_mb': round(peak_rss_mb() - rss_before, 1),
+        }
+    return {'punches': punches, 'peak_rss_mb': peak_rss_mb(), 'routes': routes}
+
+
+def ensure_data(data_dir, scale):
+    workdir = os.path.join(data_dir, scale)
+    if not os.path.exists(os.path.join(workdir, 'timetracking.db')):
+        subprocess.run([sys.executable, os.path.join(BENCH_DIR, 'generate_data.py'),
+                        '--dir', workdir, '--scale', scale], check=True)
+    return workdir
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    for scale, result in results['scales'].items():
+        print(f'\n== {scale}: {result["punches"]} pontos, pico de RSS {result["peak_rss_mb"]} MB ==')
+        print(f'{"rota":<34}{"status":>8}{"p50":>10}{"p90":>10}{"p99":>10}{"queries":>9}{"RSS+":>8}')
+        for name, route in result['routes'].items():
+            print(f'{name:<34}{",".join(route["status"]):>8}{route["p50_ms"]:>10.2f}'
+                  f'{route["p90_ms"]:>10.2f}{route["p99_ms"]:>10.2f}{route["queries"]:>9}'
+                  f'{route["rss_growth_mb"]:>8.1f}')
+
+
+def compare(results, baseline, threshold):
+    """Print p50 and query-count changes; returns the regressed routes."""
+    regressions = []
+    print(f'\nComparação com {baseline["meta"].get("revision") or "baseline"} (limite +{threshold:.0%})')
+    for scale, result in results['scales'].items():
+        previous = baseline['scales'].get(scale)
+        if not previous:
+            continue
+        for name, route in result['routes'].items():
+            before = previous['routes'].get(name)
+            if not before:
+                continue
+            ratio = route['p50_ms'] / before['p50_ms'] if before['p50_ms'] else 1
+            slower = ratio > 1 + threshold or route['queries'] > before['queries']
+            if slower:
+                regressions.append(f'{scale}/{name}')
+            print(f'{scale:>5} {name:<34}{before["p50_ms"]:>10.2f} -> {route["p50_ms"]:<10.2f}'
+                  f'{ratio:>6.2f}x  queries {before["queries"]} -> {route["queries"]}'
+                  f'{"  REGRESSÃO" if slower else ""}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', default='1k,100k',
+                        help=f'comma-separated list of {", ".join(SCALES)}')
+    parser.add_argument('--data-dir', help='where generated databases are kept (default: temp dir)')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--heavy-iterations', type=int, default=3)
+    parser.add_argument('--routes', help='regex selecting route names')
+    parser.add_argument('--warm-cache', action='store_true',
+                        help='keep the report cache between iterations')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed p50 slowdown before flagging a regression')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_worker(args.worker, args.iterations, args.heavy_iterations,
+                            args.routes, args.warm_cache)
+        print(json.dumps(result))
+        return
+
+    scales = [scale.strip() for scale in args.scales.split(',') if scale.strip()]
+    for scale in scales:
+        if scale not in SCALES:
+            parser.error(f'unknown scale {scale!r}')
+
+    results = {
+        'meta': {
+            'revision': git_revision(),
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+            'warm_cache': args.warm_cache,
+        },
+        'scales': {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = os.path.abspath(args.data_dir or tmp)
+        for scale in scales:
+            workdir = ensure_data(data_dir, scale)
+            # Each scale runs in a fresh process so peak RSS is per scale
+            command = [sys.executable, os.path.abspath(__file__), '--worker', workdir,
+                       '--iterations', str(args.iterations),
+                       '--heavy-iterations', str(args.heavy_iterations)]
+            if args.routes:
+                command += ['--routes', args.routes]
+            if args.warm_cache:
+                command.append('--warm-cache')
+            output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+            results['scales'][scale] = json.loads(output.strip().splitlines()[-1])
+
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'\nResultados salvos em {args.output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} rota(s) mais lenta(s): {", ".join(regressions)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Benchmark for the timesheet engine (timesheet.timesheet_summary).
+
+Generates (or reuses) a synthetic database with ``--employees`` colaboradores
+and ``--days`` working days of punches, then times the summary of the last
+``--days`` working days for everyone and for a single employee.
+
+With ``--max-ms`` the run fails (exit status 1) when the median of the
+everyone summary is slower than that budget, so the figure can be checked
+on the target machine instead of quoted.
+
+Usage:
+    python benchmarks/bench_timesheet.py --employees 5000 --days 22
+    python benchmarks/bench_timesheet.py --dir /var/tmp/bench5k --runs 10 --max-ms 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from generate_data import generate, load_app, working_days
+
+
+def timed_runs(runs, function):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, min(timings), sorted(timings)[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dir', help='directory holding timetracking.db (default: temp dir)')
+    parser.add_argument('--employees', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=22)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-ms', type=float, help='fail if the everyone summary median is slower')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        load_app(os.path.abspath(args.dir or tmp))
+        from database import pool
+        from routes import get_brasilia_date
+        from timesheet import timesheet_summary
+
+        db = pool.acquire()
+        try:
+            if not db.execute("SELECT 1 FROM usuarios WHERE login = 'bench1'").fetchone():
+                start = time.perf_counter()
+                punches = generate(db, args.employees, args.days)
+                print(f'{punches} pontos gerados em {time.perf_counter() - start:.1f}s')
+
+            days = working_days(args.days, get_brasilia_date())
+            start_date_db, end_date_db = days[0].isoformat(), days[-1].isoformat()
+            punches = db.execute('SELECT COUNT(*) FROM pontos WHERE data BETWEEN ? AND ?',
+                                 (start_date_db, end_date_db)).fetchone()[0]
+
+            summary, best, median = timed_runs(
+                args.runs, lambda: timesheet_summary(db, start_date_db, end_date_db))
+            print(f'{len(summary)} funcionários, {punches} pontos ({start_date_db} a {end_date_db}): '
+                  f'melhor {best:.0f} ms, mediana {median:.0f} ms')
+            if args.max_ms and median > args.max_ms:
+                raise SystemExit(f'mediana {median:.0f} ms acima do limite de {args.max_ms:.0f} ms')
+
+            employee_id = summary[0]['id']
+            _, best, median = timed_runs(
+                args.runs, lambda: timesheet_summary(db, start_date_db, end_date_db, employee_id))
+            print(f'um funcionário: melhor {best:.1f} ms, mediana {median:.1f} ms')
+        finally:
+            pool.release(db)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Synthetic data generator for timetracking.db.
+
+Fills the database in ``--dir`` (created with the app's own ``init_db``)
+with ``--employees`` colaboradores and ``--days`` working days of punches
+ending today. Punch times vary around 08:00 / 12:00 / 13:00 / 17:00, some
+employees are absent on a given day and some days are left incomplete, so
+reports and summaries see realistic data.
+
+Employees are created as ``bench1``, ``bench2``, ... with password ``bench``.
+
+Usage:
+    python benchmarks/generate_data.py --dir /tmp/bench --employees 200 --days 125
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Scales used by bench_routes.py: (employees, working days) for ~N punches
+SCALES = {
+    '1k': (10, 25),
+    '100k': (200, 125),
+    '10m': (4000, 625),
+}
+
+FUNCOES = ['Operador', 'Auxiliar Administrativo', 'Vendedor', 'Técnico', 'Supervisor']
+ABSENCE_RATE = 0.04
+INCOMPLETE_RATE = 0.03
+OBSERVACAO_RATE = 0.02
+OBSERVACOES = ['Consulta médica', 'Trânsito', 'Reunião externa', 'Hora extra autorizada']
+PUNCH_TRIGGERS = ('trg_pontos_resumo_insert', 'trg_pontos_resumo_delete',
+                  'trg_pontos_versao_insert', 'trg_pontos_versao_delete')
+
+
+def load_app(workdir):
+    """Import the app with its relative DATABASE path pointing at workdir.
+
+    Importing app runs init_db, which creates the schema in
+    ``workdir/timetracking.db``.
+    """
+    sys.path.insert(0, ROOT)
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    import logging
+    logging.disable(logging.CRITICAL)
+    from app import app
+    return app
+
+
+def working_days(days, today):
+    """The last ``days`` weekdays up to today, oldest first."""
+    result = []
+    day = today
+    while len(result) < days:
+        if day.weekday() < 5:
+            result.append(day)
+        day -= timedelta(days=1)
+    return result[::-1]
+
+
+def clock(rng, minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}:{rng.randrange(60):02d}'
+
+
+def day_punches(rng):
+    """(tipo, hora) of one employee's day, or [] when absent."""
+    if rng.random() < ABSENCE_RATE:
+        return []
+    entrada = 8 * 60 + int(rng.gauss(0, 8))
+    saida_almoco = 12 * 60 + int(rng.gauss(0, 12))
+    volta_almoco = saida_almoco + 60 + int(rng.gauss(0, 6))
+    saida_final = 17 * 60 + int(abs(rng.gauss(10, 15)))
+    punches = [('entrada', clock(rng, entrada)), ('saida_almoco', clock(rng, saida_almoco)),
+               ('volta_almoco', clock(rng, volta_almoco)), ('saida_final', clock(rng, saida_final))]
+    if rng.random() < INCOMPLETE_RATE:
+        punches = punches[:rng.randint(1, 3)]
+    return punches
+
+
+def generate(db, employees, days, seed=42):
+    """Insert the synthetic employees and punches; returns the punch count."""
+    import database
+    from routes import get_brasilia_date
+    from werkzeug.security import generate_password_hash
+
+    rng = random.Random(seed)
+    if db.execute("SELECT 1 FROM usuarios WHERE login = 'bench1'").fetchone():
+        raise SystemExit('Este banco já tem dados sintéticos (usuário bench1).')
+
+    senha = generate_password_hash('bench')
+    first = db.execute('SELECT COALESCE(MAX(id), 0) FROM usuarios').fetchone()[0] + 1
+    db.executemany('''
+        INSERT INTO usuarios (nome, cpf, funcao, login, senha, perfil)
+        VALUES (?, ?, ?, ?, ?, 'colaborador')
+    ''', ((f'Funcionário {i:05d}', f'9{i:010d}', rng.choice(FUNCOES), f'bench{i}', senha)
+          for i in range(1, employees + 1)))
+    user_ids = range(first, first + employees)
+
+    def rows():
+        for day in working_days(days, get_brasilia_date()):
+            data = day.isoformat()
+            for user_id in user_ids:
+                for tipo, hora in day_punches(rng):
+                    observacao = rng.choice(OBSERVACOES) if rng.random() < OBSERVACAO_RATE else None
+                    yield user_id, data, tipo, hora, observacao
+
+    # Row-by-row triggers would double the load time: drop them, bulk insert
+    # and rebuild the summary once, then let init_db's helpers recreate them
+    for trigger in PUNCH_TRIGGERS:
+        db.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    before = db.execute('SELECT COUNT(*) FROM pontos').fetchone()[0]
+    db.executemany('''
+        INSERT INTO pontos (usuario_id, data, tipo, hora, observacao)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows())
+    database.backfill_daily_summary(db)
+    database.create_daily_summary(db)
+    database.create_change_versions(db)
+    db.commit()
+    db.execute('ANALYZE')
+    return db.execute('SELECT COUNT(*) FROM pontos').fetchone()[0] - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dir', default='.', help='directory holding timetracking.db')
+    parser.add_argument('--scale', choices=SCALES, help='preset employees x days')
+    parser.add_argument('--employees', type=int, default=200)
+    parser.add_argument('--days', type=int, default=125)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    if args.scale:
+        args.employees, args.days = SCALES[args.scale]
+
+    load_app(os.path.abspath(args.dir))
+    from database import pool
+
+    db = pool.acquire()
+    try:
+        start = time.perf_counter()
+        punches = generate(db, args.employees, args.days, args.seed)
+    finally:
+        pool.release(db)
+    print(f'{punches} pontos ({args.employees} funcionarios x {args.days} dias uteis) '
+          f'gerados em {time.perf_counter() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
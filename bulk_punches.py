@@ -0,0 +1,195 @@
+import csv
+import hmac
+import io
+import os
+import re
+from datetime import date
+from functools import lru_cache
+
+from flask import request, jsonify
+from flask_login import current_user
+
+from app import app
+from archive import pontos_segments
+from database import get_db
+from punch_store import PUNCH_TYPES
+
+# Token compartilhado com os relógios de ponto (cabeçalho Authorization: Bearer <token>)
+PUNCH_API_TOKEN = os.environ.get('PUNCH_API_TOKEN')
+
+MAX_BATCH_ROWS = int(os.environ.get('PUNCH_BATCH_MAX_ROWS', 100000))
+
+def is_authorized_device():
+    """Aceita um administrador logado ou o token dos relógios de ponto"""
+    if current_user.is_authenticated and current_user.perfil == 'admin':
+        return True
+    auth_header = request.headers.get('Authorization', '')
+    if PUNCH_API_TOKEN and auth_header.startswith('Bearer '):
+        return hmac.compare_digest(auth_header[7:].strip(), PUNCH_API_TOKEN)
+    return False
+
+DATE_ISO_RE = re.compile(r'^(\d{4})-(\d{2})-(\d{2})$')
+DATE_BR_RE = re.compile(r'^(\d{2})-(\d{2})-(\d{4})$')
+TIME_RE = re.compile(r'^(\d{2}):(\d{2})(?::(\d{2}))?$')
+
+@lru_cache(maxsize=4096)
+def parse_date(value):
+    """Converte YYYY-MM-DD ou DD-MM-YYYY (também com /) para YYYY-MM-DD"""
+    value = value.strip().replace('/', '-')
+    match = DATE_ISO_RE.match(value)
+    if match:
+        year, month, day = match.groups()
+    else:
+        match = DATE_BR_RE.match(value)
+        if not match:
+            return None
+        day, month, year = match.groups()
+    try:
+        return date(int(year), int(month), int(day)).isoformat()
+    except ValueError:
+        return None
+
+@lru_cache(maxsize=4096)
+def parse_time(value):
+    """Converte HH:MM ou HH:MM:SS para HH:MM:SS"""
+    match = TIME_RE.match(value.strip())
+    if not match:
+        return None
+    hour, minute, second = match.groups(default='00')
+    if int(hour) > 23 or int(minute) > 59 or int(second) > 59:
+        return None
+    return f'{hour}:{minute}:{second}'
+
+def read_batch_rows():
+    """Lê as linhas do lote a partir de JSON (lista ou {"punches": [...]}) ou CSV"""
+    if request.mimetype == 'text/csv':
+        text = request.get_data(as_text=True)
+        return list(csv.DictReader(io.StringIO(text)))
+
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get('punches')
+    if not isinstance(payload, list):
+        return None
+    return payload
+
+def validate_rows(rows, users_by_cpf, users_by_login):
+    """Valida as linhas do lote, devolvendo (válidas, resultados por linha)"""
+    valid = []
+    results = []
+    seen = set()
+
+    for line, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            results.append({'linha': line, 'status': 'invalido', 'erro': 'Linha mal formada'})
+            continue
+
+        cpf = re.sub(r'[^0-9]', '', str(row.get('cpf') or ''))
+        login = str(row.get('login') or '').strip()
+        usuario_id = users_by_cpf.get(cpf) if cpf else users_by_login.get(login)
+        data = parse_date(str(row.get('date') or row.get('data') or ''))
+        hora = parse_time(str(row.get('time') or row.get('hora') or ''))
+        tipo = str(row.get('tipo') or '').strip()
+
+        if usuario_id is None:
+            error = 'Funcionário não encontrado'
+        elif data is None:
+            error = 'Data inválida'
+        elif hora is None:
+            error = 'Horário inválido'
+        elif tipo not in PUNCH_TYPES:
+            error = 'Tipo de ponto inválido'
+        else:
+            error = None
+
+        if error:
+            results.append({'linha': line, 'status': 'invalido', 'erro': error})
+            continue
+
+        key = (usuario_id, data, tipo)
+        if key in seen:
+            results.append({'linha': line, 'status': 'duplicado'})
+            continue
+        seen.add(key)
+
+        observacao = str(row.get('observacao') or '').strip()
+        valid.append((line, usuario_id, data, tipo, hora, observacao))
+        results.append({'linha': line, 'status': 'inserido'})
+
+    return valid, results
+
+@app.route('/api/punches/batch', methods=['POST'])
+def import_punch_batch():
+    if not is_authorized_device():
+        return jsonify({'error': 'Acesso negado!'}), 403
+
+    rows = read_batch_rows()
+    if rows is None:
+        return jsonify({'error': 'Envie uma lista JSON ou um CSV com cabeçalho.'}), 400
+    if len(rows) > MAX_BATCH_ROWS:
+        return jsonify({'error': f'Lote excede o limite de {MAX_BATCH_ROWS} linhas.'}), 413
+
+    db = get_db()
+
+    # Carrega todos os colaboradores de uma vez para validar o lote em memória
+    users_by_cpf = {}
+    users_by_login = {}
+    for user in db.execute("SELECT id, cpf, login FROM usuarios WHERE perfil = 'colaborador'"):
+        users_by_cpf[user['cpf']] = user['id']
+        users_by_login[user['login']] = user['id']
+
+    valid, results = validate_rows(rows, users_by_cpf, users_by_login)
+
+    # Os arquivos dos anos arquivados do lote são anexados antes da transação
+    dates = [punch[2] for punch in valid]
+    segments = list(pontos_segments(db, min(dates), max(dates))) if valid else []
+
+    try:
+        db.execute('BEGIN IMMEDIATE')
+
+        # Identifica os pontos que já existem no banco com um único join
+        db.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS lote_pontos (
+                linha INTEGER PRIMARY KEY,
+                usuario_id INTEGER NOT NULL,
+                data DATE NOT NULL,
+                tipo TEXT NOT NULL
+            )
+        ''')
+        existing = set()
+        try:
+            db.executemany(
+                'INSERT INTO lote_pontos (linha, usuario_id, data, tipo) VALUES (?, ?, ?, ?)',
+                (punch[:4] for punch in valid)
+            )
+            for first, last, source in segments:
+                existing.update(row['linha'] for row in db.execute(f'''
+                    SELECT l.linha FROM lote_pontos l
+                    JOIN {source} p ON p.usuario_id = l.usuario_id AND p.data = l.data AND p.tipo = l.tipo
+                    WHERE p.data BETWEEN ? AND ?
+                ''', (first, last)))
+        finally:
+            # A conexão volta ao pool: o próximo lote nela não pode ver estas linhas
+            db.execute('DELETE FROM lote_pontos')
+
+        new_punches = [punch for punch in valid if punch[0] not in existing]
+        db.executemany('''
+            INSERT INTO pontos (usuario_id, data, tipo, hora, observacao)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (usuario_id, data, tipo) DO NOTHING
+        ''', (punch[1:] for punch in new_punches))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        app.logger.error(f'Error importing punch batch: {e}')
+        return jsonify({'error': 'Erro ao importar pontos!'}), 500
+
+    for result in results:
+        if result['linha'] in existing:
+            result['status'] = 'duplicado'
+
+    summary = {'total': len(results), 'inserido': 0, 'duplicado': 0, 'invalido': 0}
+    for result in results:
+        summary[result['status']] += 1
+
+    return jsonify({'resumo': summary, 'linhas': results})
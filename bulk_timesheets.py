@@ -0,0 +1,207 @@
+"""Espelhos de ponto de todos os colaboradores, gerados em lote.
+
+O job roda no pool de exportações (export_jobs.py). O coordenador apura o
+período uma única vez para todos com timesheet.timesheet_blocks (uma leitura
+compartilhada dos pontos) e busca as observações em outra consulta única.
+Os funcionários são então divididos em lotes de TIMESHEET_CHUNK_SIZE, e cada
+lote vira PDFs em um dos TIMESHEET_WORKERS processos. Os arquivos entram no
+ZIP à medida que ficam prontos e o andamento é gravado em export_jobs.
+
+Cada lote leva só fatias dos arrays NumPy, então o custo de enviar os dados
+aos processos é pequeno perto da geração dos PDFs, e o tempo total cai
+linearmente com o número de núcleos.
+
+Os processos (spawn) importam este módulo sem a aplicação: ele só usa
+timesheet, exports e o reportlab.
+"""
+import io
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+from xml.sax.saxutils import escape
+
+import numpy as np
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, LongTable, Table, TableStyle, Paragraph, Spacer
+
+from archive import segment_rows
+from exports import NoExportData, convert_date_for_db, pdf_styles, run_job
+from timesheet import (format_minutes, load_employees, minutes, parse_period, period_totals,
+                       summary_row, timesheet_blocks)
+
+TIMESHEET_WORKERS = int(os.environ.get('TIMESHEET_WORKERS', os.cpu_count() or 1))
+# Funcionários por tarefa enviada aos processos (e por atualização de progresso)
+TIMESHEET_CHUNK_SIZE = int(os.environ.get('TIMESHEET_CHUNK_SIZE', 25))
+
+WEEKDAYS = ['Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom']
+TIMESHEET_HEADERS = ['Data', 'Dia', 'Entrada', 'Saída\nAlmoço', 'Volta\nAlmoço', 'Saída\nFinal',
+                     'Trabalhadas', 'Saldo', 'Observação']
+TIMESHEET_COLUMN_WIDTHS = (0.08, 0.06, 0.09, 0.09, 0.09, 0.09, 0.12, 0.08, 0.30)
+
+TIMESHEET_TABLE_STYLE = [
+    ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+    ('ALIGN', (0, 0), (-2, -1), 'CENTER'),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('TOPPADDING', (0, 0), (-1, -1), 2),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+    ('LEFTPADDING', (0, 0), (-1, -1), 3),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 3),
+]
+
+# Este módulo só roda nos processos de exportação, então carrega o reportlab já
+PDF_STYLES = pdf_styles()
+
+# Observações quebram linha dentro da célula
+OBSERVATION_STYLE = ParagraphStyle('Observacao', parent=PDF_STYLES['Normal'], fontSize=7, leading=8)
+
+OBSERVATIONS_SQL = '''
+    SELECT usuario_id, data, group_concat(observacao, ' | ') as observacoes
+    FROM {pontos}
+    WHERE data BETWEEN ? AND ? AND observacao IS NOT NULL AND observacao != ''
+    GROUP BY usuario_id, data
+'''
+
+def clock(seconds):
+    if np.isnan(seconds):
+        return '-'
+    seconds = int(seconds)
+    return f'{seconds // 3600:02d}:{seconds % 3600 // 60:02d}'
+
+def timesheet_rows(start, times, worked, balance, due, observations):
+    """Linhas do espelho de um funcionário e as linhas da tabela dos dias sem jornada"""
+    rows = []
+    days_off = []
+    for d in range(times.shape[0]):
+        day = start + timedelta(days=d)
+        punched = not np.isnan(times[d]).all()
+        rows.append([
+            day.strftime('%d/%m'), WEEKDAYS[day.weekday()],
+            *(clock(seconds) for seconds in times[d]),
+            format_minutes(minutes(worked[d])) if punched else '-',
+            format_minutes(minutes(balance[d])) if punched or due[d] else '-',
+            Paragraph(escape(observations[d]), OBSERVATION_STYLE) if d in observations else '',
+        ])
+        if not due[d] and not punched:
+            days_off.append(d + 1)
+    return rows, days_off
+
+def write_timesheet_pdf(output, employee, totals, rows, days_off, start_label, end_label):
+    doc = SimpleDocTemplate(output, pagesize=A4, topMargin=30, bottomMargin=30)
+    story = [
+        Paragraph('Espelho de Ponto', PDF_STYLES['Title']),
+        Paragraph(f"<b>{escape(employee['nome'])}</b> - {escape(employee['funcao'])}", PDF_STYLES['Normal']),
+        Paragraph(f'Período: {start_label} a {end_label}', PDF_STYLES['Normal']),
+        Spacer(1, 10),
+    ]
+
+    widths = [doc.width * width for width in TIMESHEET_COLUMN_WIDTHS]
+    style = TableStyle(TIMESHEET_TABLE_STYLE + [
+        ('BACKGROUND', (0, row), (-1, row), colors.whitesmoke) for row in days_off
+    ])
+    table = LongTable([TIMESHEET_HEADERS] + rows, colWidths=widths, repeatRows=1)
+    table.setStyle(style)
+    story += [table, Spacer(1, 10)]
+
+    story.append(Paragraph(
+        f"Horas trabalhadas: <b>{format_minutes(totals['minutos_trabalhados'])}</b> &nbsp; "
+        f"Extras: <b>{format_minutes(totals['minutos_extras'])}</b> &nbsp; "
+        f"Devidas: <b>{format_minutes(totals['minutos_devidos'])}</b> &nbsp; "
+        f"Atrasos: <b>{format_minutes(totals['minutos_atraso'])}</b> ({totals['dias_atraso']} dias) &nbsp; "
+        f"Faltas: <b>{totals['faltas']}</b> &nbsp; "
+        f"Banco de horas: <b>{format_minutes(totals['saldo_minutos'])}</b>",
+        PDF_STYLES['Normal']
+    ))
+    story.append(Spacer(1, 40))
+
+    signatures = Table([['_' * 40, '_' * 40], ['Assinatura do funcionário', 'Assinatura do responsável']],
+                       colWidths=[doc.width / 2] * 2)
+    signatures.setStyle(TableStyle([('ALIGN', (0, 0), (-1, -1), 'CENTER'), ('FONTSIZE', (0, 0), (-1, -1), 9)]))
+    story.append(signatures)
+    doc.build(story)
+
+def timesheet_filename(employee, start_label, end_label):
+    name = ''.join(c if c.isalnum() else '_' for c in employee['nome'])
+    return f"espelho_{name}_{employee['id']}_{start_label}_a_{end_label}.pdf"
+
+def render_chunk(chunk, start_date_db, start_label, end_label):
+    """Gera os PDFs de um lote de funcionários (roda nos processos do pool)"""
+    start = date.fromisoformat(start_date_db)
+    files = []
+    for i, employee in enumerate(chunk['employees']):
+        rows, days_off = timesheet_rows(start, chunk['times'][i], chunk['worked'][i], chunk['balance'][i],
+                                        chunk['due'][i], chunk['observations'][i])
+        output = io.BytesIO()
+        write_timesheet_pdf(output, employee, chunk['totals'][i], rows, days_off, start_label, end_label)
+        files.append((timesheet_filename(employee, start_label, end_label), output.getvalue()))
+    return files
+
+def timesheet_chunks(db, start_date_db, end_date_db):
+    """Divide a apuração do período em lotes de TIMESHEET_CHUNK_SIZE funcionários"""
+    employees = load_employees(db)
+    start = date.fromisoformat(start_date_db)
+    observations = {}
+    for row in segment_rows(db, OBSERVATIONS_SQL, (), start_date_db, end_date_db):
+        day = (date.fromisoformat(row['data']) - start).days
+        observations.setdefault(row['usuario_id'], {})[day] = row['observacoes']
+
+    for members, times, daily in timesheet_blocks(db, employees, start_date_db, end_date_db):
+        totals = period_totals(daily)
+        for first in range(0, len(members), TIMESHEET_CHUNK_SIZE):
+            part = slice(first, first + TIMESHEET_CHUNK_SIZE)
+            chunk_employees = [dict(employees[i]) for i in members[part]]
+            yield {
+                'employees': chunk_employees,
+                'totals': [summary_row(employees[i], totals, first + k)
+                           for k, i in enumerate(members[part])],
+                'times': times[part],
+                'worked': daily['worked'][part],
+                'balance': daily['balance'][part],
+                'due': daily['due'][part],
+                'observations': [observations.get(employee['id'], {}) for employee in chunk_employees],
+            }
+
+def build_timesheets(db, params, output, progress=None, workers=TIMESHEET_WORKERS):
+    """Grava em ``output`` um ZIP com o espelho de ponto de cada colaborador.
+
+    ``params`` traz start_date e end_date como digitados (DD-MM-YYYY);
+    ``progress(prontos, total)`` é chamado a cada lote concluído. Retorna o
+    nome do arquivo e levanta NoExportData se não houver colaboradores.
+    """
+    start_label, end_label = params['start_date'], params['end_date']
+    start_date_db, end_date_db = convert_date_for_db(start_label), convert_date_for_db(end_label)
+    parse_period(start_date_db, end_date_db)
+
+    chunks = list(timesheet_chunks(db, start_date_db, end_date_db))
+    total = sum(len(chunk['employees']) for chunk in chunks)
+    if not total:
+        raise NoExportData()
+
+    done = 0
+    if progress:
+        progress(done, total)
+    # spawn: os processos não herdam a conexão nem os threads de quem os criou
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(chunks))),
+                             mp_context=multiprocessing.get_context('spawn')) as executor, \
+            zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+        futures = [executor.submit(render_chunk, chunk, start_date_db, start_label, end_label)
+                   for chunk in chunks]
+        for future in as_completed(futures):
+            files = future.result()
+            for filename, data in files:
+                archive.writestr(filename, data)
+            done += len(files)
+            if progress:
+                progress(done, total)
+    return f"espelhos_de_ponto_{start_label}_a_{end_label}.zip"
+
+def run_timesheet_job(database, job_id, params, path):
+    """Executa o job de espelhos de ponto dentro do pool de exportações"""
+    run_job(database, job_id, path,
+            lambda db, output, progress: build_timesheets(db, params, output, progress=progress))
@@ -1,25 +1,417 @@
 import sqlite3
 import os
-from flask import g, current_app
+import pathlib
+import queue
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from flask import g, current_app, has_app_context, has_request_context, request
 
 DATABASE = 'timetracking.db'
 
+# Connection pool settings (per worker process)
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+READ_POOL_SIZE = int(os.environ.get('DB_READ_POOL_SIZE', 8))
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 5000))
+MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', 256 * 1024 * 1024))
+CACHE_SIZE_KB = int(os.environ.get('DB_CACHE_SIZE_KB', 64 * 1024))
+# Seconds between WAL checkpoints run by a background thread; 0 leaves them
+# to SQLite, which runs them inside whichever commit fills the WAL
+CHECKPOINT_INTERVAL = float(os.environ.get('DB_CHECKPOINT_INTERVAL', 1))
+# With the background thread on, a commit still checkpoints once the WAL
+# reaches this many pages (the thread fell behind a burst of writes)
+CHECKPOINT_FALLBACK_PAGES = 10000
+
+# Count and time the SQL run by each request (see metrics.py)
+INSTRUMENT_SQL = os.environ.get('DB_INSTRUMENT_SQL', '1') != '0'
+# Statements slower than this are kept, with their query plan, in slow_queries
+SLOW_QUERY_MS = float(os.environ.get('DB_SLOW_QUERY_MS', 100))
+SLOW_QUERY_LOG_SIZE = int(os.environ.get('DB_SLOW_QUERY_LOG_SIZE', 200))
+
+# Stored in PRAGMA user_version once init_db has run. Bump it whenever init_db
+# gains a table, column, index, trigger or migration, so existing databases
+# run it again on the next start.
+SCHEMA_VERSION = 5
+
+class WalCheckpointer:
+    """Background thread that checkpoints the WAL every ``interval`` seconds.
+    
+    Writer connections raise wal_autocheckpoint to CHECKPOINT_FALLBACK_PAGES,
+    so punch commits no longer pay for copying the WAL back into the
+    database. The checkpoints are PASSIVE: they never wait for readers or
+    writers, and a long export only keeps the pages it still needs in the WAL.
+    """
+    
+    def __init__(self, database, interval=CHECKPOINT_INTERVAL):
+        self.database = database
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pid = None
+    
+    def start(self):
+        """Start the thread in this process if it is not running yet."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name='wal-checkpoint', daemon=True).start()
+    
+    def _run(self):
+        conn = sqlite3.connect(self.database, timeout=BUSY_TIMEOUT_MS / 1000)
+        while True:
+            time.sleep(self.interval)
+            try:
+                conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+            except sqlite3.Error:
+                pass
+
+class ConnectionPool:
+    """Per-process pool of warm SQLite connections.
+    
+    Connections are opened lazily up to ``max_size`` and handed back to the
+    pool at the end of each request instead of being closed. Every connection
+    is configured for WAL so long reads no longer block punch writes.
+    
+    A ``read_only`` pool opens the file with ``mode=ro`` and query_only, and
+    each statement reads its own WAL snapshot. Reports and exports use one
+    (see get_read_db) so they never hold the connections that punches need.
+    """
+    
+    def __init__(self, database, max_size=POOL_SIZE, timeout=POOL_TIMEOUT, read_only=False):
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._reset()
+    
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self.created = 0
+        self.in_use = 0
+        self.acquired = 0
+        self.waits = 0
+        self.timeouts = 0
+    
+    def _check_fork(self):
+        # Connections must not be shared across a fork (gunicorn --preload);
+        # the child simply drops the inherited ones and opens its own.
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+    
+    def _connect(self):
+        if self.read_only:
+            uri = pathlib.Path(self.database).resolve().as_uri() + '?mode=ro'
+            conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT_MS / 1000,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA query_only = ON')
+        else:
+            conn = sqlite3.connect(self.database, timeout=BUSY_TIMEOUT_MS / 1000,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            if CHECKPOINT_INTERVAL > 0:
+                conn.execute(f'PRAGMA wal_autocheckpoint = {CHECKPOINT_FALLBACK_PAGES}')
+                checkpointer.start()
+        conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+        conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+        conn.execute(f'PRAGMA cache_size = -{CACHE_SIZE_KB}')
+        return conn
+    
+    def acquire(self):
+        """Take a connection from the pool, opening one if below max_size."""
+        self._check_fork()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self.created < self.max_size
+                if can_create:
+                    self.created += 1
+                else:
+                    self.waits += 1
+            if can_create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self.created -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self.timeouts += 1
+                    raise sqlite3.OperationalError('connection pool exhausted')
+        
+        with self._lock:
+            self.in_use += 1
+            self.acquired += 1
+        return conn
+    
+    def release(self, conn):
+        """Return a connection to the pool, discarding any open transaction."""
+        if self._pid != os.getpid():
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            with self._lock:
+                self.in_use -= 1
+                self.created -= 1
+            return
+        with self._lock:
+            self.in_use -= 1
+        self._idle.put(conn)
+    
+    def stats(self):
+        """Snapshot of pool counters for monitoring."""
+        with self._lock:
+            return {
+                'pid': self._pid,
+                'read_only': self.read_only,
+                'max_size': self.max_size,
+                'created': self.created,
+                'in_use': self.in_use,
+                'idle': self._idle.qsize(),
+                'acquired': self.acquired,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+            }
+
+checkpointer = WalCheckpointer(DATABASE)
+# Writes (punches, registrations, jobs) and reads (reports, history, exports)
+pool = ConnectionPool(DATABASE)
+read_pool = ConnectionPool(DATABASE, READ_POOL_SIZE, read_only=True)
+
+class SqlStats:
+    """Number of statements and time spent in SQLite during one request."""
+    
+    __slots__ = ('queries', 'seconds')
+    
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+# Ring buffer of slow statements of this worker (newest last)
+slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+def _calling_frame():
+    """file:line function of the innermost app frame outside this module."""
+    root = os.path.dirname(os.path.abspath(__file__))
+    for frame in reversed(traceback.extract_stack()[:-3]):
+        if frame.filename.startswith(root) and frame.filename != os.path.abspath(__file__):
+            return f'{os.path.relpath(frame.filename, root)}:{frame.lineno} {frame.name}'
+    return None
+
+def full_scans(plan):
+    """Plan steps that scan a table without an index.
+    
+    SCAN CONSTANT ROW and scans of the plan's own co-routines, materialized
+    views and subqueries read no table and are not counted.
+    """
+    derived = {step.split(' ', 1)[1] for step in plan if step.startswith(('CO-ROUTINE ', 'MATERIALIZE '))}
+    scans = []
+    for step in plan:
+        if not step.startswith('SCAN '):
+            continue
+        name, _, rest = step[5:].partition(' ')
+        if name == 'CONSTANT' or name.startswith('(') or name in derived:
+            continue
+        if 'USING' in rest and 'INDEX' in rest:
+            continue
+        scans.append(step)
+    return scans
+
+def log_slow_query(conn, sql, params, seconds):
+    """Record a slow statement with its EXPLAIN QUERY PLAN in slow_queries."""
+    plan = []
+    if params is not None and sql.lstrip().upper().startswith(('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')):
+        try:
+            plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+        except sqlite3.Error as e:
+            plan = [f'(EXPLAIN failed: {e})']
+    
+    if 'senha' in sql or 'pin_hash' in sql:
+        shown_params = '[omitted]'
+    else:
+        shown_params = repr(params)[:500] if params is not None else None
+    
+    entry = {
+        'at': datetime.now().isoformat(timespec='seconds'),
+        'ms': round(seconds * 1000, 1),
+        'sql': ' '.join(sql.split()),
+        'params': shown_params,
+        'endpoint': request.endpoint if has_request_context() else None,
+        'path': request.full_path if has_request_context() else None,
+        'caller': _calling_frame(),
+        'plan': plan,
+        'full_scan': bool(full_scans(plan)),
+    }
+    slow_queries.append(entry)
+    if has_app_context():
+        current_app.logger.warning(
+            f"Slow query ({entry['ms']} ms) in {entry['endpoint']} at {entry['caller']}: "
+            f"{entry['sql'][:200]} | plan: {' / '.join(plan)}"
+        )
+
+class TimedCursor:
+    """Cursor wrapper that adds the time spent stepping it to ``stats``.
+    
+    The statement's own total (execute plus every fetch) is checked against
+    SLOW_QUERY_MS once the cursor is exhausted or the connection moves on.
+    """
+    
+    def __init__(self, cursor, stats, conn, sql, params, elapsed):
+        self._cursor = cursor
+        self._stats = stats
+        self._conn = conn
+        self._sql = sql
+        self._params = params
+        self._elapsed = elapsed
+        self._finished = False
+    
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            seconds = time.perf_counter() - start
+            self._stats.seconds += seconds
+            self._elapsed += seconds
+    
+    def finish(self):
+        if not self._finished:
+            self._finished = True
+            if self._elapsed * 1000 >= SLOW_QUERY_MS:
+                log_slow_query(self._conn, self._sql, self._params, self._elapsed)
+    
+    def fetchone(self):
+        row = self._timed(self._cursor.fetchone)
+        self.finish()
+        return row
+    
+    def fetchmany(self, *args):
+        rows = self._timed(self._cursor.fetchmany, *args)
+        if not rows:
+            self.finish()
+        return rows
+    
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        self.finish()
+        return rows
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        try:
+            return self._timed(self._cursor.__next__)
+        except StopIteration:
+            self.finish()
+            raise
+    
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class TimedConnection:
+    """Connection wrapper that counts statements and times execution.
+    
+    SQLite does most of the work while rows are fetched, so the cursors it
+    returns are wrapped as well. Everything else is delegated to the pooled
+    connection, available as ``raw``.
+    """
+    
+    def __init__(self, conn, stats):
+        self.raw = conn
+        self.stats = stats
+        self._pending = []
+    
+    def finish(self):
+        """Close the books on cursors that were not read to the end."""
+        for cursor in self._pending:
+            cursor.finish()
+        self._pending = []
+    
+    def _run(self, method, sql, params=None, explain=False):
+        self.finish()
+        self.stats.queries += 1
+        start = time.perf_counter()
+        try:
+            cursor = method(sql) if params is None else method(sql, params)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stats.seconds += elapsed
+        # executemany/executescript have no single parameter set to EXPLAIN
+        explain_params = (params if params is not None else ()) if explain else None
+        timed = TimedCursor(cursor, self.stats, self.raw, sql, explain_params, elapsed)
+        self._pending.append(timed)
+        return timed
+    
+    def execute(self, sql, params=None):
+        return self._run(self.raw.execute, sql, params, explain=True)
+    
+    def executemany(self, sql, params):
+        return self._run(self.raw.executemany, sql, params)
+    
+    def executescript(self, sql):
+        return self._run(self.raw.executescript, sql)
+    
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+def _request_connection(name, connection_pool):
+    if name not in g:
+        conn = connection_pool.acquire()
+        if INSTRUMENT_SQL:
+            conn = TimedConnection(conn, g.setdefault('sql_stats', SqlStats()))
+        setattr(g, name, conn)
+    return getattr(g, name)
+
 def get_db():
     """Get database connection."""
-    if 'db' not in g:
-        g.db = sqlite3.connect(DATABASE)
-        g.db.row_factory = sqlite3.Row
-    return g.db
+    return _request_connection('db', pool)
+
+def get_read_db():
+    """Get a read-only connection for reports, history and exports.
+    
+    It comes from read_pool, so a long report never takes a connection
+    from the writers. Writes through it fail with "attempt to write a
+    readonly database".
+    """
+    return _request_connection('read_db', read_pool)
 
 def close_db(e=None):
-    """Close database connection."""
-    db = g.pop('db', None)
-    if db is not None:
-        db.close()
+    """Return the request's database connections to their pools."""
+    for name, connection_pool in (('db', pool), ('read_db', read_pool)):
+        db = g.pop(name, None)
+        if db is not None:
+            if isinstance(db, TimedConnection):
+                db.finish()
+                db = db.raw
+            connection_pool.release(db)
 
-def init_db():
-    """Initialize database with tables."""
+def init_db(force=False):
+    """Initialize database with tables.
+    
+    Skipped when the database is already stamped with SCHEMA_VERSION, so
+    worker starts only read the marker instead of running the DDL and the
+    migrations (which scan pontos) every time. ``force`` runs it anyway.
+    """
     db = get_db()
+    if not force and db.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+        return
     
     # Create users table
     db.execute('''
@@ -49,6 +441,70 @@ def init_db():
         )
     ''')
     
+    # Create kiosk tables: registered devices and per-employee badge/PIN
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS dispositivos_quiosque (
+            id TEXT PRIMARY KEY,
+            nome TEXT NOT NULL,
+            ativo INTEGER NOT NULL DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS credenciais_quiosque (
+            usuario_id INTEGER PRIMARY KEY,
+            cracha TEXT UNIQUE NOT NULL,
+            pin_hash TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+        )
+    ''')
+    
+    # Create background export jobs table
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS export_jobs (
+            id TEXT PRIMARY KEY,
+            relatorio TEXT NOT NULL,
+            parametros TEXT NOT NULL,
+            chave_cache TEXT NOT NULL,
+            status TEXT NOT NULL CHECK (status IN ('pending', 'running', 'done', 'empty', 'error')),
+            nome_arquivo TEXT,
+            erro TEXT,
+            progresso INTEGER,
+            total INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_export_jobs_chave ON export_jobs (chave_cache)')
+    
+    # Progress columns were added after export_jobs was first shipped
+    job_columns = {column['name'] for column in db.execute('PRAGMA table_info(export_jobs)')}
+    for column in ('progresso', 'total'):
+        if column not in job_columns:
+            db.execute(f'ALTER TABLE export_jobs ADD COLUMN {column} INTEGER')
+    
+    # Years moved out of pontos into per-year archive databases (see archive.py)
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS arquivos_pontos (
+            ano INTEGER PRIMARY KEY,
+            arquivo TEXT NOT NULL,
+            linhas INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Migrate legacy DD-MM-YYYY dates to ISO and add covering indexes
+    migrate_pontos_iso_dates(db)
+    create_pontos_indexes(db)
+    
+    # Create the per-day summary maintained by triggers on pontos
+    create_daily_summary(db)
+    
+    # Track which dates changed so per-process caches can invalidate
+    create_change_versions(db)
+    
     # Create admin user if not exists
     admin_exists = db.execute(
         'SELECT COUNT(*) as count FROM usuarios WHERE perfil = "admin"'
@@ -62,10 +518,256 @@ def init_db():
         ''', ('Administrador', '00000000000', 'Administrador', 'admin', 
               generate_password_hash('admin123'), 'admin'))
     
+    db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    db.commit()
+
+def migrate_pontos_iso_dates(db, batch_size=50000):
+    """Rewrite legacy DD-MM-YYYY punch dates as YYYY-MM-DD.
+    
+    Runs in rowid batches with a commit after each one so the write lock is
+    held only briefly and punches can keep landing while a large table is
+    migrated. Rows already in ISO format are left untouched, which makes the
+    migration safe to run on every startup.
+    """
+    last_id = 0
+    while True:
+        row = db.execute(
+            'SELECT MAX(id) as max_id FROM (SELECT id FROM pontos WHERE id > ? ORDER BY id LIMIT ?)',
+            (last_id, batch_size)
+        ).fetchone()
+        if row['max_id'] is None:
+            break
+        db.execute('''
+            UPDATE pontos
+            SET data = substr(data, 7, 4) || '-' || substr(data, 4, 2) || '-' || substr(data, 1, 2)
+            WHERE id > ? AND id <= ?
+              AND data GLOB '[0-9][0-9]-[0-9][0-9]-[0-9][0-9][0-9][0-9]'
+        ''', (last_id, row['max_id']))
+        db.commit()
+        last_id = row['max_id']
+
+def create_pontos_indexes(db):
+    """Create the indexes used by dashboard, history and report queries.
+    
+    The (usuario_id, data, tipo) index is UNIQUE: each punch type can be
+    registered only once per user per day. Duplicates left by older versions
+    are moved to ``pontos_duplicados`` before the index is built.
+    """
+    has_unique = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'uq_pontos_usuario_data_tipo'"
+    ).fetchone()
+    if not has_unique:
+        db.execute('CREATE TABLE IF NOT EXISTS pontos_duplicados AS SELECT * FROM pontos WHERE 0')
+        keep = 'SELECT MIN(id) FROM pontos GROUP BY usuario_id, data, tipo'
+        db.execute(f'INSERT INTO pontos_duplicados SELECT * FROM pontos WHERE id NOT IN ({keep})')
+        db.execute(f'DELETE FROM pontos WHERE id NOT IN ({keep})')
+        db.execute('DROP INDEX IF EXISTS idx_pontos_usuario_data_tipo')
+        db.execute('''
+            CREATE UNIQUE INDEX uq_pontos_usuario_data_tipo
+            ON pontos (usuario_id, data, tipo)
+        ''')
+    
+    # Keyset pagination of the history walks (data, hora, id) backwards; the
+    # rowid is implicitly the last column of every index
+    db.execute('CREATE INDEX IF NOT EXISTS idx_pontos_data_hora ON pontos (data, hora)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_pontos_usuario_data_hora ON pontos (usuario_id, data, hora)')
+    db.execute('DROP INDEX IF EXISTS idx_pontos_data')
+
+    # Covering index for the timesheet engine, which reads every punch of a
+    # date range without touching the table
+    db.execute('''
+        CREATE INDEX IF NOT EXISTS idx_pontos_data_usuario_tipo_hora
+        ON pontos (data, usuario_id, tipo, hora)
+    ''')
+
+def _minutes(column):
+    """SQL expression converting an HH:MM[:SS] column to minutes since midnight."""
+    return f"(CAST(substr({column}, 1, 2) AS INTEGER) * 60 + CAST(substr({column}, 4, 2) AS INTEGER))"
+
+# Rebuilds resumo_diario rows from {pontos} for the (usuario_id, data) pairs
+# matched by {where}; shared by the triggers and the backfill.
+DAILY_SUMMARY_UPSERT = f'''
+    INSERT INTO resumo_diario (usuario_id, data, entrada, saida_almoco, volta_almoco, saida_final,
+                               total_pontos, minutos_trabalhados, minutos_almoco, completo)
+    SELECT usuario_id, data, entrada, saida_almoco, volta_almoco, saida_final, total_pontos,
+           CASE WHEN saida_almoco IS NULL AND volta_almoco IS NULL
+                THEN COALESCE(MAX({_minutes('saida_final')} - {_minutes('entrada')}, 0), 0)
+                ELSE COALESCE(MAX({_minutes('saida_almoco')} - {_minutes('entrada')}, 0), 0)
+                   + COALESCE(MAX({_minutes('saida_final')} - {_minutes('volta_almoco')}, 0), 0)
+           END,
+           MAX({_minutes('volta_almoco')} - {_minutes('saida_almoco')}, 0),
+           entrada IS NOT NULL AND saida_almoco IS NOT NULL
+               AND volta_almoco IS NOT NULL AND saida_final IS NOT NULL
+    FROM (
+        SELECT usuario_id, data,
+               MAX(CASE WHEN tipo = 'entrada' THEN hora END) as entrada,
+               MAX(CASE WHEN tipo = 'saida_almoco' THEN hora END) as saida_almoco,
+               MAX(CASE WHEN tipo = 'volta_almoco' THEN hora END) as volta_almoco,
+               MAX(CASE WHEN tipo = 'saida_final' THEN hora END) as saida_final,
+               COUNT(*) as total_pontos
+        FROM {{pontos}}
+        WHERE {{where}}
+        GROUP BY usuario_id, data
+    )
+    WHERE true
+    ON CONFLICT (usuario_id, data) DO UPDATE SET
+        entrada = excluded.entrada,
+        saida_almoco = excluded.saida_almoco,
+        volta_almoco = excluded.volta_almoco,
+        saida_final = excluded.saida_final,
+        total_pontos = excluded.total_pontos,
+        minutos_trabalhados = excluded.minutos_trabalhados,
+        minutos_almoco = excluded.minutos_almoco,
+        completo = excluded.completo
+'''
+
+def create_daily_summary(db):
+    """Create resumo_diario, its triggers, and backfill it when it is new.
+    
+    resumo_diario holds one row per user per day with the punch times,
+    worked/lunch minutes and completeness. Triggers on pontos keep it up to
+    date inside the same transaction as every punch insert or delete.
+    
+    While archive_year moves punches out of pontos it holds a row in
+    arquivamento, and the delete trigger leaves the summary of those days
+    alone: the punches still exist, only in the archive database.
+    """
+    is_new = not db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'resumo_diario'"
+    ).fetchone()
+    
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS resumo_diario (
+            usuario_id INTEGER NOT NULL,
+            data DATE NOT NULL,
+            entrada TIME,
+            saida_almoco TIME,
+            volta_almoco TIME,
+            saida_final TIME,
+            total_pontos INTEGER NOT NULL DEFAULT 0,
+            minutos_trabalhados INTEGER NOT NULL DEFAULT 0,
+            minutos_almoco INTEGER,
+            completo INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (usuario_id, data),
+            FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+        ) WITHOUT ROWID
+    ''')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_resumo_diario_data ON resumo_diario (data)')
+    db.execute('CREATE TABLE IF NOT EXISTS arquivamento (ano INTEGER PRIMARY KEY)')
+    
+    db.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_pontos_resumo_insert AFTER INSERT ON pontos
+        BEGIN
+            {DAILY_SUMMARY_UPSERT.format(pontos='pontos', where='usuario_id = NEW.usuario_id AND data = NEW.data')};
+        END
+    ''')
+    # Databases from before the archive guard have the delete trigger without it
+    db.execute('DROP TRIGGER IF EXISTS trg_pontos_resumo_delete')
+    db.execute(f'''
+        CREATE TRIGGER trg_pontos_resumo_delete AFTER DELETE ON pontos
+        WHEN NOT EXISTS (SELECT 1 FROM arquivamento)
+        BEGIN
+            DELETE FROM resumo_diario WHERE usuario_id = OLD.usuario_id AND data = OLD.data;
+            {DAILY_SUMMARY_UPSERT.format(pontos='pontos', where='usuario_id = OLD.usuario_id AND data = OLD.data')};
+        END
+    ''')
+    
+    if is_new:
+        backfill_daily_summary(db)
+
+def create_change_versions(db):
+    """Create versoes_datas and the triggers that bump it.
+    
+    Every punch inserted, edited or deleted stamps its date (both dates for
+    an edit that moves it) with a new, increasing version; any change to usuarios stamps the special date '*' and any
+    change to the kiosk devices and credentials stamps 'quiosque', which
+    only the kiosk caches read. Caches in every worker poll for versions
+    newer than the last one they saw and drop only the entries whose date
+    range was touched.
+    """
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS versoes_datas (
+            data TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_versoes_datas_versao ON versoes_datas (versao)')
+    
+    bump = '''
+        INSERT INTO versoes_datas (data, versao)
+        VALUES ({data}, (SELECT COALESCE(MAX(versao), 0) + 1 FROM versoes_datas))
+        ON CONFLICT (data) DO UPDATE SET versao = excluded.versao;
+    '''
+    for event, row in (('INSERT', 'NEW'), ('DELETE', 'OLD')):
+        db.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_pontos_versao_{event.lower()} AFTER {event} ON pontos
+            BEGIN
+                {bump.format(data=f'{row}.data')}
+            END
+        ''')
+    # An edited punch changes both its old and its new date
+    db.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_pontos_versao_update AFTER UPDATE ON pontos
+        BEGIN
+            {bump.format(data='OLD.data')}
+            {bump.format(data='NEW.data')}
+        END
+    ''')
+    for table, key in (('usuarios', '*'), ('credenciais_quiosque', 'quiosque'),
+                       ('dispositivos_quiosque', 'quiosque')):
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            # Recreated: the kiosk triggers used to stamp '*' as well
+            db.execute(f'DROP TRIGGER IF EXISTS trg_{table}_versao_{event.lower()}')
+            db.execute(f'''
+                CREATE TRIGGER trg_{table}_versao_{event.lower()} AFTER {event} ON {table}
+                BEGIN
+                    {bump.format(data=f"'{key}'")}
+                END
+            ''')
+
+def backfill_daily_summary(db):
+    """Rebuild resumo_diario from scratch out of pontos and the archived years."""
+    # Archived years are read from their archive databases (archive.py);
+    # attaching them has to happen before the transaction starts
+    segments = list(pontos_segments(db))
+    db.execute('DELETE FROM resumo_diario')
+    for first, last, source in segments:
+        db.execute(DAILY_SUMMARY_UPSERT.format(pontos=source, where='data BETWEEN ? AND ?'), (first, last))
     db.commit()
 
 # Register teardown handler
+import click
 from app import app
+from archive import archive_filename, archive_year, closed_years, pontos_segments
+from timesheet import brasilia_today
 @app.teardown_appcontext
 def close_db_handler(error):
     close_db(error)
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Run init_db even if the schema version is current."""
+    init_db(force=True)
+    print(f'Banco inicializado (versão {SCHEMA_VERSION}).')
+
+@app.cli.command('archive-pontos')
+@click.option('--year', type=int, help='Archive only this closed year.')
+@click.option('--vacuum', is_flag=True, help='VACUUM the main database afterwards.')
+def archive_pontos_command(year, vacuum):
+    """Move the punches of closed years into per-year archive databases."""
+    db = get_db()
+    today = brasilia_today()
+    if year is not None and year >= today.year:
+        raise click.BadParameter('only closed years can be archived', param_hint='--year')
+    for closed_year in [year] if year is not None else closed_years(db, today):
+        moved = archive_year(db, closed_year)
+        print(f'{closed_year}: {moved} pontos movidos para {archive_filename(closed_year)}.')
+    if vacuum:
+        db.execute('VACUUM')
+        print('Banco principal compactado.')
+
+@app.cli.command('backfill-resumo')
+def backfill_daily_summary_command():
+    """Rebuild the resumo_diario table from pontos, archived years included."""
+    backfill_daily_summary(get_db())
+    print('resumo_diario reconstruído.')
@@ -0,0 +1,241 @@
+"""Jobs de exportação em segundo plano.
+
+As exportações pesadas (PDF/Excel de períodos longos) são enviadas para um
+pool de processos em vez de ocupar o worker do gunicorn. O navegador recebe
+o id do job, consulta o status e baixa o arquivo quando estiver pronto.
+
+O estado dos jobs fica na tabela export_jobs e os arquivos em EXPORT_DIR,
+então qualquer worker consegue responder status e download. Jobs com os
+mesmos parâmetros reaproveitam o arquivo já gerado enquanto nenhuma data do
+período nem nenhum usuário mudar (tabela versoes_datas, a mesma do cache de
+relatórios). Jobs pendentes ou em andamento há mais de EXPORT_JOB_TIMEOUT,
+ou cujo processo do pool morreu, são marcados como erro e não são
+reaproveitados.
+
+Os espelhos de ponto em lote (bulk_timesheets.py) também rodam como job e
+gravam o andamento nas colunas progresso e total, exibido pelo navegador.
+O módulo (e o reportlab que ele usa) só é importado nos processos do pool.
+"""
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import request, jsonify, redirect, send_file, url_for
+from flask_login import login_required, current_user
+
+import database
+from app import app
+from database import get_db, get_read_db
+from exports import EXPORT_MIMETYPES, TIMESHEET_MIMETYPE, convert_date_for_db, run_export_job
+from report_cache import ALL_DATES
+from timesheet import brasilia_today
+
+EXPORT_DIR = os.path.abspath(os.environ.get('EXPORT_DIR', 'exports'))
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', 2))
+EXPORT_JOB_TTL = int(os.environ.get('EXPORT_JOB_TTL', 24 * 3600))
+# Jobs pendentes ou em andamento há mais tempo que isso são dados como perdidos
+EXPORT_JOB_TIMEOUT = int(os.environ.get('EXPORT_JOB_TIMEOUT', 3600))
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Pool de processos do worker atual, criado sob demanda"""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            # spawn: os processos do pool não herdam conexões nem threads do worker
+            _executor = ProcessPoolExecutor(max_workers=EXPORT_WORKERS,
+                                            mp_context=multiprocessing.get_context('spawn'))
+            _executor_pid = os.getpid()
+        return _executor
+
+def artifact_path(job_id):
+    return os.path.join(EXPORT_DIR, job_id)
+
+def data_version(db, start_date_db=None, end_date_db=None):
+    """Versão dos dados do período: muda com qualquer ponto do período ou usuário alterado.
+
+    Lida de versoes_datas, como no cache de relatórios (report_cache.py);
+    sem período vale a versão mais nova de todas as datas.
+    """
+    row = db.execute('''
+        SELECT COALESCE(MAX(versao), 0) FROM versoes_datas
+        WHERE data = ? OR data BETWEEN ? AND ?
+    ''', (ALL_DATES, start_date_db or '0000-00-00', end_date_db or '9999-99-99')).fetchone()
+    return row[0]
+
+def fail_stale_jobs(db):
+    """Marca como erro os jobs pendentes ou em andamento há mais de EXPORT_JOB_TIMEOUT"""
+    db.execute('''
+        UPDATE export_jobs
+        SET status = 'error', erro = 'Exportação interrompida.', finished_at = CURRENT_TIMESTAMP
+        WHERE status IN ('pending', 'running') AND created_at < datetime('now', ?)
+    ''', (f'-{EXPORT_JOB_TIMEOUT} seconds',))
+
+def job_finished(executor, job_id, future):
+    """Marca o job como erro quando o processo do pool falhou antes de registrar o resultado"""
+    global _executor
+    error = future.exception()
+    if error is None:
+        return
+    if isinstance(error, BrokenProcessPool):
+        # Um processo do pool morreu: o pool não aceita mais jobs, o próximo é criado do zero
+        with _executor_lock:
+            if _executor is executor:
+                _executor = None
+    db = database.pool.acquire()
+    try:
+        db.execute('''
+            UPDATE export_jobs
+            SET status = 'error', erro = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status IN ('pending', 'running')
+        ''', (str(error) or type(error).__name__, job_id))
+        db.commit()
+    finally:
+        database.pool.release(db)
+
+def purge_expired_jobs(db):
+    """Remove jobs e arquivos mais antigos que EXPORT_JOB_TTL"""
+    expired = db.execute(
+        "SELECT id FROM export_jobs WHERE created_at < datetime('now', ?)",
+        (f'-{EXPORT_JOB_TTL} seconds',)
+    ).fetchall()
+    for job in expired:
+        if os.path.exists(artifact_path(job['id'])):
+            os.remove(artifact_path(job['id']))
+    db.executemany('DELETE FROM export_jobs WHERE id = ?', [(job['id'],) for job in expired])
+
+def submit_export_job(db, kind, params):
+    """Cria (ou reaproveita) um job de exportação e retorna o seu id"""
+    purge_expired_jobs(db)
+    fail_stale_jobs(db)
+
+    # Relatórios também mudam com o dia: a jornada devida vai até hoje
+    version = data_version(db, convert_date_for_db(params.get('start_date')),
+                           convert_date_for_db(params.get('end_date')))
+    cache_key = hashlib.sha256(
+        json.dumps([kind, params, version, brasilia_today().isoformat()],
+                   sort_keys=True).encode('utf-8')
+    ).hexdigest()
+
+    cached = db.execute('''
+        SELECT id, status FROM export_jobs
+        WHERE chave_cache = ? AND status IN ('pending', 'running', 'done', 'empty')
+        ORDER BY created_at DESC
+        LIMIT 1
+    ''', (cache_key,)).fetchone()
+    if cached and (cached['status'] != 'done' or os.path.exists(artifact_path(cached['id']))):
+        db.commit()
+        return cached['id']
+
+    job_id = uuid.uuid4().hex
+    db.execute('''
+        INSERT INTO export_jobs (id, relatorio, parametros, chave_cache, status)
+        VALUES (?, ?, ?, ?, 'pending')
+    ''', (job_id, kind, json.dumps(params), cache_key))
+    db.commit()
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    executor = get_executor()
+    future = executor.submit(run_export_job, os.path.abspath(database.DATABASE),
+                             job_id, kind, params, artifact_path(job_id))
+    future.add_done_callback(functools.partial(job_finished, executor, job_id))
+    return job_id
+
+def job_status(job):
+    status = {
+        'id': job['id'],
+        'status': job['status'],
+        'erro': job['erro'],
+        'progresso': job['progresso'],
+        'total': job['total'],
+        'status_url': url_for('export_job_status', job_id=job['id'])
+    }
+    if job['status'] == 'done':
+        status['nome_arquivo'] = job['nome_arquivo']
+        status['download_url'] = url_for('download_export_job', job_id=job['id'])
+    return status
+
+@app.route('/export_jobs', methods=['POST'])
+@login_required
+def create_export_job():
+    if current_user.perfil != 'admin':
+        return jsonify({'error': 'Acesso negado!'}), 403
+
+    data = request.get_json(silent=True) or request.form
+    kind = data.get('kind', 'history')
+    params = {
+        'format': (data.get('format') or 'csv').lower(),
+        'employee_id': data.get('employee_id') or None
+    }
+    if kind == 'report':
+        params['start_date'] = data.get('start_date')
+        params['end_date'] = data.get('end_date')
+        if not params['start_date'] or not params['end_date']:
+            return jsonify({'error': 'Informe o período do relatório.'}), 400
+        if params['employee_id'] and params['format'] == 'csv':
+            return jsonify({'error': 'Formato de exportação inválido para relatório detalhado!'}), 400
+    elif kind == 'timesheets':
+        # Espelhos de ponto de todos os colaboradores, em um ZIP
+        params = {'format': 'zip', 'start_date': data.get('start_date'), 'end_date': data.get('end_date')}
+        if not params['start_date'] or not params['end_date']:
+            return jsonify({'error': 'Informe o período do relatório.'}), 400
+    elif kind != 'history':
+        return jsonify({'error': 'Tipo de exportação inválido!'}), 400
+
+    if params['format'] not in EXPORT_MIMETYPES and kind != 'timesheets':
+        return jsonify({'error': 'Formato de exportação inválido!'}), 400
+
+    db = get_db()
+    job_id = submit_export_job(db, kind, params)
+    job = db.execute('SELECT * FROM export_jobs WHERE id = ?', (job_id,)).fetchone()
+    return jsonify(job_status(job)), 202
+
+@app.route('/export_jobs/timesheets')
+@login_required
+def start_timesheet_export():
+    """Link dos espelhos de ponto sem JavaScript: inicia o job e redireciona ao seu status"""
+    if current_user.perfil != 'admin':
+        return jsonify({'error': 'Acesso negado!'}), 403
+
+    params = {'format': 'zip', 'start_date': request.args.get('start_date'),
+              'end_date': request.args.get('end_date')}
+    if not params['start_date'] or not params['end_date']:
+        return jsonify({'error': 'Informe o período do relatório.'}), 400
+
+    job_id = submit_export_job(get_db(), 'timesheets', params)
+    return redirect(url_for('export_job_status', job_id=job_id))
+
+@app.route('/export_jobs/<job_id>')
+@login_required
+def export_job_status(job_id):
+    if current_user.perfil != 'admin':
+        return jsonify({'error': 'Acesso negado!'}), 403
+
+    job = get_read_db().execute('SELECT * FROM export_jobs WHERE id = ?', (job_id,)).fetchone()
+    if not job:
+        return jsonify({'error': 'Exportação não encontrada!'}), 404
+    return jsonify(job_status(job))
+
+@app.route('/export_jobs/<job_id>/download')
+@login_required
+def download_export_job(job_id):
+    if current_user.perfil != 'admin':
+        return jsonify({'error': 'Acesso negado!'}), 403
+
+    job = get_read_db().execute('SELECT * FROM export_jobs WHERE id = ?', (job_id,)).fetchone()
+    if not job or job['status'] != 'done' or not os.path.exists(artifact_path(job_id)):
+        return jsonify({'error': 'Exportação não encontrada!'}), 404
+
+    format_type = json.loads(job['parametros'])['format']
+    mimetype = TIMESHEET_MIMETYPE if job['relatorio'] == 'timesheets' else EXPORT_MIMETYPES[format_type]
+    return send_file(artifact_path(job_id), as_attachment=True,
+                     download_name=job['nome_arquivo'], mimetype=mimetype)
@@ -0,0 +1,473 @@
+"""Geração dos arquivos de exportação de pontos (CSV, Excel e PDF).
+
+As funções deste módulo não dependem do Flask: recebem uma conexão SQLite e
+gravam o arquivo em um objeto binário. Assim são usadas tanto pelas rotas de
+exportação quanto pelos jobs que rodam no pool de processos.
+
+O openpyxl e o reportlab são importados dentro das funções que geram cada
+formato: carregá-los custa mais que o resto da aplicação e só as
+exportações precisam deles, então os workers sobem sem eles.
+"""
+import csv
+import io
+import itertools
+import os
+import pathlib
+import sqlite3
+from functools import lru_cache
+
+from archive import segment_rows
+from punch_store import load_punches
+from timesheet import format_minutes, timesheet_summary
+
+# Nomes dos tipos de ponto usados nas exportações
+PUNCH_LABELS = {
+    'entrada': 'Entrada',
+    'saida_almoco': 'Saída Almoço',
+    'volta_almoco': 'Volta Almoço',
+    'saida_final': 'Saída Final'
+}
+
+# Linhas lidas do cursor por vez nas exportações em streaming
+EXPORT_CHUNK_SIZE = 1000
+
+# Linhas usadas para calcular a largura das colunas nas exportações XLSX
+XLSX_WIDTH_SAMPLE_ROWS = 1000
+
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'excel': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'pdf': 'application/pdf'
+}
+EXPORT_EXTENSIONS = {'csv': 'csv', 'excel': 'xlsx', 'pdf': 'pdf'}
+# Espelhos de ponto em lote (bulk_timesheets.py)
+TIMESHEET_MIMETYPE = 'application/zip'
+
+HISTORY_HEADERS = ['Data', 'Funcionário', 'Tipo de Ponto', 'Horário', 'Observação']
+REPORT_HEADERS = ['Funcionário', 'Função', 'Dias Trabalhados', 'Dias com Registro',
+                  'Total de Pontos', 'Dias Úteis', 'Faltas', 'Horas Trabalhadas', 'Horas Extras',
+                  'Atrasos', 'Banco de Horas', 'Frequência (%)']
+DETAILED_HEADERS = ['Data', 'Funcionário', 'Função', 'Tipo de Ponto', 'Horário', 'Observação']
+DETAILED_PDF_HEADERS = ['Tipo de Ponto', 'Horário', 'Observação']
+
+# Linhas por tabela nos PDFs (aprox. uma página A4)
+PDF_ROWS_PER_TABLE = 35
+
+# Comandos de estilo das tabelas dos PDFs (cores pelo nome, convertidas pelo reportlab)
+HISTORY_TABLE_STYLE = [
+    ('BACKGROUND', (0, 0), (-1, 0), 'green'),
+    ('TEXTCOLOR', (0, 0), (-1, 0), 'whitesmoke'),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), 'beige'),
+    ('GRID', (0, 0), (-1, -1), 1, 'black')
+]
+
+REPORT_TABLE_STYLE = [
+    ('BACKGROUND', (0, 0), (-1, 0), 'green'),
+    ('TEXTCOLOR', (0, 0), (-1, 0), 'whitesmoke'),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 9),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), 'beige'),
+    ('GRID', (0, 0), (-1, -1), 1, 'black')
+]
+
+DETAILED_TABLE_STYLE = [
+    ('BACKGROUND', (0, 0), (-1, 0), 'lightblue'),
+    ('TEXTCOLOR', (0, 0), (-1, 0), 'black'),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+    ('BACKGROUND', (0, 1), (-1, -1), 'white'),
+    ('GRID', (0, 0), (-1, -1), 1, 'black'),
+    ('FONTSIZE', (0, 1), (-1, -1), 9)
+]
+
+@lru_cache(maxsize=None)
+def pdf_styles():
+    """Estilos de parágrafo compartilhados por todos os PDFs"""
+    from reportlab.lib.styles import getSampleStyleSheet
+    return getSampleStyleSheet()
+
+class NoExportData(Exception):
+    """Nenhum dado encontrado para exportar."""
+
+def convert_date_for_db(date_str):
+    """Converte DD-MM-YYYY para YYYY-MM-DD (outros formatos passam direto)"""
+    if date_str and '-' in date_str:
+        parts = date_str.split('-')
+        if len(parts[0]) == 2:  # DD-MM-YYYY format
+            return f"{parts[2]}-{parts[1]}-{parts[0]}"
+    return date_str
+
+# --- Consultas ---
+
+def history_rows(db, employee_id=None):
+    """Linhas do histórico de pontos, lidas do cursor sob demanda.
+
+    Retorna (cabeçalhos, iterador de linhas, prefixo do nome do arquivo).
+    """
+    if employee_id:
+        punches = segment_rows(db, '''
+            SELECT p.data, p.tipo, p.hora, p.observacao, u.nome as funcionario
+            FROM {pontos} p
+            JOIN usuarios u ON p.usuario_id = u.id
+            WHERE p.data BETWEEN ? AND ? AND p.usuario_id = ?
+            ORDER BY p.data DESC, p.hora DESC
+        ''', (employee_id,), newest_first=True)
+        filename_prefix = f"historico_funcionario_{employee_id}"
+    else:
+        # CROSS JOIN: percorre pontos pelo índice (data, hora), já na ordem do arquivo
+        punches = segment_rows(db, '''
+            SELECT p.data, p.tipo, p.hora, p.observacao, u.nome as funcionario
+            FROM {pontos} p
+            CROSS JOIN usuarios u ON p.usuario_id = u.id
+            WHERE p.data BETWEEN ? AND ? AND u.perfil = 'colaborador'
+            ORDER BY p.data DESC, p.hora DESC
+        ''', newest_first=True)
+        filename_prefix = "historico_todos_funcionarios"
+
+    # Os anos arquivados são lidos um de cada vez, do mais recente ao mais antigo
+    first_chunk = list(itertools.islice(punches, EXPORT_CHUNK_SIZE))
+    if not first_chunk:
+        raise NoExportData()
+
+    rows = ((punch['data'], punch['funcionario'], PUNCH_LABELS.get(punch['tipo'], punch['tipo']),
+             punch['hora'][:5], punch['observacao'] or '-')
+            for punch in itertools.chain(first_chunk, punches))
+    return HISTORY_HEADERS, rows, filename_prefix
+
+def report_summary_rows(db, start_date_db, end_date_db):
+    """Linhas do relatório geral de frequência e horas de todos os colaboradores"""
+    report_data = timesheet_summary(db, start_date_db, end_date_db)
+
+    if not report_data:
+        raise NoExportData()
+
+    return [(emp['nome'], emp['funcao'], emp['dias_trabalhados'], emp['dias_com_registro'],
+             emp['total_pontos'], emp['dias_uteis'], emp['faltas'],
+             format_minutes(emp['minutos_trabalhados']), format_minutes(emp['minutos_extras']),
+             format_minutes(emp['minutos_atraso']), format_minutes(emp['saldo_minutos']),
+             emp['frequencia'])
+            for emp in report_data]
+
+def detailed_punches(db, employee_id, start_date_db, end_date_db):
+    """Colaborador (nome e função) e os seus pontos no período, em colunas ordenadas por data e hora"""
+    employee = db.execute('SELECT nome, funcao FROM usuarios WHERE id = ?', (employee_id,)).fetchone()
+    if not employee:
+        raise NoExportData()
+
+    punches = load_punches(db, start_date_db, end_date_db, employee_id=employee_id, observations=True)
+    if not len(punches):
+        raise NoExportData()
+    return employee, punches.sorted()
+
+# --- Escrita dos arquivos ---
+
+def csv_chunks(headers, rows):
+    """Gera o CSV em blocos de bytes (com BOM para o Excel)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    yield '\ufeff'.encode('utf-8') + buffer.getvalue().encode('utf-8')
+
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, EXPORT_CHUNK_SIZE))
+        if not chunk:
+            break
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode('utf-8')
+
+def write_csv(headers, rows, output):
+    for chunk in csv_chunks(headers, rows):
+        output.write(chunk)
+
+def write_xlsx(headers, rows, output, sheet_name='Dados'):
+    """Gera o XLSX em modo write-only, em uma única passada sobre as linhas.
+
+    As larguras das colunas precisam ser definidas antes da primeira linha no
+    modo write-only, então são calculadas sobre as primeiras linhas (amostra)
+    enquanto elas passam.
+    """
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+
+    rows = iter(rows)
+    sample = list(itertools.islice(rows, XLSX_WIDTH_SAMPLE_ROWS))
+
+    widths = [len(str(header)) for header in headers]
+    for row in sample:
+        for i, value in enumerate(row):
+            length = len(str(value))
+            if length > widths[i]:
+                widths[i] = length
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(sheet_name)
+    for i, width in enumerate(widths, start=1):
+        worksheet.column_dimensions[get_column_letter(i)].width = min(width + 2, 50)
+
+    worksheet.append(headers)
+    for row in itertools.chain(sample, rows):
+        worksheet.append(row)
+
+    workbook.save(output)
+
+def pdf_column_widths(headers, sample, available_width):
+    """Larguras das colunas medidas no primeiro bloco e ajustadas à página"""
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    widths = [stringWidth(str(header), 'Helvetica-Bold', 10) for header in headers]
+    for row in sample:
+        for i, value in enumerate(row):
+            width = stringWidth(str(value), 'Helvetica', 10)
+            if width > widths[i]:
+                widths[i] = width
+    widths = [width + 12 for width in widths]
+
+    total = sum(widths)
+    if total > available_width:
+        widths = [width * available_width / total for width in widths]
+    return widths
+
+def paged_tables(headers, rows, style, available_width):
+    """Divide as linhas em tabelas do tamanho de uma página.
+
+    Cada bloco vira uma LongTable com o cabeçalho repetido e as mesmas
+    larguras fixas, então o reportlab não precisa medir nem dividir uma
+    tabela gigante. Todas compartilham o mesmo objeto TableStyle.
+    """
+    from reportlab.platypus import LongTable, TableStyle
+
+    style = TableStyle(style)
+    rows = iter(rows)
+    col_widths = None
+    while True:
+        chunk = [list(row) for row in itertools.islice(rows, PDF_ROWS_PER_TABLE)]
+        if not chunk:
+            break
+        if col_widths is None:
+            col_widths = pdf_column_widths(headers, chunk, available_width)
+        table = LongTable([headers] + chunk, colWidths=col_widths, repeatRows=1)
+        table.setStyle(style)
+        yield table
+
+def write_pdf_history(headers, rows, output):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+
+    styles = pdf_styles()
+    doc = SimpleDocTemplate(output, pagesize=A4)
+    story = []
+
+    # Título
+    title = Paragraph("Histórico de Pontos", styles['Title'])
+    story.append(title)
+    story.append(Spacer(1, 12))
+
+    # Tabelas do tamanho de uma página
+    story.extend(paged_tables(headers, rows, HISTORY_TABLE_STYLE, doc.width))
+    doc.build(story)
+
+def write_pdf_report(headers, rows, output, start_date, end_date):
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+
+    styles = pdf_styles()
+    doc = SimpleDocTemplate(output, pagesize=landscape(A4))
+    story = []
+
+    # Título
+    title = Paragraph("Relatório de Frequência", styles['Title'])
+    story.append(title)
+    story.append(Spacer(1, 12))
+
+    # Período
+    period = Paragraph(f"Período: {start_date} a {end_date}", styles['Normal'])
+    story.append(period)
+    story.append(Spacer(1, 12))
+
+    # Tabelas do tamanho de uma página
+    story.extend(paged_tables(headers, rows, REPORT_TABLE_STYLE, doc.width))
+    doc.build(story)
+
+def write_detailed_xlsx(punches, output, employee):
+    def rows():
+        for day, day_punches in punches.by_day():
+            formatted_date = day.strftime('%d-%m-%Y')
+            for punch in day_punches:
+                yield (formatted_date, employee['nome'], employee['funcao'], PUNCH_LABELS[punch['tipo']],
+                       punch['hora'], punch['observacao'] or '')
+
+    write_xlsx(DETAILED_HEADERS, rows(), output, sheet_name='Relatório Detalhado')
+
+def write_detailed_pdf(punches, output, employee, start_date, end_date):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+    styles = pdf_styles()
+    doc = SimpleDocTemplate(output, pagesize=A4)
+    story = []
+
+    # Título
+    title = Paragraph(f"Relatório Detalhado - {employee['nome']}", styles['Title'])
+    story.append(title)
+    story.append(Spacer(1, 12))
+
+    # Período
+    period = Paragraph(f"Período: {start_date} a {end_date}", styles['Normal'])
+    story.append(period)
+    story.append(Spacer(1, 20))
+
+    # Create content for each date, all tables sharing the same widths and style
+    col_widths = [doc.width * 0.3, doc.width * 0.15, doc.width * 0.55]
+    style = TableStyle(DETAILED_TABLE_STYLE)
+    for day, day_punches in punches.by_day():
+        # Date header
+        date_header = Paragraph(f"<b>{day.strftime('%d-%m-%Y')}</b>", styles['Heading2'])
+        story.append(date_header)
+        story.append(Spacer(1, 6))
+
+        # Create table for this date
+        table_data = [DETAILED_PDF_HEADERS]
+
+        for punch in day_punches:
+            table_data.append([
+                PUNCH_LABELS[punch['tipo']],
+                punch['hora'],
+                punch['observacao'] or '-'
+            ])
+
+        table = Table(table_data, colWidths=col_widths)
+        table.setStyle(style)
+
+        story.append(table)
+        story.append(Spacer(1, 15))
+
+    doc.build(story)
+
+# --- Ponto de entrada único ---
+
+def build_export(db, kind, params, output):
+    """Gera a exportação ``kind`` ('history' ou 'report') em ``output``.
+
+    ``params`` traz format, employee_id e, para relatórios, start_date e
+    end_date como digitados pelo usuário. Retorna o nome do arquivo.
+    Levanta NoExportData quando não há dados e ValueError para formatos
+    inválidos.
+    """
+    format_type = params.get('format')
+    employee_id = params.get('employee_id')
+    if format_type not in EXPORT_MIMETYPES:
+        raise ValueError('Formato de exportação inválido!')
+    extension = EXPORT_EXTENSIONS[format_type]
+
+    if kind == 'history':
+        headers, rows, filename_prefix = history_rows(db, employee_id)
+        if format_type == 'csv':
+            write_csv(headers, rows, output)
+        elif format_type == 'excel':
+            write_xlsx(headers, rows, output)
+        else:
+            write_pdf_history(headers, rows, output)
+        return f"{filename_prefix}.{extension}"
+
+    if kind != 'report':
+        raise ValueError('Tipo de exportação inválido!')
+
+    start_date = params['start_date']
+    end_date = params['end_date']
+    start_date_db = convert_date_for_db(start_date)
+    end_date_db = convert_date_for_db(end_date)
+
+    if employee_id:
+        if format_type == 'csv':
+            raise ValueError('Formato de exportação inválido para relatório detalhado!')
+        employee, punches = detailed_punches(db, employee_id, start_date_db, end_date_db)
+        filename = f"relatorio_detalhado_{employee['nome']}_{start_date}_a_{end_date}".replace(' ', '_')
+        if format_type == 'excel':
+            write_detailed_xlsx(punches, output, employee)
+        else:
+            write_detailed_pdf(punches, output, employee, start_date, end_date)
+        return f"{filename}.{extension}"
+
+    rows = report_summary_rows(db, start_date_db, end_date_db)
+    if format_type == 'csv':
+        write_csv(REPORT_HEADERS, rows, output)
+    elif format_type == 'excel':
+        write_xlsx(REPORT_HEADERS, rows, output)
+    else:
+        write_pdf_report(REPORT_HEADERS, rows, output, start_date, end_date)
+    return f"relatorio_frequencia_{start_date}_a_{end_date}.{extension}"
+
+def run_export_job(database, job_id, kind, params, path):
+    """Executa um job de exportação dentro do pool de processos"""
+    if kind == 'timesheets':
+        # O job de espelhos coordena o seu próprio pool para desenhar os PDFs
+        from bulk_timesheets import run_timesheet_job
+        return run_timesheet_job(database, job_id, params, path)
+    run_job(database, job_id, path, lambda db, output, progress: build_export(db, kind, params, output))
+
+def read_only_connection(database):
+    """Conexão somente leitura (mode=ro e query_only) ao banco ``database``"""
+    uri = pathlib.Path(database).resolve().as_uri() + '?mode=ro'
+    db = sqlite3.connect(uri, uri=True, timeout=30)
+    db.execute('PRAGMA query_only = ON')
+    db.row_factory = sqlite3.Row
+    return db
+
+def run_job(database, job_id, path, build):
+    """Executa ``build(db, output, progress)`` registrando o resultado na tabela export_jobs.
+
+    ``build`` lê por uma conexão somente leitura e grava o arquivo em
+    ``output``; o estado do job e o andamento (``progress(prontos, total)``)
+    vão por outra conexão, que só segura o lock de escrita nesses UPDATEs
+    curtos. O arquivo é gravado em ``path`` via arquivo temporário + rename e
+    ``build`` retorna o nome do arquivo.
+    """
+    db = sqlite3.connect(database, timeout=30)
+    db.row_factory = sqlite3.Row
+    reader = None
+    try:
+        db.execute("UPDATE export_jobs SET status = 'running' WHERE id = ?", (job_id,))
+        db.commit()
+
+        tmp_path = f"{path}.tmp"
+        try:
+            reader = read_only_connection(database)
+            with open(tmp_path, 'wb') as output:
+                filename = build(reader, output, lambda done, total: job_progress(db, job_id, done, total))
+            os.replace(tmp_path, path)
+        except NoExportData:
+            status, filename, error = 'empty', None, 'Nenhum dados encontrados para exportar!'
+        except Exception as e:
+            status, filename, error = 'error', None, str(e)
+        else:
+            status, error = 'done', None
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        db.execute('''
+            UPDATE export_jobs
+            SET status = ?, nome_arquivo = ?, erro = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (status, filename, error, job_id))
+        db.commit()
+    finally:
+        if reader is not None:
+            reader.close()
+        db.close()
+
+def job_progress(db, job_id, done, total):
+    """Grava o andamento de um job (itens prontos de ``total``)"""
+    db.execute('UPDATE export_jobs SET progresso = ?, total = ? WHERE id = ?', (done, total, job_id))
+    db.commit()
@@ -0,0 +1,229 @@
+"""Modo quiosque: registro de ponto por crachá e PIN.
+
+Um dispositivo cadastrado pelo administrador recebe um token assinado com a
+SECRET_KEY e envia o crachá e o PIN do funcionário em um único POST, sem o
+login (e o check_password_hash proposital) de cada pessoa na troca de turno.
+
+O PIN é guardado como HMAC-SHA256 com a chave KIOSK_PIN_KEY, então conferir
+custa microssegundos; as credenciais e os dispositivos ficam em cache no
+worker e são invalidados pela versão 'quiosque' de versoes_datas (e as
+credenciais também pela '*', dos usuários), sem derrubar o cache de
+relatórios. Depois de KIOSK_MAX_PIN_ATTEMPTS PINs errados o crachá fica
+bloqueado por KIOSK_LOCKOUT_SECONDS; no máximo KIOSK_MAX_TRACKED_BADGES
+crachás com erros ficam na memória, os mais antigos saem primeiro.
+"""
+import hashlib
+import hmac
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from flask import request, jsonify
+from flask_login import login_required, current_user
+from itsdangerous import BadSignature, URLSafeSerializer
+
+from app import app
+from auth import UserCache, USER_CACHE_TTL
+from database import get_db, get_read_db
+from report_cache import ALL_DATES, KIOSK_VERSION
+from routes import PUNCH_NAMES, insert_next_punch
+
+KIOSK_PIN_KEY = os.environ.get('KIOSK_PIN_KEY', app.secret_key)
+KIOSK_MAX_PIN_ATTEMPTS = int(os.environ.get('KIOSK_MAX_PIN_ATTEMPTS', 5))
+KIOSK_LOCKOUT_SECONDS = int(os.environ.get('KIOSK_LOCKOUT_SECONDS', 300))
+KIOSK_MAX_TRACKED_BADGES = int(os.environ.get('KIOSK_MAX_TRACKED_BADGES', 10000))
+
+PIN_RE = re.compile(r'^\d{4,8}$')
+
+# Credenciais por crachá e dispositivos ativos, em cache como os usuários
+credential_cache = UserCache(ttl=USER_CACHE_TTL, version_keys=(ALL_DATES, KIOSK_VERSION))
+device_cache = UserCache(ttl=USER_CACHE_TTL, version_keys=(KIOSK_VERSION,))
+
+# Crachá -> (tentativas, hora do primeiro erro), na ordem do primeiro erro
+_failures = OrderedDict()
+_failures_lock = threading.Lock()
+
+def device_serializer():
+    return URLSafeSerializer(app.secret_key, salt='kiosk-device')
+
+def hash_pin(usuario_id, pin):
+    message = f'{usuario_id}:{pin}'.encode('utf-8')
+    return hmac.new(KIOSK_PIN_KEY.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+def authorized_device(db):
+    """Id do dispositivo do cabeçalho Authorization: Bearer <token>, ou None"""
+    auth_header = request.headers.get('Authorization', '')
+    if not auth_header.startswith('Bearer '):
+        return None
+    try:
+        device_id = device_serializer().loads(auth_header[7:].strip())
+    except BadSignature:
+        return None
+
+    device_cache.check_version(lambda: db)
+    active = device_cache.get(device_id)
+    if active is None:
+        row = db.execute(
+            'SELECT ativo FROM dispositivos_quiosque WHERE id = ?', (device_id,)
+        ).fetchone()
+        active = bool(row and row['ativo'])
+        device_cache.put(device_id, active)
+    return device_id if active else None
+
+def get_credential(db, cracha):
+    """(usuario_id, nome, pin_hash) do crachá, ou None"""
+    credential_cache.check_version(lambda: db)
+    credential = credential_cache.get(cracha)
+    if credential is None:
+        row = db.execute('''
+            SELECT c.usuario_id, u.nome, c.pin_hash
+            FROM credenciais_quiosque c
+            JOIN usuarios u ON c.usuario_id = u.id
+            WHERE c.cracha = ? AND u.perfil = 'colaborador'
+        ''', (cracha,)).fetchone()
+        if not row:
+            return None
+        credential = tuple(row)
+        credential_cache.put(cracha, credential)
+    return credential
+
+def _prune_failures(now):
+    """Remove os erros vencidos e os mais antigos além do limite (chamar com o lock)"""
+    while _failures:
+        cracha, (attempts, since) = next(iter(_failures.items()))
+        if now - since <= KIOSK_LOCKOUT_SECONDS and len(_failures) <= KIOSK_MAX_TRACKED_BADGES:
+            break
+        del _failures[cracha]
+
+def is_locked(cracha):
+    with _failures_lock:
+        _prune_failures(time.monotonic())
+        attempts, since = _failures.get(cracha, (0, 0))
+        return attempts >= KIOSK_MAX_PIN_ATTEMPTS
+
+def record_failure(cracha):
+    with _failures_lock:
+        now = time.monotonic()
+        attempts, since = _failures.get(cracha, (0, now))
+        _failures[cracha] = (attempts + 1, since)
+        _prune_failures(now)
+
+@app.route('/kiosk/punch', methods=['POST'])
+def kiosk_punch():
+    db = get_read_db()
+    if not authorized_device(db):
+        return jsonify({'error': 'Dispositivo não autorizado!'}), 403
+
+    data = request.get_json(silent=True) or request.form
+    cracha = str(data.get('cracha') or '').strip()
+    pin = str(data.get('pin') or '').strip()
+    if not cracha or not pin:
+        return jsonify({'error': 'Informe o crachá e o PIN.'}), 400
+    if is_locked(cracha):
+        return jsonify({'error': 'Crachá bloqueado por excesso de tentativas. Aguarde alguns minutos.'}), 429
+
+    credential = get_credential(db, cracha)
+    if not credential or not hmac.compare_digest(hash_pin(credential[0], pin), credential[2]):
+        record_failure(cracha)
+        return jsonify({'error': 'Crachá ou PIN inválido!'}), 401
+
+    with _failures_lock:
+        _failures.pop(cracha, None)
+
+    usuario_id, nome, pin_hash = credential
+    try:
+        inserted = insert_next_punch(usuario_id, str(data.get('observacao') or '').strip())
+    except sqlite3.IntegrityError:
+        return jsonify({'error': 'Este ponto já foi registrado!'}), 409
+    except Exception as e:
+        app.logger.error(f'Error registering kiosk punch: {e}')
+        return jsonify({'error': 'Erro ao registrar ponto!'}), 500
+
+    if not inserted:
+        return jsonify({'error': 'Todos os pontos do dia já foram registrados!', 'funcionario': nome}), 409
+
+    return jsonify({
+        'funcionario': nome,
+        'tipo': inserted['tipo'],
+        'hora': inserted['hora'],
+        'mensagem': f'{PUNCH_NAMES[inserted["tipo"]]} registrada com sucesso às {inserted["hora"]}!'
+    })
+
+@app.route('/kiosk/devices', methods=['POST'])
+@login_required
+def register_kiosk_device():
+    """Cadastra um dispositivo e devolve o seu token (exibido uma única vez)"""
+    if current_user.perfil != 'admin':
+        return jsonify({'error': 'Acesso negado!'}), 403
+
+    data = request.get_json(silent=True) or request.form
+    nome = str(data.get('nome') or '').strip()
+    if not nome:
+        return jsonify({'error': 'Informe o nome do dispositivo.'}), 400
+
+    device_id = uuid.uuid4().hex
+    db = get_db()
+    db.execute('INSERT INTO dispositivos_quiosque (id, nome) VALUES (?, ?)', (device_id, nome))
+    db.commit()
+    return jsonify({'id': device_id, 'nome': nome, 'token': device_serializer().dumps(device_id)}), 201
+
+@app.route('/kiosk/devices/<device_id>', methods=['DELETE'])
+@login_required
+def revoke_kiosk_device(device_id):
+    if current_user.perfil != 'admin':
+        return jsonify({'error': 'Acesso negado!'}), 403
+
+    db = get_db()
+    db.execute('UPDATE dispositivos_quiosque SET ativo = 0 WHERE id = ?', (device_id,))
+    db.commit()
+    device_cache.invalidate(device_id)
+    return jsonify({'id': device_id, 'ativo': False})
+
+@app.route('/kiosk/credentials', methods=['POST'])
+@login_required
+def set_kiosk_credential():
+    """Define o crachá e o PIN de um colaborador"""
+    if current_user.perfil != 'admin':
+        return jsonify({'error': 'Acesso negado!'}), 403
+
+    data = request.get_json(silent=True) or request.form
+    employee_id = data.get('employee_id')
+    cracha = str(data.get('cracha') or '').strip()
+    pin = str(data.get('pin') or '').strip()
+    if not employee_id or not cracha:
+        return jsonify({'error': 'Informe o funcionário e o crachá.'}), 400
+    if not PIN_RE.match(pin):
+        return jsonify({'error': 'O PIN deve ter de 4 a 8 dígitos.'}), 400
+
+    db = get_db()
+    employee = db.execute(
+        "SELECT id FROM usuarios WHERE id = ? AND perfil = 'colaborador'", (employee_id,)
+    ).fetchone()
+    if not employee:
+        return jsonify({'error': 'Funcionário não encontrado!'}), 404
+
+    previous = db.execute(
+        'SELECT cracha FROM credenciais_quiosque WHERE usuario_id = ?', (employee['id'],)
+    ).fetchone()
+    try:
+        db.execute('''
+            INSERT INTO credenciais_quiosque (usuario_id, cracha, pin_hash)
+            VALUES (?, ?, ?)
+            ON CONFLICT (usuario_id) DO UPDATE SET
+                cracha = excluded.cracha,
+                pin_hash = excluded.pin_hash,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (employee['id'], cracha, hash_pin(employee['id'], pin)))
+        db.commit()
+    except sqlite3.IntegrityError:
+        db.rollback()
+        return jsonify({'error': 'Crachá já cadastrado para outro funcionário!'}), 409
+
+    credential_cache.invalidate(cracha)
+    if previous:
+        credential_cache.invalidate(previous['cracha'])
+    return jsonify({'employee_id': employee['id'], 'cracha': cracha})
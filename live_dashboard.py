@@ -0,0 +1,188 @@
+"""Dashboard administrativo ao vivo.
+
+/admin/status devolve a situação do dia em JSON com ETag. A ETag vem das
+versões de versoes_datas (a data de hoje e '*' para mudanças em usuarios),
+então um 304 custa duas buscas por chave primária, sem refazer a consulta.
+
+/admin/stream é um fluxo Server-Sent Events com os pontos registrados hoje.
+Um único thread por worker consulta as versões a cada
+LIVE_POLL_INTERVAL segundos, apenas enquanto houver alguém conectado, e
+repassa os pontos novos para todos os navegadores abertos. Quando a mudança
+não pode ser expressa como ponto novo (ponto removido, funcionário alterado,
+virada do dia) é enviado um evento 'reset' e o navegador recarrega o JSON.
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+from flask import request, jsonify, Response
+from flask_login import login_required, current_user
+
+from app import app
+from database import get_read_db, read_pool
+from report_cache import ALL_DATES
+from routes import get_brasilia_date, get_employees_today
+
+LIVE_POLL_INTERVAL = float(os.environ.get('LIVE_POLL_INTERVAL', 2))
+LIVE_HEARTBEAT = float(os.environ.get('LIVE_HEARTBEAT', 15))
+LIVE_QUEUE_SIZE = 256
+
+def today_versions(db, today_db):
+    """(versão de hoje, versão dos usuários) lidas de versoes_datas"""
+    versions = dict(db.execute(
+        'SELECT data, versao FROM versoes_datas WHERE data IN (?, ?)', (today_db, ALL_DATES)
+    ).fetchall())
+    return versions.get(today_db, 0), versions.get(ALL_DATES, 0)
+
+class LiveFeed:
+    """Distribui os pontos de hoje para os streams SSE deste worker"""
+
+    def __init__(self, interval=LIVE_POLL_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread = None
+        self._pid = None
+
+    def subscribe(self, subscriber=None):
+        """Registra uma fila (por padrão um queue.Queue) que recebe (evento, dados)"""
+        if subscriber is None:
+            subscriber = queue.Queue(maxsize=LIVE_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='live-feed', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((event, data))
+            except queue.Full:
+                # Navegador lento: descarta a fila e pede para recarregar tudo
+                with subscriber.mutex:
+                    subscriber.queue.clear()
+                subscriber.put_nowait(('reset', {}))
+
+    def _run(self):
+        state = None
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            try:
+                state = self._poll(state)
+            except Exception as e:
+                app.logger.error(f'Error polling live dashboard: {e}')
+            time.sleep(self.interval)
+
+    def _poll(self, state):
+        today_db = get_brasilia_date().strftime('%Y-%m-%d')
+        db = read_pool.acquire()
+        try:
+            versions = today_versions(db, today_db)
+            if state is None:
+                last_id = db.execute('SELECT COALESCE(MAX(id), 0) FROM pontos').fetchone()[0]
+                return today_db, versions, last_id
+
+            last_date, last_versions, last_id = state
+            if (today_db, versions) == (last_date, last_versions):
+                return state
+
+            punches = db.execute('''
+                SELECT p.id, p.usuario_id, p.tipo, p.hora
+                FROM pontos p
+                WHERE p.id > ? AND p.data = ?
+                ORDER BY p.id
+            ''', (last_id, today_db)).fetchall()
+            last_id = db.execute('SELECT COALESCE(MAX(id), 0) FROM pontos').fetchone()[0]
+        finally:
+            read_pool.release(db)
+
+        if today_db != last_date or versions[1] != last_versions[1] or not punches:
+            # Virada do dia, usuário alterado ou ponto removido
+            self.publish('reset', {'data': today_db})
+        else:
+            for punch in punches:
+                self.publish('ponto', dict(punch))
+        return today_db, versions, last_id
+
+live_feed = LiveFeed()
+
+def sse_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+@app.route('/admin/status')
+@login_required
+def admin_status():
+    """Situação de hoje em JSON, com ETag para respostas 304"""
+    if current_user.perfil != 'admin':
+        return jsonify({'error': 'Acesso negado!'}), 403
+
+    db = get_read_db()
+    today_db = get_brasilia_date().strftime('%Y-%m-%d')
+    etag = status_etag(db, today_db)
+    if etag in request.if_none_match:
+        return status_response(etag)
+    return status_response(etag, get_employees_today(db, today_db))
+
+def status_etag(db, today_db):
+    """ETag de /admin/status: muda com os pontos de hoje e com os usuários"""
+    punch_version, user_version = today_versions(db, today_db)
+    return f'{today_db}.{punch_version}.{user_version}'
+
+def status_response(etag, employees=None):
+    """Resposta de /admin/status com a situação dos colaboradores, ou 304 sem ``employees``"""
+    if employees is None:
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    employees = [dict(employee) for employee in employees]
+    response = jsonify({
+        'data': get_brasilia_date().strftime('%d-%m-%Y'),
+        'total_funcionarios': len(employees),
+        'funcionarios': employees
+    })
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/admin/stream')
+@login_required
+def admin_stream():
+    """Fluxo SSE com os pontos registrados hoje"""
+    if current_user.perfil != 'admin':
+        return jsonify({'error': 'Acesso negado!'}), 403
+
+    subscriber = live_feed.subscribe()
+
+    def events():
+        try:
+            yield f'retry: {int(LIVE_POLL_INTERVAL * 1000)}\n\n'
+            while True:
+                try:
+                    event, data = subscriber.get(timeout=LIVE_HEARTBEAT)
+                except queue.Empty:
+                    # Comentário SSE: mantém a conexão aberta e detecta navegadores fechados
+                    yield ': ping\n\n'
+                    continue
+                yield sse_event(event, data)
+        finally:
+            live_feed.unsubscribe(subscriber)
+
+    response = Response(events(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,193 @@
+"""Instrumentação das requisições.
+
+Cada requisição mede o tempo total, o SQL (contado e cronometrado pela
+conexão de get_db), a renderização dos templates Jinja e a geração das
+exportações. Os tempos saem no cabeçalho Server-Timing e são agregados em
+histogramas por endpoint, expostos em /metrics no formato texto do
+Prometheus. Os valores são por worker: cada processo do gunicorn expõe os
+seus próprios contadores.
+"""
+import hmac
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, request, jsonify, Response, before_render_template, template_rendered
+from flask_login import current_user
+
+from app import app
+from auth import user_cache
+from database import pool, read_pool
+from punch_writer import punch_writer
+from report_cache import report_cache
+
+# Token do coletor do Prometheus (cabeçalho Authorization: Bearer <token>)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500, 1000)
+
+class Histogram:
+    """Histograma cumulativo do Prometheus com um rótulo de endpoint"""
+
+    def __init__(self, name, help_text, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, endpoint, value):
+        with self._lock:
+            series = self._series.get(endpoint)
+            if series is None:
+                series = self._series[endpoint] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for endpoint, (counts, total, count) in sorted(self._series.items()):
+                label = f'endpoint="{endpoint}"'
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {bucket_count}')
+                lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+                lines.append(f'{self.name}_sum{{{label}}} {total:.6f}')
+                lines.append(f'{self.name}_count{{{label}}} {count}')
+        return lines
+
+class Counter:
+    """Contador do Prometheus com rótulos (endpoint, status)"""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, labels, value=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for (endpoint, status), value in sorted(self._values.items()):
+                lines.append(f'{self.name}{{endpoint="{endpoint}",status="{status}"}} {value}')
+        return lines
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds',
+                             'Tempo de resposta por endpoint (sem o corpo em streaming).')
+SQL_DURATION = Histogram('sql_duration_seconds', 'Tempo em SQLite por requisição.')
+SQL_QUERIES = Histogram('sql_queries_per_request', 'Instruções SQL por requisição.', QUERY_BUCKETS)
+RENDER_DURATION = Histogram('template_render_duration_seconds', 'Tempo renderizando templates por requisição.')
+EXPORT_DURATION = Histogram('export_build_duration_seconds', 'Tempo gerando exportações por requisição.')
+REQUESTS = Counter('http_requests_total', 'Requisições por endpoint e status.')
+
+def add_timing(name, seconds):
+    timings = g.setdefault('timings', {})
+    timings[name] = timings.get(name, 0.0) + seconds
+
+@contextmanager
+def timed(name):
+    """Soma o tempo do bloco à etapa ``name`` da requisição atual"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(name, time.perf_counter() - start)
+
+@before_render_template.connect_via(app)
+def start_render(sender, template, context, **extra):
+    g.render_started = time.perf_counter()
+
+@template_rendered.connect_via(app)
+def finish_render(sender, template, context, **extra):
+    started = g.pop('render_started', None)
+    if started is not None:
+        add_timing('render', time.perf_counter() - started)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is None or request.endpoint in (None, 'static'):
+        return response
+
+    endpoint = request.endpoint
+    total = time.perf_counter() - started
+    timings = g.get('timings', {})
+    sql = g.get('sql_stats')
+
+    REQUEST_DURATION.observe(endpoint, total)
+    REQUESTS.inc((endpoint, response.status_code))
+    server_timing = []
+    if sql is not None:
+        SQL_DURATION.observe(endpoint, sql.seconds)
+        SQL_QUERIES.observe(endpoint, sql.queries)
+        server_timing.append(f'db;dur={sql.seconds * 1000:.1f};desc="SQL ({sql.queries} queries)"')
+    if 'render' in timings:
+        RENDER_DURATION.observe(endpoint, timings['render'])
+        server_timing.append(f'render;dur={timings["render"] * 1000:.1f};desc="Jinja"')
+    if 'export' in timings:
+        EXPORT_DURATION.observe(endpoint, timings['export'])
+        server_timing.append(f'export;dur={timings["export"] * 1000:.1f};desc="Exportação"')
+    server_timing.append(f'total;dur={total * 1000:.1f}')
+    response.headers['Server-Timing'] = ', '.join(server_timing)
+    return response
+
+def gauge(name, help_text, value, metric_type='gauge'):
+    return [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}', f'{name} {value}']
+
+def is_authorized_scraper():
+    """Aceita um administrador logado ou o token do Prometheus"""
+    if current_user.is_authenticated and current_user.perfil == 'admin':
+        return True
+    auth_header = request.headers.get('Authorization', '')
+    if METRICS_TOKEN and auth_header.startswith('Bearer '):
+        return hmac.compare_digest(auth_header[7:].strip(), METRICS_TOKEN)
+    return False
+
+@app.route('/metrics')
+def metrics():
+    """Métricas deste worker no formato texto do Prometheus"""
+    if not is_authorized_scraper():
+        return jsonify({'error': 'Acesso negado!'}), 403
+
+    lines = []
+    for metric in (REQUEST_DURATION, REQUESTS, SQL_DURATION, SQL_QUERIES, RENDER_DURATION, EXPORT_DURATION):
+        lines += metric.render()
+
+    for prefix, label, connection_pool in (('db_pool', 'no pool', pool),
+                                           ('db_read_pool', 'no pool de leitura', read_pool)):
+        pool_stats = connection_pool.stats()
+        lines += gauge(f'{prefix}_connections', f'Conexões abertas {label}.', pool_stats['created'])
+        lines += gauge(f'{prefix}_in_use', f'Conexões em uso {label}.', pool_stats['in_use'])
+        lines += gauge(f'{prefix}_waits_total', f'Esperas por conexão livre {label}.',
+                       pool_stats['waits'], 'counter')
+        lines += gauge(f'{prefix}_timeouts_total', f'Esperas que estouraram o tempo {label}.',
+                       pool_stats['timeouts'], 'counter')
+
+    writer_stats = punch_writer.stats()
+    lines += gauge('punch_writer_batches_total', 'Lotes de pontos gravados em grupo.',
+                   writer_stats['batches'], 'counter')
+    lines += gauge('punch_writer_punches_total', 'Pontos gravados em grupo.', writer_stats['punches'], 'counter')
+
+    cache_stats = report_cache.stats()
+    lines += gauge('report_cache_hits_total', 'Acertos do cache de relatórios.', cache_stats['hits'], 'counter')
+    lines += gauge('report_cache_misses_total', 'Falhas do cache de relatórios.', cache_stats['misses'], 'counter')
+    lines += gauge('report_cache_bytes', 'Tamanho estimado do cache de relatórios.', cache_stats['size_bytes'])
+
+    user_stats = user_cache.stats()
+    lines += gauge('user_cache_hits_total', 'Acertos do cache de usuários.', user_stats['hits'], 'counter')
+    lines += gauge('user_cache_misses_total', 'Falhas do cache de usuários.', user_stats['misses'], 'counter')
+
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,179 @@
+"""Pontos de um período em colunas compactas.
+
+Relatórios e exportações recebiam os pontos como sqlite3.Row, com data, tipo
+e hora em texto, e reinterpretavam esses textos a cada uso. PunchColumns
+guarda os mesmos pontos em arrays NumPy paralelos: usuario_id (int32), dia
+(int32, dias desde 1970-01-01), tipo (int8, posição em PUNCH_TYPES) e hora
+(int32, segundos desde a meia-noite), 13 bytes por ponto. As observações,
+preenchidas em poucos pontos, ficam em um dict à parte.
+
+load_punches lê as colunas direto do cursor, PUNCH_STORE_BATCH_DAYS linhas
+por vez: o SQLite empacota os pontos de cada dia em inteiros e o NumPy os
+decodifica sem criar um objeto Python por ponto.
+
+PUNCH_TYPES é a lista dos tipos de ponto usada por toda a aplicação (rotas,
+importação em lote e os códigos da coluna tipo). As colunas são só arrays e
+um dict, então cabem no cache de relatórios (report_cache.py) como estão.
+"""
+import itertools
+import os
+from datetime import date, timedelta
+
+from archive import segment_rows
+
+# Tipos de ponto na ordem da jornada; a posição é o código da coluna ``tipo``
+PUNCH_TYPES = ('entrada', 'saida_almoco', 'volta_almoco', 'saida_final')
+TIPO_CODES = {tipo: code for code, tipo in enumerate(PUNCH_TYPES)}
+
+# Linhas (dias) do cursor decodificadas por vez
+PUNCH_STORE_BATCH_DAYS = int(os.environ.get('PUNCH_STORE_BATCH_DAYS', 64))
+
+EPOCH = date(1970, 1, 1)
+
+# Um texto por dia com os pontos empacotados como inteiros (usuario_id << 20 |
+# tipo << 17 | segundos): evita criar uma tupla Python por ponto
+PUNCHES_SQL = '''
+    SELECT p.data,
+           group_concat((p.usuario_id << 20)
+                        | (CASE p.tipo WHEN 'entrada' THEN 0 WHEN 'saida_almoco' THEN 1
+                                       WHEN 'volta_almoco' THEN 2 ELSE 3 END << 17)
+                        | (CAST(substr(p.hora, 1, 2) AS INTEGER) * 3600
+                           + CAST(substr(p.hora, 4, 2) AS INTEGER) * 60
+                           + CAST(substr(p.hora, 7, 2) AS INTEGER)), ' ')
+    FROM {pontos} p
+    WHERE p.data BETWEEN ? AND ? {employee_filter}
+    GROUP BY p.data
+'''
+
+OBSERVATIONS_SQL = '''
+    SELECT p.usuario_id, p.data, p.tipo, p.observacao
+    FROM {pontos} p
+    WHERE p.data BETWEEN ? AND ? AND p.observacao IS NOT NULL AND p.observacao != '' {employee_filter}
+'''
+
+def day_number(value):
+    """YYYY-MM-DD em dias desde 1970-01-01"""
+    return (date.fromisoformat(value) - EPOCH).days
+
+def day_date(number):
+    return EPOCH + timedelta(days=int(number))
+
+def format_clock(seconds):
+    """Segundos desde a meia-noite como HH:MM"""
+    return f'{seconds // 3600:02d}:{seconds % 3600 // 60:02d}'
+
+class PunchColumns:
+    """Pontos em arrays paralelos, uma posição por ponto"""
+
+    def __init__(self, usuario_id, day, tipo, seconds, observations=None):
+        self.usuario_id = usuario_id
+        self.day = day
+        self.tipo = tipo
+        self.seconds = seconds
+        # {(usuario_id, dia, tipo): observação}
+        self.observations = observations or {}
+
+    @classmethod
+    def empty(cls):
+        import numpy as np
+        return cls(np.empty(0, np.int32), np.empty(0, np.int32), np.empty(0, np.int8), np.empty(0, np.int32))
+
+    @classmethod
+    def from_cursor(cls, rows, batch_size=PUNCH_STORE_BATCH_DAYS):
+        """Lê as linhas (data, pontos empacotados) de PUNCHES_SQL, ``batch_size`` por vez"""
+        import numpy as np
+
+        rows = iter(rows)
+        columns = ([], [], [], [])
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            packed = [np.fromstring(punches, dtype=np.int64, sep=' ') for data, punches in batch]
+            day = np.repeat([day_number(data) for data, punches in batch], [len(values) for values in packed])
+            packed = np.concatenate(packed)
+            columns[0].append((packed >> 20).astype(np.int32))
+            columns[1].append(day.astype(np.int32))
+            columns[2].append(((packed >> 17) & 3).astype(np.int8))
+            columns[3].append((packed & 0x1FFFF).astype(np.int32))
+        if not columns[0]:
+            return cls.empty()
+        return cls(*(np.concatenate(column) for column in columns))
+
+    def __len__(self):
+        return len(self.seconds)
+
+    @property
+    def nbytes(self):
+        return (self.usuario_id.nbytes + self.day.nbytes + self.tipo.nbytes + self.seconds.nbytes
+                + sum(len(text) + 100 for text in self.observations.values()))
+
+    def take(self, positions):
+        """Os pontos de ``positions`` (índices ou máscara), com as mesmas observações"""
+        return PunchColumns(self.usuario_id[positions], self.day[positions], self.tipo[positions],
+                            self.seconds[positions], self.observations)
+
+    def sorted(self):
+        """Ordenados por funcionário, dia e hora"""
+        import numpy as np
+        return self.take(np.lexsort((self.seconds, self.day, self.usuario_id)))
+
+    def matrix(self, employee_ids, first_day, n_days):
+        """Horários (segundos, NaN sem ponto) em uma matriz funcionários x dias x tipos.
+
+        Pontos de quem não está em ``employee_ids`` ou fora dos ``n_days``
+        dias a partir de ``first_day`` ficam de fora.
+        """
+        import numpy as np
+
+        times = np.full((len(employee_ids), n_days, 4), np.nan)
+        if not len(self):
+            return times
+
+        # Índice denso dos funcionários
+        ids = np.asarray(employee_ids, dtype=np.int64)
+        index = np.full(max(ids.max(), self.usuario_id.max()) + 1, -1, dtype=np.int64)
+        index[ids] = np.arange(len(ids))
+        employee = index[self.usuario_id]
+        day = self.day - first_day
+        known = (employee >= 0) & (day >= 0) & (day < n_days)
+        times[employee[known], day[known], self.tipo[known]] = self.seconds[known]
+        return times
+
+    def by_day(self):
+        """Gera (data, pontos do dia) na ordem das colunas.
+
+        Cada ponto é um dict com usuario_id, tipo, hora (HH:MM) e observacao.
+        """
+        columns = zip(self.usuario_id.tolist(), self.day.tolist(), self.tipo.tolist(), self.seconds.tolist())
+        for day, punches in itertools.groupby(columns, key=lambda punch: punch[1]):
+            yield day_date(day), [{
+                'usuario_id': usuario_id,
+                'tipo': PUNCH_TYPES[tipo],
+                'hora': format_clock(seconds),
+                'observacao': self.observations.get((usuario_id, day, tipo)),
+            } for usuario_id, day, tipo, seconds in punches]
+
+def load_punches(db, start_date_db, end_date_db, employee_id=None, id_range=None, observations=False):
+    """Pontos do período em colunas: de todos, do ``employee_id`` ou dos ids em ``id_range``.
+
+    ``id_range`` é (menor, maior). Com ``observations`` as observações são
+    lidas em uma segunda consulta. Anos arquivados são lidos dos seus
+    arquivos (archive.py).
+    """
+    if employee_id:
+        employee_filter, params = 'AND p.usuario_id = ?', (employee_id,)
+    elif id_range:
+        employee_filter, params = 'AND p.usuario_id BETWEEN ? AND ?', tuple(id_range)
+    else:
+        employee_filter, params = '', ()
+
+    sql = PUNCHES_SQL.format(employee_filter=employee_filter, pontos='{pontos}')
+    punches = PunchColumns.from_cursor(segment_rows(db, sql, params, start_date_db, end_date_db))
+    if observations and len(punches):
+        sql = OBSERVATIONS_SQL.format(employee_filter=employee_filter, pontos='{pontos}')
+        punches.observations = {
+            (row['usuario_id'], day_number(row['data']), TIPO_CODES.get(row['tipo'], 3)): row['observacao']
+            for row in segment_rows(db, sql, params, start_date_db, end_date_db)
+        }
+    return punches
@@ -0,0 +1,170 @@
+"""Gravação dos pontos em grupo (group commit).
+
+Com PUNCH_GROUP_COMMIT=1 cada worker tem um único thread de gravação. As
+rotas /punch e /kiosk/punch entregam o INSERT do ponto a esse thread e
+esperam o resultado em um Future, então o funcionário continua vendo a
+confirmação do ponto registrado. O thread junta os pedidos que chegaram
+enquanto o lote anterior era gravado (no máximo PUNCH_BATCH_SIZE) e grava o
+lote em uma única transação: um commit, e uma escrita no WAL das páginas de
+pontos, resumo_diario e versoes_datas, por lote em vez de por ponto.
+
+Quanto mais lento o commit, maiores os lotes. PUNCH_BATCH_MS faz o thread
+esperar ainda esse tempo por mais pedidos depois do primeiro; vale a pena
+só com synchronous=FULL ou discos com fsync caro, porque nos demais casos
+atrasa todo ponto isolado.
+
+Cada pedido roda em um SAVEPOINT próprio: um ponto duplicado
+(IntegrityError) volta só para quem o enviou e o resto do lote é gravado.
+Se o commit falhar, todos os pedidos do lote recebem o erro.
+
+O thread usa uma conexão fixa do pool de escrita de database.py. Se não
+conseguir abri-la (pool esgotado, banco travado), os pedidos do lote recebem
+o erro em vez de esperar PUNCH_WRITE_TIMEOUT, e o próximo lote tenta de novo.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+
+from app import app
+from database import pool
+
+PUNCH_GROUP_COMMIT = os.environ.get('PUNCH_GROUP_COMMIT', '0') == '1'
+PUNCH_BATCH_MS = float(os.environ.get('PUNCH_BATCH_MS', 0))
+PUNCH_BATCH_SIZE = int(os.environ.get('PUNCH_BATCH_SIZE', 200))
+# Tempo máximo que a requisição espera pelo commit do seu lote
+PUNCH_WRITE_TIMEOUT = float(os.environ.get('PUNCH_WRITE_TIMEOUT', 30))
+
+# Insere o próximo tipo de ponto do dia em uma única instrução atômica;
+# o índice único (usuario_id, data, tipo) impede registros duplicados
+NEXT_PUNCH_SQL = '''
+    INSERT INTO pontos (usuario_id, data, tipo, hora, observacao)
+    SELECT :usuario_id, :data, t.tipo, :hora, :observacao
+    FROM (
+        SELECT 1 AS ordem, 'entrada' AS tipo
+        UNION ALL SELECT 2, 'saida_almoco'
+        UNION ALL SELECT 3, 'volta_almoco'
+        UNION ALL SELECT 4, 'saida_final'
+    ) t
+    WHERE NOT EXISTS (
+        SELECT 1 FROM pontos p
+        WHERE p.usuario_id = :usuario_id AND p.data = :data AND p.tipo = t.tipo
+    )
+    ORDER BY t.ordem
+    LIMIT 1
+    RETURNING tipo, hora
+'''
+
+class PunchWriter:
+    """Thread único que grava os pontos deste worker em lotes"""
+
+    def __init__(self, max_wait=PUNCH_BATCH_MS / 1000, max_batch=PUNCH_BATCH_SIZE):
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._queue = None
+        self._pid = None
+        self.batches = 0
+        self.punches = 0
+
+    def submit(self, params):
+        """Entrega o ponto de ``params`` (parâmetros de NEXT_PUNCH_SQL) ao thread.
+
+        Retorna um Future resolvido no commit do lote com a linha inserida,
+        ou None se o dia já está completo; as exceções são as mesmas do
+        INSERT direto.
+        """
+        future = Future()
+        self._start().put((params, future))
+        return future
+
+    def insert(self, params, timeout=PUNCH_WRITE_TIMEOUT):
+        """Como submit, mas bloqueia até o commit do lote e retorna a linha inserida"""
+        return self.submit(params).result(timeout=timeout)
+
+    def _start(self):
+        # Um thread por processo: depois de um fork o filho abre o seu
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                threading.Thread(target=self._run, args=(self._queue,),
+                                 name='punch-writer', daemon=True).start()
+            return self._queue
+
+    def _collect(self, requests):
+        """Espera o primeiro pedido e junta os que já estão na fila ou chegam em até max_wait"""
+        batch = [requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(requests.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, requests):
+        db = None
+        while True:
+            batch = self._collect(requests)
+            try:
+                if db is None:
+                    # Dentro do try: sem conexão o lote recebe o erro e o próximo tenta de novo
+                    db = pool.acquire()
+                results = self._write(db, batch)
+            except Exception as e:
+                app.logger.error(f'Error writing punch batch: {e}')
+                if db is not None:
+                    try:
+                        db.rollback()
+                    except sqlite3.Error:
+                        pass
+                results = [(None, e)] * len(batch)
+
+            with self._lock:
+                self.batches += 1
+                self.punches += len(batch)
+            for (params, future), (row, error) in zip(batch, results):
+                try:
+                    if error is not None:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(row)
+                except InvalidStateError:
+                    # Pedido cancelado por quem o enviou
+                    pass
+
+    def _write(self, db, batch):
+        """Grava o lote em uma transação; retorna (linha, erro) de cada pedido"""
+        results = []
+        db.execute('BEGIN IMMEDIATE')
+        for params, future in batch:
+            db.execute('SAVEPOINT ponto')
+            try:
+                results.append((db.execute(NEXT_PUNCH_SQL, params).fetchone(), None))
+            except sqlite3.Error as e:
+                db.execute('ROLLBACK TO ponto')
+                results.append((None, e))
+            db.execute('RELEASE ponto')
+        db.commit()
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': PUNCH_GROUP_COMMIT,
+                'batches': self.batches,
+                'punches': self.punches,
+            }
+
+punch_writer = PunchWriter()
@@ -0,0 +1,162 @@
+"""Cache LRU dos relatórios e exportações.
+
+Cada worker guarda em memória os resultados das consultas de relatório e os
+arquivos de exportação já gerados, indexados por (tipo, período,
+funcionário, formato). O tamanho total é limitado e as entradas menos usadas
+são descartadas primeiro.
+
+A invalidação é feita pela tabela versoes_datas, mantida por triggers: cada
+ponto inserido, editado ou removido carimba a sua data com uma versão nova
+e qualquer alteração em usuarios carimba a data especial '*'. Antes de cada
+consulta o cache lê as versões mais novas que a última vista e descarta
+apenas as entradas cujo período contém alguma data alterada, então um ponto
+de hoje não derruba o relatório do mês passado.
+"""
+import os
+import threading
+from collections import OrderedDict, deque
+
+REPORT_CACHE_MAX_BYTES = int(os.environ.get('REPORT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+REPORT_CACHE_MAX_ENTRIES = int(os.environ.get('REPORT_CACHE_MAX_ENTRIES', 256))
+# Exportações maiores que isso são enviadas direto do arquivo temporário, sem cache
+REPORT_CACHE_MAX_ITEM_BYTES = int(os.environ.get('REPORT_CACHE_MAX_ITEM_BYTES', 8 * 1024 * 1024))
+
+# Data especial gravada em versoes_datas quando um usuário muda
+ALL_DATES = '*'
+# Chave gravada quando credenciais ou dispositivos do quiosque mudam; não afeta relatórios
+KIOSK_VERSION = 'quiosque'
+
+def estimate_size(value):
+    """Tamanho aproximado, em bytes, de um resultado de consulta ou arquivo"""
+    if isinstance(value, (bytes, str)):
+        return len(value) + 48
+    if hasattr(value, 'nbytes'):
+        # Arrays NumPy e colunas de pontos (punch_store.py)
+        return value.nbytes + 96
+    if isinstance(value, dict):
+        return 64 + sum(estimate_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)) or hasattr(value, 'keys'):
+        return 56 + sum(estimate_size(item) for item in value)
+    return 28
+
+class ReportCache:
+    """Cache LRU por processo com invalidação por período"""
+
+    def __init__(self, max_bytes=REPORT_CACHE_MAX_BYTES, max_entries=REPORT_CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        # Últimas datas alteradas, para put() recusar valores calculados antes delas
+        self._recent = deque(maxlen=1024)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _drop(self, key):
+        start, end, value, size = self._entries.pop(key)
+        self.size -= size
+
+    @staticmethod
+    def _touches(start, end, dates):
+        return ALL_DATES in dates or any(
+            (start is None or start <= date) and (end is None or date <= end)
+            for date in dates
+        )
+
+    def sync(self, db):
+        """Descarta as entradas afetadas por pontos/usuários alterados desde a última leitura"""
+        if self._version is None:
+            # Primeira leitura do worker: o cache está vazio, só marca a versão atual
+            row = db.execute('SELECT COALESCE(MAX(versao), 0) FROM versoes_datas').fetchone()
+            with self._lock:
+                if self._version is None:
+                    self._version = row[0]
+            return
+
+        changed = db.execute(
+            'SELECT data, versao FROM versoes_datas WHERE versao > ?', (self._version,)
+        ).fetchall()
+        if not changed:
+            return
+
+        with self._lock:
+            dates = [row[0] for row in changed if row[0] != KIOSK_VERSION]
+            for key, (start, end, value, size) in list(self._entries.items()):
+                if self._touches(start, end, dates):
+                    self._drop(key)
+                    self.invalidations += 1
+            self._recent.extend((row[1], row[0]) for row in changed if row[0] != KIOSK_VERSION)
+            self._version = max(self._version, max(row[1] for row in changed))
+
+    def get(self, db, key, start_date, end_date, compute):
+        """Retorna o valor em cache para ``key`` ou o calcula com ``compute()``.
+
+        ``start_date`` e ``end_date`` (YYYY-MM-DD, None para sem limite)
+        delimitam as datas que invalidam a entrada.
+        """
+        hit, value, version = self.lookup(db, key)
+        if hit:
+            return value
+        value = compute()
+        self.put(key, start_date, end_date, value, version)
+        return value
+
+    def lookup(self, db, key):
+        """Retorna (encontrado, valor, versão); a versão deve ser repassada a put()"""
+        self.sync(db)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key][2], self._version
+            self.misses += 1
+            return False, None, self._version
+
+    def put(self, key, start_date, end_date, value, version=None):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if version is not None and version != self._version:
+                # Outra thread sincronizou durante o cálculo: só guarda se nenhuma
+                # das datas alteradas desde então cai no período
+                if len(self._recent) == self._recent.maxlen and self._recent[0][0] > version:
+                    return
+                dates = [date for changed, date in self._recent if changed > version]
+                if self._touches(start_date, end_date, dates):
+                    return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (start_date, end_date, value, size)
+            self.size += size
+            while self.size > self.max_bytes or len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'pid': os.getpid(),
+                'entries': len(self._entries),
+                'size_bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'version': self._version
+            }
+
+report_cache = ReportCache()
@@ -1,22 +1,27 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify, make_response, send_file
+from flask import render_template, request, redirect, url_for, flash, jsonify, send_file, Response, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash
-from datetime import datetime, date, timezone, timedelta
-import re
-import pandas as pd
+from datetime import datetime, date
+import base64
 import io
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.units import inch
+import itertools
+import json
+import re
+import tempfile
+import sqlite3
 
 from app import app
-from auth import User
-from database import get_db
-
-# Fuso horário do Brasil (UTC-3)
-BRASIL_TZ = timezone(timedelta(hours=-3))
+from archive import segment_rows
+from auth import User, user_cache
+from database import (INSTRUMENT_SQL, SLOW_QUERY_MS, SqlStats, TimedConnection, get_db, get_read_db,
+                      pool, read_pool, slow_queries)
+from exports import (EXPORT_MIMETYPES, NoExportData, build_export, convert_date_for_db,
+                     csv_chunks, history_rows)
+from report_cache import REPORT_CACHE_MAX_ITEM_BYTES, report_cache
+from metrics import timed
+from punch_store import PUNCH_TYPES, load_punches
+from punch_writer import NEXT_PUNCH_SQL, PUNCH_GROUP_COMMIT, punch_writer
+from timesheet import BRASIL_TZ, due_until, format_minutes, timesheet_summary
 
 def get_brasilia_time():
     """Retorna a hora atual no fuso horário de Brasília"""
@@ -26,6 +31,9 @@ def get_brasilia_date():
     """Retorna a data atual no fuso horário de Brasília"""
     return get_brasilia_time().date()
 
+# Minutos como H:MM nos templates (horas trabalhadas, extras, banco de horas)
+app.add_template_filter(format_minutes, 'horas')
+
 @app.route('/')
 def index():
     if current_user.is_authenticated:
@@ -79,29 +87,31 @@ def admin_dashboard():
     
     # Get today's punch summary
     today = get_brasilia_date().strftime('%d-%m-%Y')
-    employees_today = db.execute('''
-        SELECT u.nome, u.funcao,
-               COUNT(CASE WHEN p.tipo = 'entrada' THEN 1 END) as entrada,
-               COUNT(CASE WHEN p.tipo = 'saida_almoco' THEN 1 END) as saida_almoco,
-               COUNT(CASE WHEN p.tipo = 'volta_almoco' THEN 1 END) as volta_almoco,
-               COUNT(CASE WHEN p.tipo = 'saida_final' THEN 1 END) as saida_final
-        FROM usuarios u
-        LEFT JOIN pontos p ON u.id = p.usuario_id AND p.data = ?
-        WHERE u.perfil = 'colaborador'
-        GROUP BY u.id, u.nome, u.funcao
-        ORDER BY u.nome
-    ''', (today,)).fetchall()
+    today_db = get_brasilia_date().strftime('%Y-%m-%d')
+    employees_today = get_employees_today(db, today_db)
     
     # Get total employees count
-    total_employees = db.execute(
-        'SELECT COUNT(*) as count FROM usuarios WHERE perfil = "colaborador"'
-    ).fetchone()['count']
+    total_employees = len(employees_today)
     
     return render_template('admin_dashboard.html', 
                          employees_today=employees_today,
                          total_employees=total_employees,
                          today=today)
 
+def get_employees_today(db, today_db):
+    """Situação de cada colaborador no dia (usada pelo dashboard e pelo feed ao vivo)"""
+    return db.execute('''
+        SELECT u.id, u.nome, u.funcao,
+               r.entrada IS NOT NULL as entrada,
+               r.saida_almoco IS NOT NULL as saida_almoco,
+               r.volta_almoco IS NOT NULL as volta_almoco,
+               r.saida_final IS NOT NULL as saida_final
+        FROM usuarios u
+        LEFT JOIN resumo_diario r ON u.id = r.usuario_id AND r.data = ?
+        WHERE u.perfil = 'colaborador'
+        ORDER BY u.nome
+    ''', (today_db,)).fetchall()
+
 @app.route('/employee')
 @login_required
 def employee_dashboard():
@@ -110,29 +120,33 @@ def employee_dashboard():
     
     db = get_db()
     today = get_brasilia_date().strftime('%d-%m-%Y')
+    today_db = get_brasilia_date().strftime('%Y-%m-%d')
+    today_punches, next_punch = get_employee_day(db, current_user.id, today_db)
     
+    return render_template('employee_dashboard.html',
+                         today_punches=today_punches,
+                         next_punch=next_punch,
+                         today=today)
+
+def get_employee_day(db, usuario_id, today_db):
+    """Pontos do funcionário no dia e o próximo tipo a registrar (None se completo)"""
     # Get today's punches for current user
     today_punches = db.execute('''
         SELECT tipo, hora, observacao
         FROM pontos
         WHERE usuario_id = ? AND data = ?
         ORDER BY hora
-    ''', (current_user.id, today)).fetchall()
+    ''', (usuario_id, today_db)).fetchall()
     
     # Determine next punch type
-    punch_types = ['entrada', 'saida_almoco', 'volta_almoco', 'saida_final']
     completed_types = [punch['tipo'] for punch in today_punches]
     
     next_punch = None
-    for punch_type in punch_types:
+    for punch_type in PUNCH_TYPES:
         if punch_type not in completed_types:
             next_punch = punch_type
             break
-    
-    return render_template('employee_dashboard.html',
-                         today_punches=today_punches,
-                         next_punch=next_punch,
-                         today=today)
+    return today_punches, next_punch
 
 @app.route('/register_employee', methods=['GET', 'POST'])
 @login_required
@@ -173,11 +187,12 @@ def register_employee():
         
         # Insert new employee
         try:
-            db.execute('''
+            cursor = db.execute('''
                 INSERT INTO usuarios (nome, cpf, funcao, login, senha, perfil)
                 VALUES (?, ?, ?, ?, ?, ?)
             ''', (nome, cpf_clean, funcao, login, generate_password_hash(senha), 'colaborador'))
             db.commit()
+            user_cache.invalidate(cursor.lastrowid)
             flash('Colaborador cadastrado com sucesso!', 'success')
             return redirect(url_for('admin_dashboard'))
         except Exception as e:
@@ -195,84 +210,162 @@ def register_punch():
     
     observacao = request.form.get('observacao', '').strip()
     
-    db = get_db()
-    today = get_brasilia_date().strftime('%d-%m-%Y')
-    now = get_brasilia_time().strftime('%H:%M:%S')
-    
-    # Get today's punches for current user
-    today_punches = db.execute('''
-        SELECT tipo FROM pontos
-        WHERE usuario_id = ? AND data = ?
-        ORDER BY hora
-    ''', (current_user.id, today)).fetchall()
-    
-    # Determine next punch type
-    punch_types = ['entrada', 'saida_almoco', 'volta_almoco', 'saida_final']
-    completed_types = [punch['tipo'] for punch in today_punches]
-    
-    next_punch = None
-    for punch_type in punch_types:
-        if punch_type not in completed_types:
-            next_punch = punch_type
-            break
+    try:
+        inserted = insert_next_punch(current_user.id, observacao)
+    except sqlite3.IntegrityError:
+        flash('Este ponto já foi registrado!', 'warning')
+        return redirect(url_for('employee_dashboard'))
+    except Exception as e:
+        flash('Erro ao registrar ponto!', 'danger')
+        app.logger.error(f'Error registering punch: {e}')
+        return redirect(url_for('employee_dashboard'))
     
-    if not next_punch:
+    if not inserted:
         flash('Todos os pontos do dia já foram registrados!', 'warning')
         return redirect(url_for('employee_dashboard'))
     
-    # Register punch
+    flash(f'{PUNCH_NAMES[inserted["tipo"]]} registrada com sucesso às {inserted["hora"]}!', 'success')
+    return redirect(url_for('employee_dashboard'))
+
+PUNCH_NAMES = {
+    'entrada': 'Entrada',
+    'saida_almoco': 'Saída para Almoço',
+    'volta_almoco': 'Volta do Almoço',
+    'saida_final': 'Saída Final'
+}
+
+# Etiquetas do histórico (rótulo, cor e ícone), na ordem de PUNCH_TYPES
+PUNCH_BADGES = {tipo: dict(zip(('rotulo', 'cor', 'icone'), badge)) for tipo, badge in zip(PUNCH_TYPES, [
+    ('Entrada', 'bg-success', 'fa-sign-in-alt'),
+    ('Saída Almoço', 'bg-warning', 'fa-utensils'),
+    ('Volta Almoço', 'bg-info', 'fa-undo'),
+    ('Saída Final', 'bg-danger', 'fa-sign-out-alt'),
+])}
+
+def next_punch_params(usuario_id, observacao=''):
+    """Parâmetros de NEXT_PUNCH_SQL para um ponto registrado agora"""
+    return {'usuario_id': usuario_id, 'data': get_brasilia_date().strftime('%Y-%m-%d'),
+            'hora': get_brasilia_time().strftime('%H:%M:%S'), 'observacao': observacao}
+
+def insert_next_punch(usuario_id, observacao=''):
+    """Registra o próximo ponto do dia do funcionário e faz o commit.
+    
+    Retorna a linha (tipo, hora) inserida ou None se o dia já está completo.
+    Levanta sqlite3.IntegrityError se outro pedido registrou o mesmo ponto.
+    Com PUNCH_GROUP_COMMIT o ponto é gravado pelo thread de punch_writer, no
+    commit do lote, em vez da conexão de get_db.
+    """
+    params = next_punch_params(usuario_id, observacao)
+    if PUNCH_GROUP_COMMIT:
+        return punch_writer.insert(params)
+    
+    db = get_db()
     try:
-        db.execute('''
-            INSERT INTO pontos (usuario_id, data, tipo, hora, observacao)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (current_user.id, today, next_punch, now, observacao))
+        inserted = db.execute(NEXT_PUNCH_SQL, params).fetchone()
         db.commit()
-        
-        punch_names = {
-            'entrada': 'Entrada',
-            'saida_almoco': 'Saída para Almoço',
-            'volta_almoco': 'Volta do Almoço',
-            'saida_final': 'Saída Final'
-        }
-        
-        flash(f'{punch_names[next_punch]} registrada com sucesso às {now}!', 'success')
-    except Exception as e:
-        flash('Erro ao registrar ponto!', 'danger')
-        app.logger.error(f'Error registering punch: {e}')
+    except Exception:
+        db.rollback()
+        raise
+    return inserted
+
+HISTORY_PAGE_SIZE = 100
+HISTORY_MAX_PAGE_SIZE = 500
+
+def encode_history_cursor(punch):
+    """Cursor opaco com a posição (data, hora, id) do último ponto da página"""
+    key = json.dumps([punch['data'], punch['hora'], punch['id']])
+    return base64.urlsafe_b64encode(key.encode('utf-8')).decode('ascii')
+
+def decode_history_cursor(cursor):
+    try:
+        data, hora, punch_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(data), str(hora), int(punch_id)
+    except (ValueError, TypeError):
+        raise ValueError('Cursor de paginação inválido!')
+
+def history_filters():
+    """Filtros do histórico a partir da query string"""
+    tipo = request.args.get('tipo') or None
+    if tipo and tipo not in PUNCH_TYPES:
+        raise ValueError('Tipo de ponto inválido!')
     
-    return redirect(url_for('employee_dashboard'))
+    if current_user.perfil == 'admin':
+        employee_id = request.args.get('employee_id') or None
+    else:
+        # Employee can only see their own punches
+        employee_id = current_user.id
+    
+    return {
+        'employee_id': employee_id,
+        'start_date': convert_date_for_db(request.args.get('start_date') or None),
+        'end_date': convert_date_for_db(request.args.get('end_date') or None),
+        'tipo': tipo
+    }
+
+def history_page(db, filters, cursor=None, limit=HISTORY_PAGE_SIZE):
+    """Uma página do histórico em ordem decrescente de (data, hora, id).
+    
+    A paginação é por chave: a página seguinte começa logo depois do cursor
+    usando os índices (data, hora) e (usuario_id, data, hora), então a
+    página N custa o mesmo que a primeira. Os anos arquivados são lidos do
+    mais recente para o mais antigo, só até completar a página. Retorna
+    (pontos, próximo cursor).
+    """
+    conditions = ['p.data BETWEEN ? AND ?']
+    params = []
+    end_date = filters['end_date']
+    
+    if filters['employee_id']:
+        conditions.append('p.usuario_id = ?')
+        params.append(filters['employee_id'])
+    else:
+        conditions.append("u.perfil = 'colaborador'")
+    if cursor:
+        # O cursor limita o fim do período, a menos que a data final seja anterior a ele
+        after = decode_history_cursor(cursor)
+        conditions.append('(p.data, p.hora, p.id) < (?, ?, ?)')
+        params.extend(after)
+        if not end_date or after[0] < end_date:
+            end_date = after[0]
+    if filters['tipo']:
+        conditions.append('p.tipo = ?')
+        params.append(filters['tipo'])
+    
+    # CROSS JOIN mantém pontos no laço externo: a ordem vem do índice, sem ordenar o trecho
+    rows = segment_rows(db, f'''
+        SELECT p.id, p.data, p.tipo, p.hora, p.observacao, u.nome
+        FROM {{pontos}} p
+        CROSS JOIN usuarios u ON p.usuario_id = u.id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY p.data DESC, p.hora DESC, p.id DESC
+        LIMIT ?
+    ''', (*params, limit + 1), filters['start_date'], end_date, newest_first=True)
+    punches = list(itertools.islice(rows, limit + 1))
+    
+    next_cursor = encode_history_cursor(punches[limit - 1]) if len(punches) > limit else None
+    return punches[:limit], next_cursor
 
 @app.route('/punch_history')
 @login_required
 def punch_history():
-    db = get_db()
+    db = get_read_db()
+    
+    try:
+        filters = history_filters()
+        punches, next_cursor = history_page(db, filters, request.args.get('cursor'))
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('punch_history'))
     
     if current_user.perfil == 'admin':
         # Admin can see all employees
-        employee_id = request.args.get('employee_id')
+        employee_id = filters['employee_id']
         if employee_id:
-            punches = db.execute('''
-                SELECT p.data, p.tipo, p.hora, p.observacao, u.nome
-                FROM pontos p
-                JOIN usuarios u ON p.usuario_id = u.id
-                WHERE p.usuario_id = ?
-                ORDER BY p.data DESC, p.hora DESC
-                LIMIT 100
-            ''', (employee_id,)).fetchall()
-            
             employee = db.execute(
                 'SELECT nome FROM usuarios WHERE id = ?', (employee_id,)
             ).fetchone()
             employee_name = employee['nome'] if employee else 'Funcionário'
         else:
-            punches = db.execute('''
-                SELECT p.data, p.tipo, p.hora, p.observacao, u.nome
-                FROM pontos p
-                JOIN usuarios u ON p.usuario_id = u.id
-                WHERE u.perfil = 'colaborador'
-                ORDER BY p.data DESC, p.hora DESC
-                LIMIT 100
-            ''').fetchall()
             employee_name = 'Todos os Funcionários'
         
         # Get all employees for dropdown
@@ -281,22 +374,38 @@ def punch_history():
         ).fetchall()
         
     else:
-        # Employee can only see their own punches
-        punches = db.execute('''
-            SELECT data, tipo, hora, observacao
-            FROM pontos
-            WHERE usuario_id = ?
-            ORDER BY data DESC, hora DESC
-            LIMIT 100
-        ''', (current_user.id,)).fetchall()
         employee_name = current_user.nome
         employees = []
     
+    # Links da próxima página mantendo os filtros atuais
+    page_args = {key: value for key, value in request.args.items() if key != 'cursor'}
+    next_page_url = url_for('punch_history', cursor=next_cursor, **page_args) if next_cursor else None
+    
     return render_template('punch_history.html',
                          punches=punches,
+                         next_cursor=next_cursor,
+                         next_page_url=next_page_url,
+                         page_url=url_for('punch_history_page', **page_args),
+                         punch_badges=PUNCH_BADGES,
                          employee_name=employee_name,
                          employees=employees)
 
+@app.route('/punch_history/page')
+@login_required
+def punch_history_page():
+    """Próxima página do histórico em JSON (rolagem infinita)"""
+    try:
+        limit = min(max(int(request.args.get('limit', HISTORY_PAGE_SIZE)), 1), HISTORY_MAX_PAGE_SIZE)
+        filters = history_filters()
+        punches, next_cursor = history_page(get_read_db(), filters, request.args.get('cursor'), limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'pontos': [dict(punch) for punch in punches],
+        'proximo_cursor': next_cursor
+    })
+
 @app.route('/reports')
 @login_required
 def reports():
@@ -304,7 +413,7 @@ def reports():
         flash('Acesso negado!', 'danger')
         return redirect(url_for('employee_dashboard'))
     
-    db = get_db()
+    db = get_read_db()
     
     # Get date range from query parameters
     start_date = request.args.get('start_date', get_brasilia_date().strftime('01-%m-%Y'))
@@ -312,14 +421,6 @@ def reports():
     employee_id = request.args.get('employee_id')
     
     # Convert dates to YYYY-MM-DD for database queries
-    def convert_date_for_db(date_str):
-        if date_str and '-' in date_str:
-            # Check if format is DD-MM-YYYY
-            parts = date_str.split('-')
-            if len(parts[0]) == 2:  # DD-MM-YYYY format
-                return f"{parts[2]}-{parts[1]}-{parts[0]}"
-        return date_str
-    
     start_date_db = convert_date_for_db(start_date)
     end_date_db = convert_date_for_db(end_date)
     
@@ -328,58 +429,40 @@ def reports():
         'SELECT id, nome FROM usuarios WHERE perfil = "colaborador" ORDER BY nome'
     ).fetchall()
     
-    if employee_id:
-        # Get detailed report for specific employee
-        detailed_punches = db.execute('''
-            SELECT p.data, p.tipo, p.hora, p.observacao, u.nome, u.funcao
-            FROM pontos p
-            JOIN usuarios u ON p.usuario_id = u.id
-            WHERE p.usuario_id = ? AND p.data BETWEEN ? AND ?
-            ORDER BY p.data, p.hora
-        ''', (employee_id, start_date_db, end_date_db)).fetchall()
-        
-        # Get summary data for the selected employee
-        report_data = db.execute('''
-            SELECT u.nome, u.funcao,
-                   COUNT(DISTINCT CASE WHEN p.tipo = 'entrada' THEN p.data END) as dias_trabalhados,
-                   COUNT(DISTINCT p.data) as dias_com_registro,
-                   COUNT(p.id) as total_pontos
-            FROM usuarios u
-            LEFT JOIN pontos p ON u.id = p.usuario_id 
-                AND p.data BETWEEN ? AND ?
-            WHERE u.id = ?
-            GROUP BY u.id, u.nome, u.funcao
-        ''', (start_date_db, end_date_db, employee_id)).fetchall()
+    def load_report():
+        if employee_id:
+            # Detailed punches for the employee, cached as compact columns
+            detailed_punches = load_punches(db, start_date_db, end_date_db, employee_id=employee_id,
+                                            observations=True).sorted()
+            employee = db.execute('SELECT nome FROM usuarios WHERE id = ?', (employee_id,)).fetchone()
+            employee_name = employee['nome'] if employee and len(detailed_punches) else None
+        else:
+            detailed_punches = None
+            employee_name = None
         
-        employee_name = detailed_punches[0]['nome'] if detailed_punches else None
-    else:
-        # Get general attendance report for all employees
-        detailed_punches = []
-        report_data = db.execute('''
-            SELECT u.nome, u.funcao,
-                   COUNT(DISTINCT CASE WHEN p.tipo = 'entrada' THEN p.data END) as dias_trabalhados,
-                   COUNT(DISTINCT p.data) as dias_com_registro,
-                   COUNT(p.id) as total_pontos
-            FROM usuarios u
-            LEFT JOIN pontos p ON u.id = p.usuario_id 
-                AND p.data BETWEEN ? AND ?
-            WHERE u.perfil = 'colaborador'
-            GROUP BY u.id, u.nome, u.funcao
-            ORDER BY u.nome
-        ''', (start_date_db, end_date_db)).fetchall()
-        employee_name = None
+        # Hours, overtime, lateness and hour bank for the period
+        report_data = timesheet_summary(db, start_date_db, end_date_db, employee_id, today)
+        return report_data, detailed_punches, employee_name
+    
+    # Results are cached per worker until a punch lands inside the period;
+    # the due hours also change when the period includes today
+    today = get_brasilia_date()
+    try:
+        report_data, detailed_punches, employee_name = report_cache.get(
+            db, ('reports', start_date_db, end_date_db, employee_id, due_until(end_date_db, today)),
+            start_date_db, end_date_db, load_report
+        )
+    except ValueError as e:
+        flash(str(e), 'danger')
+        report_data, detailed_punches, employee_name = [], None, None
     
     # Group detailed punches by date for easier template rendering
     punches_by_date = {}
-    for punch in detailed_punches:
-        date = punch['data']
-        if date not in punches_by_date:
-            punches_by_date[date] = []
-        punches_by_date[date].append(punch)
+    if detailed_punches is not None:
+        punches_by_date = {day.isoformat(): punches for day, punches in detailed_punches.by_day()}
     
     return render_template('reports.html',
                          report_data=report_data,
-                         detailed_punches=detailed_punches,
                          punches_by_date=punches_by_date,
                          employees=employees,
                          employee_id=employee_id,
@@ -397,54 +480,16 @@ def export_history():
     format_type = request.args.get('format', 'csv').lower()
     employee_id = request.args.get('employee_id')
     
-    db = get_db()
-    
-    # Query para buscar os dados
-    if employee_id:
-        punches = db.execute('''
-            SELECT p.data, p.tipo, p.hora, p.observacao, u.nome as funcionario
-            FROM pontos p
-            JOIN usuarios u ON p.usuario_id = u.id
-            WHERE p.usuario_id = ?
-            ORDER BY p.data DESC, p.hora DESC
-        ''', (employee_id,)).fetchall()
-        filename_prefix = f"historico_funcionario_{employee_id}"
-    else:
-        punches = db.execute('''
-            SELECT p.data, p.tipo, p.hora, p.observacao, u.nome as funcionario
-            FROM pontos p
-            JOIN usuarios u ON p.usuario_id = u.id
-            WHERE u.perfil = 'colaborador'
-            ORDER BY p.data DESC, p.hora DESC
-        ''').fetchall()
-        filename_prefix = "historico_todos_funcionarios"
-    
-    if not punches:
-        flash('Nenhum dados encontrados para exportar!', 'warning')
+    if format_type not in EXPORT_MIMETYPES:
+        flash('Formato de exportação inválido!', 'danger')
         return redirect(url_for('punch_history'))
     
-    # Converter para DataFrame
-    df = pd.DataFrame([{
-        'Data': punch['data'],
-        'Funcionário': punch['funcionario'],
-        'Tipo de Ponto': {
-            'entrada': 'Entrada',
-            'saida_almoco': 'Saída Almoço',
-            'volta_almoco': 'Volta Almoço',
-            'saida_final': 'Saída Final'
-        }.get(punch['tipo'], punch['tipo']),
-        'Horário': punch['hora'][:5],
-        'Observação': punch['observacao'] or '-'
-    } for punch in punches])
-    
-    if format_type == 'csv':
-        return export_csv(df, f"{filename_prefix}.csv")
-    elif format_type == 'excel':
-        return export_excel(df, f"{filename_prefix}.xlsx")
-    elif format_type == 'pdf':
-        return export_pdf_history(df, f"{filename_prefix}.pdf")
-    else:
-        flash('Formato de exportação inválido!', 'danger')
+    try:
+        if format_type == 'csv':
+            return export_history_csv(employee_id)
+        return send_export(get_read_db(), 'history', {'format': format_type, 'employee_id': employee_id})
+    except NoExportData:
+        flash('Nenhum dados encontrados para exportar!', 'warning')
         return redirect(url_for('punch_history'))
 
 @app.route('/export_reports')
@@ -454,336 +499,126 @@ def export_reports():
         flash('Acesso negado!', 'danger')
         return redirect(url_for('employee_dashboard'))
     
-    format_type = request.args.get('format', 'csv').lower()
-    start_date = request.args.get('start_date', get_brasilia_date().strftime('01-%m-%Y'))
-    end_date = request.args.get('end_date', get_brasilia_date().strftime('%d-%m-%Y'))
-    employee_id = request.args.get('employee_id')
-    
-    # Convert dates to YYYY-MM-DD for database queries
-    def convert_date_for_db(date_str):
-        if date_str and '-' in date_str:
-            # Check if format is DD-MM-YYYY
-            parts = date_str.split('-')
-            if len(parts[0]) == 2:  # DD-MM-YYYY format
-                return f"{parts[2]}-{parts[1]}-{parts[0]}"
-        return date_str
+    params = {
+        'format': request.args.get('format', 'csv').lower(),
+        'start_date': request.args.get('start_date', get_brasilia_date().strftime('01-%m-%Y')),
+        'end_date': request.args.get('end_date', get_brasilia_date().strftime('%d-%m-%Y')),
+        'employee_id': request.args.get('employee_id')
+    }
     
-    start_date_db = convert_date_for_db(start_date)
-    end_date_db = convert_date_for_db(end_date)
+    db = get_read_db()
     
-    db = get_db()
-    
-    if employee_id:
-        # Export detailed report for specific employee
-        detailed_punches = db.execute('''
-            SELECT p.data, p.tipo, p.hora, p.observacao, u.nome, u.funcao
-            FROM pontos p
-            JOIN usuarios u ON p.usuario_id = u.id
-            WHERE p.usuario_id = ? AND p.data BETWEEN ? AND ?
-            ORDER BY p.data, p.hora
-        ''', (employee_id, start_date_db, end_date_db)).fetchall()
-        
-        if not detailed_punches:
-            flash('Nenhum dados encontrados para exportar!', 'warning')
-            return redirect(url_for('reports'))
-        
-        employee_name = detailed_punches[0]['nome']
-        
-        # Group punches by date
-        punches_by_date = {}
-        for punch in detailed_punches:
-            date = punch['data']
-            if date not in punches_by_date:
-                punches_by_date[date] = []
-            punches_by_date[date].append(punch)
-        
-        filename = f"relatorio_detalhado_{employee_name}_{start_date}_a_{end_date}".replace(' ', '_')
-        
-        if format_type == 'excel':
-            return export_detailed_excel(punches_by_date, filename + ".xlsx", employee_name, start_date, end_date)
-        elif format_type == 'pdf':
-            return export_detailed_pdf(punches_by_date, filename + ".pdf", employee_name, start_date, end_date)
-        else:
-            flash('Formato de exportação inválido para relatório detalhado!', 'danger')
-            return redirect(url_for('reports'))
-    else:
-        # Get general attendance report
-        report_data = db.execute('''
-            SELECT u.nome, u.funcao,
-                   COUNT(DISTINCT CASE WHEN p.tipo = 'entrada' THEN p.data END) as dias_trabalhados,
-                   COUNT(DISTINCT p.data) as dias_com_registro,
-                   COUNT(p.id) as total_pontos
-            FROM usuarios u
-            LEFT JOIN pontos p ON u.id = p.usuario_id 
-                AND p.data BETWEEN ? AND ?
-            WHERE u.perfil = 'colaborador'
-            GROUP BY u.id, u.nome, u.funcao
-            ORDER BY u.nome
-        ''', (start_date_db, end_date_db)).fetchall()
-        
-        if not report_data:
-            flash('Nenhum dados encontrados para exportar!', 'warning')
-            return redirect(url_for('reports'))
-        
-        # Converter para DataFrame
-        df = pd.DataFrame([{
-            'Funcionário': emp['nome'],
-            'Função': emp['funcao'],
-            'Dias Trabalhados': emp['dias_trabalhados'],
-            'Dias com Registro': emp['dias_com_registro'],
-            'Total de Pontos': emp['total_pontos'],
-            'Frequência (%)': round((emp['dias_trabalhados'] / 30) * 100, 1) if emp['dias_trabalhados'] > 0 else 0
-        } for emp in report_data])
-        
-        filename = f"relatorio_frequencia_{start_date}_a_{end_date}"
-        
-        if format_type == 'csv':
-            return export_csv(df, f"{filename}.csv")
-        elif format_type == 'excel':
-            return export_excel(df, f"{filename}.xlsx")
-        elif format_type == 'pdf':
-            return export_pdf_report(df, f"{filename}.pdf", start_date, end_date)
-        else:
-            flash('Formato de exportação inválido!', 'danger')
-            return redirect(url_for('reports'))
-
-def export_csv(df, filename):
-    output = io.StringIO()
-    df.to_csv(output, index=False, encoding='utf-8-sig')
-    response = make_response(output.getvalue())
-    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
-    response.headers["Content-type"] = "text/csv; charset=utf-8"
-    return response
+    try:
+        return send_export(db, 'report', params)
+    except NoExportData:
+        flash('Nenhum dados encontrados para exportar!', 'warning')
+        return redirect(url_for('reports'))
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('reports'))
 
-def export_excel(df, filename):
-    output = io.BytesIO()
-    
-    # Usar ExcelWriter corretamente
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Dados')
-    
-        # Formatação básica
-        workbook = writer.book
-        worksheet = writer.sheets['Dados']
-        
-        # Ajustar largura das colunas
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
-    
+def send_export(db, kind, params):
+    """Gera a exportação (ou reaproveita a do cache) e a envia como anexo"""
+    if kind == 'report':
+        start_date_db = convert_date_for_db(params['start_date'])
+        end_date_db = convert_date_for_db(params['end_date'])
+    else:
+        # O histórico cobre todas as datas: qualquer ponto novo o invalida
+        start_date_db = end_date_db = None
+    
+    key = ('export', kind, params.get('start_date'), params.get('end_date'),
+           params.get('employee_id'), params['format'],
+           due_until(end_date_db, get_brasilia_date()) if kind == 'report' else None)
+    hit, cached, version = report_cache.lookup(db, key)
+    if hit:
+        filename, data = cached
+        return send_file(io.BytesIO(data), as_attachment=True, download_name=filename,
+                         mimetype=EXPORT_MIMETYPES[params['format']])
+    
+    output = tempfile.TemporaryFile()
+    try:
+        with timed('export'):
+            filename = build_export(db, kind, params, output)
+    except Exception:
+        output.close()
+        raise
+    if output.tell() <= REPORT_CACHE_MAX_ITEM_BYTES:
+        output.seek(0)
+        report_cache.put(key, start_date_db, end_date_db, (filename, output.read()), version)
     output.seek(0)
-    
-    response = make_response(output.read())
-    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
-    response.headers["Content-type"] = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    return response
+    return send_file(output, as_attachment=True, download_name=filename,
+                     mimetype=EXPORT_MIMETYPES[params['format']])
 
-def export_pdf_history(df, filename):
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    styles = getSampleStyleSheet()
-    story = []
-    
-    # Título
-    title = Paragraph("Histórico de Pontos", styles['Title'])
-    story.append(title)
-    story.append(Spacer(1, 12))
-    
-    # Criar tabela
-    data = [df.columns.tolist()]
-    data.extend(df.values.tolist())
-    
-    table = Table(data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.green),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    story.append(table)
-    doc.build(story)
-    
-    buffer.seek(0)
-    response = make_response(buffer.read())
-    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
-    response.headers["Content-type"] = "application/pdf"
+def export_history_csv(employee_id):
+    """Histórico em CSV lido do cursor durante o streaming.
+    
+    O cursor continua sendo lido depois que a view retorna, quando o
+    teardown já devolveu a conexão de get_read_db ao pool; por isso o
+    streaming usa uma conexão própria do pool de leitura, devolvida quando a
+    resposta é fechada.
+    """
+    conn = read_pool.acquire()
+    db = TimedConnection(conn, SqlStats()) if INSTRUMENT_SQL else conn
+    try:
+        headers, rows, filename_prefix = history_rows(db, employee_id)
+    except Exception:
+        read_pool.release(conn)
+        raise
+    response = export_csv_stream(headers, rows, f"{filename_prefix}.csv")
+    response.call_on_close(lambda: read_pool.release(conn))
     return response
 
-def export_pdf_report(df, filename, start_date, end_date):
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    styles = getSampleStyleSheet()
-    story = []
-    
-    # Título
-    title = Paragraph("Relatório de Frequência", styles['Title'])
-    story.append(title)
-    story.append(Spacer(1, 12))
-    
-    # Período
-    period = Paragraph(f"Período: {start_date} a {end_date}", styles['Normal'])
-    story.append(period)
-    story.append(Spacer(1, 12))
-    
-    # Criar tabela
-    data = [df.columns.tolist()]
-    data.extend(df.values.tolist())
-    
-    table = Table(data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.green),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    story.append(table)
-    doc.build(story)
-    
-    buffer.seek(0)
-    response = make_response(buffer.read())
+def export_csv_stream(headers, rows, filename):
+    """Exporta em CSV lendo o cursor em blocos, sem materializar os dados"""
+    response = Response(stream_with_context(csv_chunks(headers, rows)), mimetype='text/csv')
     response.headers["Content-Disposition"] = f"attachment; filename={filename}"
-    response.headers["Content-type"] = "application/pdf"
+    response.headers["Content-type"] = "text/csv; charset=utf-8"
     return response
 
-def export_detailed_excel(punches_by_date, filename, employee_name, start_date, end_date):
-    output = io.BytesIO()
-    
-    # Create workbook and worksheet  
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        # Create data for export
-        excel_data = []
-        for date, punches in sorted(punches_by_date.items()):
-            # Convert YYYY-MM-DD to DD-MM-YYYY for display
-            date_parts = date.split('-')
-            formatted_date = f"{date_parts[2]}-{date_parts[1]}-{date_parts[0]}"
-            
-            for punch in punches:
-                excel_data.append({
-                    'Data': formatted_date,
-                    'Funcionário': employee_name,
-                    'Função': punch['funcao'],
-                    'Tipo de Ponto': {
-                        'entrada': 'Entrada',
-                        'saida_almoco': 'Saída Almoço',
-                        'volta_almoco': 'Volta Almoço',
-                        'saida_final': 'Saída Final'
-                    }.get(punch['tipo'], punch['tipo']),
-                    'Horário': punch['hora'][:5],
-                    'Observação': punch['observacao'] or ''
-                })
-        
-        df = pd.DataFrame(excel_data)
-        df.to_excel(writer, index=False, sheet_name='Relatório Detalhado')
-        
-        # Format the worksheet
-        workbook = writer.book
-        worksheet = writer.sheets['Relatório Detalhado']
-        
-        # Adjust column widths
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
+@app.route('/db_stats')
+@login_required
+def db_stats():
+    """Estatísticas dos pools de conexões deste worker (monitoramento)"""
+    if current_user.perfil != 'admin':
+        return jsonify({'error': 'Acesso negado!'}), 403
     
-    output.seek(0)
+    return jsonify(dict(pool.stats(), read_pool=read_pool.stats(), punch_writer=punch_writer.stats()))
+
+@app.route('/cache_stats')
+@login_required
+def cache_stats():
+    """Acertos, falhas e tamanho do cache de relatórios deste worker"""
+    if current_user.perfil != 'admin':
+        return jsonify({'error': 'Acesso negado!'}), 403
     
-    response = make_response(output.read())
-    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
-    response.headers["Content-type"] = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    return response
+    return jsonify(report_cache.stats())
 
-def export_detailed_pdf(punches_by_date, filename, employee_name, start_date, end_date):
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    styles = getSampleStyleSheet()
-    story = []
-    
-    # Título
-    title = Paragraph(f"Relatório Detalhado - {employee_name}", styles['Title'])
-    story.append(title)
-    story.append(Spacer(1, 12))
-    
-    # Período
-    period = Paragraph(f"Período: {start_date} a {end_date}", styles['Normal'])
-    story.append(period)
-    story.append(Spacer(1, 20))
-    
-    # Create content for each date
-    for date, punches in sorted(punches_by_date.items()):
-        # Convert YYYY-MM-DD to DD-MM-YYYY for display
-        date_parts = date.split('-')
-        formatted_date = f"{date_parts[2]}-{date_parts[1]}-{date_parts[0]}"
-        
-        # Date header
-        date_header = Paragraph(f"<b>{formatted_date}</b>", styles['Heading2'])
-        story.append(date_header)
-        story.append(Spacer(1, 6))
-        
-        # Create table for this date
-        table_data = [['Tipo de Ponto', 'Horário', 'Observação']]
-        
-        for punch in punches:
-            tipo_nome = {
-                'entrada': 'Entrada',
-                'saida_almoco': 'Saída Almoço',
-                'volta_almoco': 'Volta Almoço',
-                'saida_final': 'Saída Final'
-            }.get(punch['tipo'], punch['tipo'])
-            
-            table_data.append([
-                tipo_nome,
-                punch['hora'][:5],
-                punch['observacao'] or '-'
-            ])
-        
-        table = Table(table_data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 1), (-1, -1), 9)
-        ]))
-        
-        story.append(table)
-        story.append(Spacer(1, 15))
+@app.route('/admin/diagnostics')
+@login_required
+def diagnostics():
+    """Consultas lentas deste worker com o plano de execução"""
+    if current_user.perfil != 'admin':
+        flash('Acesso negado!', 'danger')
+        return redirect(url_for('employee_dashboard'))
     
-    doc.build(story)
+    return render_template('diagnostics.html',
+                         slow_queries=list(reversed(slow_queries)),
+                         threshold_ms=SLOW_QUERY_MS,
+                         log_size=slow_queries.maxlen,
+                         pool_stats=pool.stats(),
+                         read_pool_stats=read_pool.stats(),
+                         cache_stats=report_cache.stats())
+
+@app.route('/admin/diagnostics/clear', methods=['POST'])
+@login_required
+def clear_diagnostics():
+    if current_user.perfil != 'admin':
+        flash('Acesso negado!', 'danger')
+        return redirect(url_for('employee_dashboard'))
     
-    buffer.seek(0)
-    response = make_response(buffer.read())
-    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
-    response.headers["Content-type"] = "application/pdf"
-    return response
+    slow_queries.clear()
+    flash('Registro de consultas lentas limpo.', 'success')
+    return redirect(url_for('diagnostics'))
 
 @app.route('/print_report')
 @login_required
@@ -792,7 +627,7 @@ def print_report():
         flash('Acesso negado!', 'danger')
         return redirect(url_for('employee_dashboard'))
     
-    db = get_db()
+    db = get_read_db()
     
     # Get parameters
     start_date = request.args.get('start_date', get_brasilia_date().strftime('01-%m-%Y'))
@@ -804,14 +639,6 @@ def print_report():
         return redirect(url_for('reports'))
     
     # Convert dates to YYYY-MM-DD for database queries
-    def convert_date_for_db(date_str):
-        if date_str and '-' in date_str:
-            # Check if format is DD-MM-YYYY
-            parts = date_str.split('-')
-            if len(parts[0]) == 2:  # DD-MM-YYYY format
-                return f"{parts[2]}-{parts[1]}-{parts[0]}"
-        return date_str
-    
     start_date_db = convert_date_for_db(start_date)
     end_date_db = convert_date_for_db(end_date)
     
@@ -825,26 +652,20 @@ def print_report():
         return redirect(url_for('reports'))
     
     # Get detailed punches for the employee
-    detailed_punches = db.execute('''
-        SELECT p.data, p.tipo, p.hora, p.observacao
-        FROM pontos p
-        WHERE p.usuario_id = ? AND p.data BETWEEN ? AND ?
-        ORDER BY p.data, p.hora
-    ''', (employee_id, start_date_db, end_date_db)).fetchall()
+    detailed_punches = load_punches(db, start_date_db, end_date_db, employee_id=employee_id,
+                                    observations=True).sorted()
     
     # Group punches by date
     punches_by_date = {}
-    for punch in detailed_punches:
-        date = punch['data']
-        if date not in punches_by_date:
-            punches_by_date[date] = {}
-        punches_by_date[date][punch['tipo']] = {
-            'hora': punch['hora'][:5],
-            'observacao': punch['observacao'] or ''
+    for day, punches in detailed_punches.by_day():
+        punches_by_date[day.isoformat()] = {
+            punch['tipo']: {'hora': punch['hora'], 'observacao': punch['observacao'] or ''}
+            for punch in punches
         }
     
     return render_template('print_report.html',
                          employee=employee,
                          punches_by_date=punches_by_date,
                          start_date=start_date,
-                         end_date=end_date)
+                         end_date=end_date,
+                         generated_at=get_brasilia_time().strftime('%d/%m/%Y às %H:%M'))
@@ -7,6 +7,7 @@ document.addEventListener('DOMContentLoaded', function() {
     initializeAlerts();
     initializeFormValidation();
     initializeResponsiveFeatures();
+    initializeExportJobs();
     
     // Set focus on first input field if exists (after small delay for better UX)
     setTimeout(() => {
@@ -144,6 +145,61 @@ function showNotification(message, type = 'info') {
     }, 5000);
 }
 
+// Background export jobs: links marked with data-export-job are rendered
+// by the server in the background; the browser polls and then downloads
+function initializeExportJobs() {
+    document.querySelectorAll('a[data-export-job]').forEach(function(link) {
+        link.addEventListener('click', function(event) {
+            event.preventDefault();
+            if (link.classList.contains('loading')) return;
+            
+            const params = new URL(link.href, window.location.origin).searchParams;
+            const body = new FormData();
+            body.append('kind', link.dataset.exportJob);
+            params.forEach(function(value, key) {
+                body.append(key, value);
+            });
+            
+            const restore = showLoading(link);
+            fetch('/export_jobs', {method: 'POST', body: body})
+                .then(response => response.json())
+                .then(job => pollExportJob(job, restore, link))
+                .catch(function() {
+                    restore();
+                    showNotification('Erro ao iniciar a exportação!', 'danger');
+                });
+        });
+    });
+}
+
+function pollExportJob(job, restore, link) {
+    if (job.error) {
+        restore();
+        showNotification(job.error, 'danger');
+    } else if (job.status === 'done') {
+        restore();
+        window.location.href = job.download_url;
+    } else if (job.status === 'empty' || job.status === 'error') {
+        restore();
+        showNotification(job.erro || 'Erro ao gerar a exportação!', job.status === 'empty' ? 'warning' : 'danger');
+    } else {
+        if (job.total) {
+            // Jobs em lote informam quantos itens já foram gerados
+            link.innerHTML = '<i class="fas fa-spinner fa-spin me-1"></i>Processando... ' +
+                job.progresso + ' de ' + job.total;
+        }
+        setTimeout(function() {
+            fetch(job.status_url)
+                .then(response => response.json())
+                .then(next => pollExportJob(next, restore, link))
+                .catch(function() {
+                    restore();
+                    showNotification('Erro ao consultar a exportação!', 'danger');
+                });
+        }, 1000);
+    }
+}
+
 // Time formatting utilities
 function formatTime(timeString) {
     if (!timeString) return '--:--';
@@ -0,0 +1,60 @@
+"""Shared fixtures: the app runs against a throwaway database.
+
+The database path is relative (timetracking.db), so the working directory
+is switched to a temporary one before anything imports ``app``; importing
+it runs init_db there instead of on the real database.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp(prefix='timetracking-tests-'))
+
+from app import app as flask_app  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    flask_app.config.update(TESTING=True)
+    return flask_app
+
+
+@pytest.fixture
+def db(app):
+    from database import pool
+    conn = pool.acquire()
+    yield conn
+    pool.release(conn)
+
+
+@pytest.fixture
+def admin_client(app):
+    client = app.test_client()
+    client.post('/login', data={'login': 'admin', 'password': 'admin123'})
+    return client
+
+
+@pytest.fixture
+def make_employee(db):
+    """Creates a colaborador and returns its id; its rows in the main database go away after the test"""
+    from werkzeug.security import generate_password_hash
+    created = []
+
+    def make(login, nome=None, created_at='2000-01-01 00:00:00'):
+        cursor = db.execute('''
+            INSERT INTO usuarios (nome, cpf, funcao, login, senha, perfil, created_at)
+            VALUES (?, ?, 'Operador', ?, ?, 'colaborador', ?)
+        ''', (nome or login.title(), f'cpf-{login}', login, generate_password_hash('senha'), created_at))
+        db.commit()
+        created.append(cursor.lastrowid)
+        return cursor.lastrowid
+
+    yield make
+    db.rollback()
+    for table, column in (('pontos', 'usuario_id'), ('credenciais_quiosque', 'usuario_id'), ('usuarios', 'id')):
+        db.executemany(f'DELETE FROM {table} WHERE {column} = ?', [(usuario_id,) for usuario_id in created])
+    db.commit()
@@ -0,0 +1,62 @@
+from archive import archive_year, segment_rows
+from database import backfill_daily_summary
+from timesheet import timesheet_summary
+
+YEAR = 2021
+
+PUNCHES = [
+    ('2021-03-01', 'entrada', '08:00:00'),
+    ('2021-03-01', 'saida_almoco', '12:00:00'),
+    ('2021-03-01', 'volta_almoco', '13:00:00'),
+    ('2021-03-01', 'saida_final', '17:30:00'),
+    ('2021-07-15', 'entrada', '09:00:00'),
+    ('2021-07-15', 'saida_final', '15:00:00'),
+]
+
+
+def summary_rows(db, usuario_id):
+    return [tuple(row) for row in db.execute('''
+        SELECT data, entrada, saida_final, total_pontos, minutos_trabalhados, completo
+        FROM resumo_diario WHERE usuario_id = ? ORDER BY data
+    ''', (usuario_id,))]
+
+
+def test_archiving_keeps_summary_and_reports(db, admin_client, make_employee):
+    usuario_id = make_employee('arquivo1', created_at='2020-01-01 00:00:00')
+    db.executemany('INSERT INTO pontos (usuario_id, data, tipo, hora) VALUES (?, ?, ?, ?)',
+                   [(usuario_id, *punch) for punch in PUNCHES])
+    db.commit()
+
+    summary = summary_rows(db, usuario_id)
+    assert summary == [('2021-03-01', '08:00:00', '17:30:00', 4, 510, 1),
+                       ('2021-07-15', '09:00:00', '15:00:00', 2, 360, 0)]
+    totals = timesheet_summary(db, '2021-01-01', '2021-12-31', usuario_id)
+
+    assert archive_year(db, YEAR) == len(PUNCHES)
+    assert db.execute("SELECT COUNT(*) FROM main.pontos WHERE data LIKE '2021-%'").fetchone()[0] == 0
+    assert db.execute('SELECT COUNT(*) FROM arquivamento').fetchone()[0] == 0
+
+    assert summary_rows(db, usuario_id) == summary
+    assert len(list(segment_rows(db, 'SELECT id FROM {pontos} p WHERE p.data BETWEEN ? AND ?',
+                                 (), '2021-01-01', '2021-12-31'))) == len(PUNCHES)
+    assert timesheet_summary(db, '2021-01-01', '2021-12-31', usuario_id) == totals
+
+    # The backfill reads the archive databases too
+    backfill_daily_summary(db)
+    assert summary_rows(db, usuario_id) == summary
+
+    response = admin_client.get(f'/reports?start_date=01-03-2021&end_date=31-03-2021&employee_id={usuario_id}')
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert 'Arquivo1' in page
+    assert '01-03-2021' in page and '17:30' in page
+
+
+def test_deleting_a_punch_still_updates_the_summary(db, make_employee):
+    usuario_id = make_employee('arquivo2')
+    db.executemany('INSERT INTO pontos (usuario_id, data, tipo, hora) VALUES (?, ?, ?, ?)',
+                   [(usuario_id, '2021-05-03', 'entrada', '08:00:00'),
+                    (usuario_id, '2021-05-03', 'saida_final', '16:00:00')])
+    db.execute("DELETE FROM pontos WHERE usuario_id = ? AND tipo = 'saida_final'", (usuario_id,))
+    db.commit()
+    assert summary_rows(db, usuario_id) == [('2021-05-03', '08:00:00', None, 1, 0, 0)]
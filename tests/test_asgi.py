@@ -0,0 +1,60 @@
+import asyncio
+import threading
+
+from flask import request, url_for
+
+import asgi
+
+
+def scope(path, headers=()):
+    return {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'', 'root_path': '',
+            'http_version': '1.1', 'scheme': 'http', 'server': ('127.0.0.1', 5000),
+            'client': ('127.0.0.1', 40000), 'headers': [(b'host', b'127.0.0.1:5000'), *headers]}
+
+
+def request_app(app, path, headers=()):
+    """Runs one request through asgi.application; returns (status, headers, body)"""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(asgi.application(scope(path, headers), receive, send))
+    return messages[0]['status'], dict(messages[0]['headers']), b''.join(m.get('body', b'') for m in messages[1:])
+
+
+def test_async_routes_see_forwarded_headers(app):
+    forwarded = [(b'x-forwarded-proto', b'https'), (b'x-forwarded-host', b'ponto.example.com')]
+    environ = asgi.proxied_environ(scope('/employee', forwarded), b'')
+    with app.request_context(environ):
+        assert request.scheme == 'https'
+        assert url_for('login', _external=True) == 'https://ponto.example.com/login'
+        assert request.remote_addr == '127.0.0.1'
+
+    # Without the headers the environ is left alone
+    environ = asgi.proxied_environ(scope('/employee'), b'')
+    with app.request_context(environ):
+        assert request.url == 'http://127.0.0.1:5000/employee'
+
+
+def test_async_route_renders(app):
+    status, headers, body = request_app(app, '/employee')
+    assert status == 302
+    assert b'/login' in headers[b'location']
+
+
+def test_rendering_runs_off_the_event_loop(app, monkeypatch):
+    threads = []
+    render = asgi.render
+
+    def recording_render(*args, **kwargs):
+        threads.append(threading.current_thread().name)
+        return render(*args, **kwargs)
+
+    monkeypatch.setattr(asgi, 'render', recording_render)
+    status, headers, body = request_app(app, '/admin/status')
+    assert status == 302
+    assert threads and all(name.startswith('async-wsgi') for name in threads)
@@ -0,0 +1,29 @@
+import auth
+
+
+def test_cache_hits_skip_the_read_pool(app, db, make_employee, monkeypatch):
+    usuario_id = make_employee('cache1')
+    cache = auth.UserCache(check_interval=60)
+    monkeypatch.setattr(auth, 'user_cache', cache)
+    connections = []
+
+    def get_read_db():
+        connections.append(db)
+        return db
+
+    monkeypatch.setattr(auth, 'get_read_db', get_read_db)
+    with app.test_request_context():
+        assert auth.User.get(usuario_id).login == 'cache1'
+        # First call: version check plus the user query
+        assert len(connections) == 2
+        for _ in range(3):
+            assert auth.User.get(usuario_id).login == 'cache1'
+        assert len(connections) == 2
+
+        # Once the interval has passed a hit checks the version again, and
+        # a change made elsewhere drops the cached user
+        db.execute("UPDATE usuarios SET login = 'cache1b' WHERE id = ?", (usuario_id,))
+        db.commit()
+        cache._checked_at -= 61
+        assert auth.User.get(usuario_id).login == 'cache1b'
+        assert len(connections) == 4
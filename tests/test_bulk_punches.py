@@ -0,0 +1,96 @@
+import pytest
+
+import bulk_punches
+from archive import archive_year
+
+ARCHIVED_YEAR = 2014
+
+
+@pytest.fixture
+def employee(db, make_employee):
+    """Colaborador with a punch already in the hot table and one in an archived year"""
+    usuario_id = make_employee('lote1')
+    db.executemany('INSERT INTO pontos (usuario_id, data, tipo, hora) VALUES (?, ?, ?, ?)', [
+        (usuario_id, f'{ARCHIVED_YEAR}-05-05', 'entrada', '08:00:00'),
+        (usuario_id, '2019-08-01', 'entrada', '08:00:00'),
+    ])
+    db.commit()
+    archive_year(db, ARCHIVED_YEAR)
+    return usuario_id
+
+
+def punches(db, usuario_id):
+    return [tuple(row) for row in db.execute('''
+        SELECT data, tipo, hora FROM pontos WHERE usuario_id = ? ORDER BY data, tipo
+    ''', (usuario_id,))]
+
+
+def test_json_batch_reports_every_row(admin_client, db, employee):
+    response = admin_client.post('/api/punches/batch', json={'punches': [
+        {'login': 'lote1', 'data': '01/08/2019', 'hora': '12:00', 'tipo': 'saida_almoco'},
+        {'login': 'lote1', 'data': '2019-08-01', 'hora': '12:01', 'tipo': 'saida_almoco'},
+        {'login': 'lote1', 'data': '2019-08-01', 'hora': '08:00', 'tipo': 'entrada'},
+        {'login': 'lote1', 'data': f'{ARCHIVED_YEAR}-05-05', 'hora': '08:00', 'tipo': 'entrada'},
+        {'login': 'lote1', 'data': f'{ARCHIVED_YEAR}-05-05', 'hora': '17:00', 'tipo': 'saida_final'},
+        {'login': 'ninguem', 'data': '2019-08-01', 'hora': '08:00', 'tipo': 'entrada'},
+        {'login': 'lote1', 'data': '2019-02-30', 'hora': '08:00', 'tipo': 'entrada'},
+        {'login': 'lote1', 'data': '2019-08-02', 'hora': '25:00', 'tipo': 'entrada'},
+        {'login': 'lote1', 'data': '2019-08-02', 'hora': '08:00', 'tipo': 'intervalo'},
+        'não é um objeto',
+    ]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [(row['status'], row.get('erro')) for row in body['linhas']] == [
+        ('inserido', None),
+        ('duplicado', None),   # same key earlier in the batch
+        ('duplicado', None),   # already in pontos
+        ('duplicado', None),   # already in the archived year
+        ('inserido', None),    # new punch in the archived year
+        ('invalido', 'Funcionário não encontrado'),
+        ('invalido', 'Data inválida'),
+        ('invalido', 'Horário inválido'),
+        ('invalido', 'Tipo de ponto inválido'),
+        ('invalido', 'Linha mal formada'),
+    ]
+    assert body['resumo'] == {'total': 10, 'inserido': 2, 'duplicado': 3, 'invalido': 5}
+    assert punches(db, employee) == [
+        (f'{ARCHIVED_YEAR}-05-05', 'saida_final', '17:00:00'),
+        ('2019-08-01', 'entrada', '08:00:00'),
+        ('2019-08-01', 'saida_almoco', '12:00:00'),
+    ]
+
+
+def test_csv_batch(admin_client, db, employee):
+    csv = ('login,data,hora,tipo,observacao\n'
+           'lote1,2019-08-01,08:00,entrada,\n'
+           'lote1,2019-08-01,13:00,volta_almoco,relógio da portaria\n'
+           'lote1,2019-08-01,13:05,volta_almoco,\n'
+           'lote1,2019-13-01,08:00,entrada,\n')
+    response = admin_client.post('/api/punches/batch', data=csv.encode('utf-8'), content_type='text/csv')
+    assert [row['status'] for row in response.get_json()['linhas']] == [
+        'duplicado', 'inserido', 'duplicado', 'invalido']
+    assert db.execute('''
+        SELECT observacao FROM pontos WHERE usuario_id = ? AND tipo = 'volta_almoco'
+    ''', (employee,)).fetchone()[0] == 'relógio da portaria'
+
+
+def test_bad_payloads_and_access(app, admin_client):
+    assert admin_client.post('/api/punches/batch', json={'linhas': []}).status_code == 400
+    assert admin_client.post('/api/punches/batch', data='x', content_type='text/plain').status_code == 400
+    assert app.test_client().post('/api/punches/batch', json=[]).status_code == 403
+
+
+def test_failed_batch_leaves_no_rows_behind(app, db, employee, monkeypatch):
+    def broken_segments(db, start, end):
+        yield start, end, 'tabela_inexistente'
+
+    monkeypatch.setattr(bulk_punches, 'pontos_segments', broken_segments)
+    batch = [{'login': 'lote1', 'data': '2019-08-03', 'hora': '08:00', 'tipo': 'entrada'}]
+    with app.test_request_context('/api/punches/batch', method='POST', json=batch):
+        monkeypatch.setattr(bulk_punches, 'is_authorized_device', lambda: True)
+        response, status = bulk_punches.import_punch_batch()
+        assert status == 500
+        connection = bulk_punches.get_db()
+        assert connection.execute('SELECT COUNT(*) FROM temp.lote_pontos').fetchone()[0] == 0
+        assert not connection.in_transaction
+    assert punches(db, employee)[-1][0] == '2019-08-01'
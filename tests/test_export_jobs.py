@@ -0,0 +1,101 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import export_jobs
+
+
+class FakeExecutor:
+    """Records submitted jobs; their futures are resolved by the test"""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.futures.append(future)
+        return future
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    fake = FakeExecutor()
+    monkeypatch.setattr(export_jobs, '_executor', fake)
+    monkeypatch.setattr(export_jobs, '_executor_pid', export_jobs.os.getpid())
+    return fake
+
+
+def job_status(db, job_id):
+    return db.execute('SELECT status FROM export_jobs WHERE id = ?', (job_id,)).fetchone()[0]
+
+
+def test_data_version_follows_the_period(db, make_employee):
+    usuario_id = make_employee('exportacao1')
+    march = export_jobs.data_version(db, '2019-03-01', '2019-03-31')
+    april = export_jobs.data_version(db, '2019-04-01', '2019-04-30')
+
+    cursor = db.execute("INSERT INTO pontos (usuario_id, data, tipo, hora) VALUES (?, '2019-03-10', 'entrada', '08:00:00')",
+                        (usuario_id,))
+    db.commit()
+    assert export_jobs.data_version(db, '2019-03-01', '2019-03-31') > march
+    assert export_jobs.data_version(db, '2019-04-01', '2019-04-30') == april
+    march = export_jobs.data_version(db, '2019-03-01', '2019-03-31')
+
+    db.execute('DELETE FROM pontos WHERE id = ?', (cursor.lastrowid,))
+    db.commit()
+    assert export_jobs.data_version(db, '2019-03-01', '2019-03-31') > march
+    assert export_jobs.data_version(db, '2019-04-01', '2019-04-30') == april
+
+    db.execute("UPDATE usuarios SET funcao = 'Supervisor' WHERE id = ?", (usuario_id,))
+    db.commit()
+    assert export_jobs.data_version(db, '2019-04-01', '2019-04-30') > april
+
+
+def test_changed_period_gets_a_new_job(app, db, make_employee, executor):
+    usuario_id = make_employee('exportacao2')
+    params = {'format': 'pdf', 'employee_id': None, 'start_date': '01-05-2019', 'end_date': '31-05-2019'}
+    with app.test_request_context():
+        first = export_jobs.submit_export_job(db, 'report', params)
+        assert export_jobs.submit_export_job(db, 'report', params) == first
+
+        db.execute("INSERT INTO pontos (usuario_id, data, tipo, hora) VALUES (?, '2019-05-02', 'entrada', '08:00:00')",
+                   (usuario_id,))
+        db.commit()
+        assert export_jobs.submit_export_job(db, 'report', params) != first
+
+
+def test_stale_jobs_are_not_reused(app, db, executor):
+    params = {'format': 'csv', 'employee_id': None}
+    with app.test_request_context():
+        job_id = export_jobs.submit_export_job(db, 'history', params)
+        db.execute("UPDATE export_jobs SET created_at = datetime('now', ?) WHERE id = ?",
+                   (f'-{export_jobs.EXPORT_JOB_TIMEOUT + 60} seconds', job_id))
+        db.commit()
+
+        assert export_jobs.submit_export_job(db, 'history', params) != job_id
+    assert job_status(db, job_id) == 'error'
+
+
+def test_broken_pool_fails_the_job(app, db, executor):
+    params = {'format': 'excel', 'employee_id': None}
+    with app.test_request_context():
+        job_id = export_jobs.submit_export_job(db, 'history', params)
+    assert job_status(db, job_id) == 'pending'
+
+    executor.futures[-1].set_exception(BrokenProcessPool('processo encerrado'))
+    assert job_status(db, job_id) == 'error'
+    # The broken pool is dropped so the next job starts a fresh one
+    assert export_jobs._executor is None
+
+
+def test_timesheet_link_works_without_javascript(admin_client, db, executor, make_employee):
+    make_employee('exportacao3')
+    response = admin_client.get('/reports?start_date=2019-06-01&end_date=2019-06-30')
+    assert b'/export_jobs/timesheets?start_date=2019-06-01&amp;end_date=2019-06-30' in response.data
+
+    response = admin_client.get('/export_jobs/timesheets?start_date=2019-06-01&end_date=2019-06-30')
+    assert response.status_code == 302
+    job = admin_client.get(response.headers['Location']).get_json()
+    assert job['status'] == 'pending'
+    assert job_status(db, job['id']) == 'pending'
@@ -0,0 +1,64 @@
+import base64
+import json
+
+import pytest
+
+from punch_store import PUNCH_TYPES
+from routes import history_page
+
+DAYS = ['2017-01-02', '2017-01-03', '2017-01-04']
+FILTERS = {'employee_id': None, 'start_date': DAYS[0], 'end_date': DAYS[-1], 'tipo': None}
+
+
+@pytest.fixture
+def tied_punches(db, make_employee):
+    """Five employees punching every type at 08:00 on three days: every (data, hora) is a tie"""
+    employees = [make_employee(f'historico{i}') for i in range(5)]
+    db.executemany('INSERT INTO pontos (usuario_id, data, tipo, hora) VALUES (?, ?, ?, ?)', [
+        (usuario_id, data, tipo, '08:00:00') for usuario_id in employees for data in DAYS for tipo in PUNCH_TYPES
+    ])
+    db.commit()
+    return [row[0] for row in db.execute('''
+        SELECT id FROM pontos WHERE data BETWEEN ? AND ? ORDER BY data DESC, hora DESC, id DESC
+    ''', (DAYS[0], DAYS[-1]))]
+
+
+def test_pages_walk_ties_without_gaps_or_duplicates(db, tied_punches):
+    seen, cursor = [], None
+    while True:
+        punches, cursor = history_page(db, FILTERS, cursor, limit=7)
+        seen.extend(punch['id'] for punch in punches)
+        if cursor is None:
+            break
+    assert len(tied_punches) == 60
+    assert seen == tied_punches
+
+
+def test_page_route_follows_the_cursor(admin_client, tied_punches):
+    seen, cursor = [], ''
+    while cursor is not None:
+        page = admin_client.get('/punch_history/page', query_string={
+            'start_date': DAYS[0], 'end_date': DAYS[-1], 'limit': 25, 'cursor': cursor}).get_json()
+        seen.extend(punch['id'] for punch in page['pontos'])
+        cursor = page['proximo_cursor']
+    assert seen == tied_punches
+
+
+@pytest.mark.parametrize('cursor', [
+    'não é base64',
+    base64.urlsafe_b64encode(b'{"data": 1}').decode(),
+    base64.urlsafe_b64encode(json.dumps(['2017-01-02', '08:00:00', 'x']).encode()).decode(),
+])
+def test_malformed_cursor_is_rejected(db, admin_client, cursor):
+    with pytest.raises(ValueError):
+        history_page(db, FILTERS, cursor)
+    response = admin_client.get('/punch_history/page', query_string={'cursor': cursor})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Cursor de paginação inválido!'}
+
+
+def test_history_renders_the_punch_types(admin_client, tied_punches):
+    html = admin_client.get('/punch_history', query_string={'start_date': DAYS[0]}).get_data(as_text=True)
+    for tipo in PUNCH_TYPES:
+        assert f'<option value="{tipo}"' in html
+    assert 'Saída Almoço' in html
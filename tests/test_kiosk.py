@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+
+import kiosk
+from report_cache import ReportCache
+
+
+def version(db, key):
+    row = db.execute('SELECT versao FROM versoes_datas WHERE data = ?', (key,)).fetchone()
+    return row[0] if row else 0
+
+
+def test_kiosk_changes_keep_report_cache(db, make_employee):
+    usuario_id = make_employee('quiosque1')
+    cache = ReportCache()
+    cache.get(db, 'relatorio', '2022-01-01', '2022-01-31', lambda: 'janeiro')
+    cache.get(db, 'historico', None, None, lambda: 'tudo')
+    users_version = version(db, '*')
+
+    db.execute("INSERT INTO dispositivos_quiosque (id, nome) VALUES ('d1', 'Portaria')")
+    db.execute("INSERT INTO credenciais_quiosque (usuario_id, cracha, pin_hash) VALUES (?, 'Q1', 'x')",
+               (usuario_id,))
+    db.commit()
+
+    assert version(db, '*') == users_version
+    assert version(db, 'quiosque') > 0
+    assert cache.get(db, 'relatorio', '2022-01-01', '2022-01-31', lambda: 'recalculado') == 'janeiro'
+    assert cache.get(db, 'historico', None, None, lambda: 'recalculado') == 'tudo'
+    assert cache.invalidations == 0
+
+
+def test_kiosk_caches_follow_their_version_keys(db, make_employee):
+    usuario_id = make_employee('quiosque2')
+    credentials = kiosk.UserCache(check_interval=1e-9, version_keys=kiosk.credential_cache.version_keys)
+    devices = kiosk.UserCache(check_interval=1e-9, version_keys=kiosk.device_cache.version_keys)
+    for cache in (credentials, devices):
+        cache.check_version(lambda: db)
+        cache.put('chave', 'valor')
+
+    db.execute("INSERT INTO credenciais_quiosque (usuario_id, cracha, pin_hash) VALUES (?, 'Q2', 'x')",
+               (usuario_id,))
+    db.commit()
+    for cache in (credentials, devices):
+        cache._checked_at = 0
+        cache.check_version(lambda: db)
+        assert cache.get('chave') is None
+        cache.put('chave', 'valor')
+
+    # A user change reaches the credentials (they carry the name), not the devices
+    db.execute("UPDATE usuarios SET nome = 'Outro' WHERE id = ?", (usuario_id,))
+    db.commit()
+    for cache in (credentials, devices):
+        cache._checked_at = 0
+        cache.check_version(lambda: db)
+    assert credentials.get('chave') is None
+    assert devices.get('chave') == 'valor'
+
+
+def test_failures_are_bounded_and_expire(monkeypatch):
+    monkeypatch.setattr(kiosk, 'KIOSK_MAX_TRACKED_BADGES', 3)
+    monkeypatch.setattr(kiosk, '_failures', kiosk.OrderedDict())
+    clock = [1000.0]
+    monkeypatch.setattr(kiosk, 'time', SimpleNamespace(monotonic=lambda: clock[0]))
+
+    for cracha in ('A', 'B', 'C', 'D'):
+        kiosk.record_failure(cracha)
+    assert list(kiosk._failures) == ['B', 'C', 'D']
+
+    for _ in range(kiosk.KIOSK_MAX_PIN_ATTEMPTS):
+        kiosk.record_failure('C')
+    assert kiosk.is_locked('C')
+    assert list(kiosk._failures) == ['B', 'C', 'D']
+
+    clock[0] += kiosk.KIOSK_LOCKOUT_SECONDS + 1
+    assert not kiosk.is_locked('C')
+    assert not kiosk._failures
@@ -0,0 +1,80 @@
+import math
+
+from archive import archive_year
+from punch_store import PUNCH_TYPES, day_number, load_punches
+
+ARCHIVED_YEAR = 2012
+
+PUNCHES = [
+    (0, '2012-03-01', 'entrada', '08:00:00', None),
+    (0, '2012-03-01', 'saida_final', '17:00:59', 'saiu mais cedo'),
+    (1, '2012-03-01', 'entrada', '07:45:10', None),
+    (1, '2012-12-31', 'saida_almoco', '12:00:00', ''),
+    (0, '2013-01-02', 'entrada', '09:15:00', 'trânsito'),
+    (0, '2013-01-02', 'saida_almoco', '12:30:00', None),
+    (0, '2013-01-02', 'volta_almoco', '13:30:00', None),
+    (1, '2013-01-03', 'saida_final', '23:59:59', None),
+]
+# Registered after the year was archived: read from the hot table and the archive together
+LATE_PUNCH = (1, '2012-12-31', 'volta_almoco', '13:00:00', 'lançado depois')
+
+SELECT_SQL = '''
+    SELECT usuario_id, data, tipo, substr(hora, 1, 5), NULLIF(observacao, '')
+    FROM {pontos}
+    WHERE usuario_id BETWEEN ? AND ? AND data BETWEEN ? AND ?
+'''
+
+
+def insert(db, employees, punches):
+    db.executemany('INSERT INTO pontos (usuario_id, data, tipo, hora, observacao) VALUES (?, ?, ?, ?, ?)',
+                   [(employees[index], *punch) for index, *punch in punches])
+    db.commit()
+
+
+def column_rows(punches):
+    return sorted((punch['usuario_id'], day.isoformat(), punch['tipo'], punch['hora'], punch['observacao'])
+                  for day, day_punches in punches.by_day() for punch in day_punches)
+
+
+def test_columns_match_the_rows(db, make_employee):
+    employees = [make_employee('colunas1'), make_employee('colunas2')]
+    id_range = (min(employees), max(employees))
+    insert(db, employees, PUNCHES)
+    archive_year(db, ARCHIVED_YEAR)
+    insert(db, employees, [LATE_PUNCH])
+
+    archive = db.execute('SELECT arquivo FROM arquivos_pontos WHERE ano = ?', (ARCHIVED_YEAR,)).fetchone()[0]
+    db.execute('ATTACH DATABASE ? AS teste_arquivo', (archive,))
+    try:
+        rows = (db.execute(SELECT_SQL.format(pontos='main.pontos'), (*id_range, '2012-01-01', '2013-12-31')).fetchall()
+                + db.execute(SELECT_SQL.format(pontos='teste_arquivo.pontos'),
+                             (*id_range, '2012-01-01', '2012-12-31')).fetchall())
+    finally:
+        db.execute('DETACH DATABASE teste_arquivo')
+    expected = sorted(tuple(row) for row in rows)
+    assert len(expected) == len(PUNCHES) + 1
+
+    punches = load_punches(db, '2012-01-01', '2013-12-31', id_range=id_range, observations=True)
+    assert column_rows(punches) == expected
+
+    # One employee, a period that starts inside the archived year
+    punches = load_punches(db, '2012-12-01', '2013-01-02', employee_id=employees[1], observations=True)
+    assert column_rows(punches) == [row for row in expected
+                                    if row[0] == employees[1] and '2012-12-01' <= row[1] <= '2013-01-02']
+
+    # Without observations only the times are read
+    assert all(row[4] is None for row in column_rows(load_punches(db, '2012-01-01', '2013-12-31',
+                                                                  id_range=id_range)))
+
+
+def test_matrix_places_every_punch(db, make_employee):
+    employees = [make_employee('colunas3'), make_employee('colunas4')]
+    insert(db, employees, PUNCHES)
+
+    first_day = day_number('2013-01-01')
+    times = load_punches(db, '2013-01-01', '2013-01-03', id_range=(min(employees), max(employees))).matrix(
+        employees, first_day, 3)
+    assert times.shape == (2, 3, 4)
+    assert times[0, 1, PUNCH_TYPES.index('entrada')] == 9 * 3600 + 15 * 60
+    assert times[1, 2, PUNCH_TYPES.index('saida_final')] == 23 * 3600 + 59 * 60 + 59
+    assert sum(not math.isnan(value) for value in times.ravel()) == 4
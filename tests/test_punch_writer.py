@@ -0,0 +1,33 @@
+import sqlite3
+
+import pytest
+
+import punch_writer
+from database import pool
+
+
+class FlakyPool:
+    """Fails the first ``failures`` acquires, then hands out real connections"""
+
+    def __init__(self, failures):
+        self.failures = failures
+
+    def acquire(self):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError('connection pool exhausted')
+        return pool.acquire()
+
+
+def test_failed_connection_fails_the_batch_and_retries(monkeypatch, make_employee):
+    usuario_id = make_employee('grupo1')
+    monkeypatch.setattr(punch_writer, 'pool', FlakyPool(failures=1))
+    writer = punch_writer.PunchWriter()
+    params = {'usuario_id': usuario_id, 'data': '2018-02-01', 'hora': '08:00:00', 'observacao': ''}
+
+    with pytest.raises(sqlite3.OperationalError, match='exhausted'):
+        writer.submit(params).result(timeout=5)
+
+    # The thread survived and opens the connection on the next batch
+    assert writer.insert(params, timeout=5)['tipo'] == 'entrada'
+    assert writer.stats()['batches'] == 2
@@ -0,0 +1,70 @@
+import sqlite3
+import threading
+
+import pytest
+
+from punch_store import PUNCH_TYPES
+from routes import insert_next_punch
+
+
+def day_punches(db, usuario_id):
+    return [row[0] for row in db.execute(
+        'SELECT tipo FROM pontos WHERE usuario_id = ? ORDER BY id', (usuario_id,))]
+
+
+def test_punches_follow_the_day_sequence(app, db, make_employee):
+    usuario_id = make_employee('sequencia1')
+    with app.test_request_context():
+        for tipo in PUNCH_TYPES:
+            assert insert_next_punch(usuario_id)['tipo'] == tipo
+        # The day is complete: a fifth punch inserts nothing
+        assert insert_next_punch(usuario_id) is None
+    assert day_punches(db, usuario_id) == list(PUNCH_TYPES)
+
+
+def test_punch_route_rejects_a_fifth_punch(app, db, make_employee):
+    usuario_id = make_employee('sequencia2')
+    client = app.test_client()
+    client.post('/login', data={'login': 'sequencia2', 'password': 'senha'})
+    for _ in PUNCH_TYPES:
+        client.post('/punch')
+
+    response = client.post('/punch', follow_redirects=True)
+    assert 'Todos os pontos do dia já foram registrados!' in response.get_data(as_text=True)
+    assert day_punches(db, usuario_id) == list(PUNCH_TYPES)
+
+
+def test_same_punch_type_is_unique(db, make_employee):
+    usuario_id = make_employee('sequencia3')
+    db.execute("INSERT INTO pontos (usuario_id, data, tipo, hora) VALUES (?, '2018-03-01', 'entrada', '08:00:00')",
+               (usuario_id,))
+    with pytest.raises(sqlite3.IntegrityError):
+        db.execute("INSERT INTO pontos (usuario_id, data, tipo, hora) VALUES (?, '2018-03-01', 'entrada', '08:01:00')",
+                   (usuario_id,))
+    db.rollback()
+
+
+def test_concurrent_punches_insert_each_type_once(app, db, make_employee):
+    usuario_id = make_employee('sequencia4')
+    workers = 8
+    barrier = threading.Barrier(workers)
+    results = []
+
+    def punch():
+        with app.test_request_context():
+            barrier.wait()
+            try:
+                inserted = insert_next_punch(usuario_id)
+                results.append(inserted['tipo'] if inserted else None)
+            except sqlite3.IntegrityError:
+                results.append('duplicado')
+
+    threads = [threading.Thread(target=punch) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(day_punches(db, usuario_id)) == sorted(PUNCH_TYPES)
+    assert sorted(tipo for tipo in results if tipo in PUNCH_TYPES) == sorted(PUNCH_TYPES)
+    assert len(results) == workers
@@ -0,0 +1,66 @@
+from report_cache import ReportCache
+
+RANGES = {
+    'janeiro': ('2016-01-01', '2016-01-31'),
+    'fevereiro': ('2016-02-01', '2016-02-29'),
+    'marco': ('2016-03-01', '2016-03-31'),
+    'desde_15_02': ('2016-02-15', None),
+    'tudo': (None, None),
+}
+
+
+def recomputed(db, cache):
+    """Reads every range through the cache; returns the ones that had to be computed again"""
+    computed = set()
+    for key, (start, end) in RANGES.items():
+        cache.get(db, key, start, end, lambda key=key: computed.add(key) or key)
+    return computed
+
+
+def test_changes_evict_only_overlapping_ranges(db, make_employee):
+    usuario_id = make_employee('cache_relatorio1')
+    cache = ReportCache()
+    assert recomputed(db, cache) == set(RANGES)
+    assert recomputed(db, cache) == set()
+
+    cursor = db.execute("INSERT INTO pontos (usuario_id, data, tipo, hora) VALUES (?, '2016-02-10', 'entrada', '08:00:00')",
+                        (usuario_id,))
+    db.commit()
+    assert recomputed(db, cache) == {'fevereiro', 'tudo'}
+
+    # Moving a punch touches its old and its new date
+    db.execute("UPDATE pontos SET data = '2016-03-05' WHERE id = ?", (cursor.lastrowid,))
+    db.commit()
+    assert recomputed(db, cache) == {'fevereiro', 'marco', 'desde_15_02', 'tudo'}
+
+    db.execute("UPDATE pontos SET hora = '08:05:00' WHERE id = ?", (cursor.lastrowid,))
+    db.commit()
+    assert recomputed(db, cache) == {'marco', 'desde_15_02', 'tudo'}
+
+    db.execute('DELETE FROM pontos WHERE id = ?', (cursor.lastrowid,))
+    db.commit()
+    assert recomputed(db, cache) == {'marco', 'desde_15_02', 'tudo'}
+
+    # A user change can alter any report
+    db.execute("UPDATE usuarios SET nome = 'Outro Nome' WHERE id = ?", (usuario_id,))
+    db.commit()
+    assert recomputed(db, cache) == set(RANGES)
+    assert recomputed(db, cache) == set()
+
+
+def test_put_skips_values_computed_before_a_change(db, make_employee):
+    usuario_id = make_employee('cache_relatorio2')
+    cache = ReportCache()
+    hit, value, version = cache.lookup(db, 'fevereiro')
+    assert not hit
+
+    # Another request syncs a February change while this one was computing
+    db.execute("INSERT INTO pontos (usuario_id, data, tipo, hora) VALUES (?, '2016-02-20', 'entrada', '08:00:00')",
+               (usuario_id,))
+    db.commit()
+    cache.sync(db)
+
+    cache.put('fevereiro', '2016-02-01', '2016-02-29', 'antigo', version)
+    cache.put('janeiro', '2016-01-01', '2016-01-31', 'janeiro', version)
+    assert cache.lookup(db, 'fevereiro')[0] is False
+    assert cache.lookup(db, 'janeiro')[:2] == (True, 'janeiro')
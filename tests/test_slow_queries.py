@@ -0,0 +1,34 @@
+import pytest
+
+from database import full_scans, log_slow_query, slow_queries
+
+
+def logged(db, sql, params=()):
+    log_slow_query(db, sql, params, 0.5)
+    return slow_queries[-1]
+
+
+@pytest.mark.parametrize('sql, params', [
+    ('SELECT * FROM pontos WHERE data = ?', ('2024-01-02',)),
+    ('SELECT usuario_id, tipo, hora FROM pontos WHERE data BETWEEN ? AND ? ORDER BY data, hora',
+     ('2024-01-01', '2024-01-31')),
+    ('SELECT 1', ()),
+    ('SELECT * FROM (SELECT data, COUNT(*) FROM pontos WHERE data >= ? GROUP BY data LIMIT 5) s',
+     ('2024-01-01',)),
+    ('SELECT * FROM (SELECT 1 UNION ALL SELECT 2)', ()),
+])
+def test_indexed_queries_are_not_full_scans(db, sql, params):
+    entry = logged(db, sql, params)
+    assert entry['plan']
+    assert entry['full_scan'] is False
+
+
+def test_unindexed_table_scan_is_flagged(db):
+    entry = logged(db, 'SELECT * FROM pontos WHERE observacao = ?', ('Trânsito',))
+    assert entry['full_scan'] is True
+
+
+def test_full_scans_reads_plan_steps():
+    plan = ['CO-ROUTINE s', 'SCAN p USING COVERING INDEX idx_pontos_data_hora', 'SCAN s',
+            'SCAN CONSTANT ROW', 'SCAN u']
+    assert full_scans(plan) == ['SCAN u']
@@ -0,0 +1,78 @@
+"""Timesheet metrics checked against a week computed by hand.
+
+Semantics, with the default 08:00 / 480 min schedule Monday to Friday:
+
+- minutos_trabalhados: entrada -> saida_almoco plus volta_almoco ->
+  saida_final; without lunch punches, entrada -> saida_final.
+- Daily balance: worked minus due. Balances within DAILY_TOLERANCE_MINUTES
+  (10) count as zero. Days with nothing due (Saturday, Sunday, holidays)
+  have a balance equal to the worked time.
+- minutos_extras: sum of the positive daily balances.
+- minutos_devidos: sum of the negative daily balances, so an absence owes
+  the whole day.
+- saldo_minutos (hour bank): minutos_extras - minutos_devidos.
+- minutos_atraso / dias_atraso: minutes after the scheduled entry on due
+  days, when more than LATE_TOLERANCE_MINUTES (5). Lateness is reported on
+  its own and is not deducted again from the balance: the balance already
+  reflects any time that was not worked, and a late entry made up by
+  leaving later (Monday below) nets to zero.
+"""
+from datetime import date
+
+import numpy as np
+
+from timesheet import DEFAULT_WORK_SCHEDULE, WorkCalendar, daily_metrics, minutes, timesheet_summary
+
+WEEK = ('2025-06-02', '2025-06-08')  # Monday to Sunday, no national holiday
+
+PUNCHES = {
+    # Late by 20 minutes, made up at the end of the day: balance 0
+    '2025-06-02': ('08:20:00', '12:00:00', '13:00:00', '17:20:00'),
+    # No lunch break: 540 worked, +60
+    '2025-06-03': ('08:00:00', None, None, '17:00:00'),
+    # 2025-06-04 and 2025-06-05: absent, -480 each
+    # 3 minutes late and +5 at the end of the day: both within tolerance
+    '2025-06-06': ('08:03:00', '12:00:00', '13:00:00', '17:08:00'),
+    # Saturday shift, nothing due: +240
+    '2025-06-07': ('08:00:00', None, None, '12:00:00'),
+}
+
+EXPECTED = {
+    'dias_trabalhados': 4,
+    'dias_com_registro': 4,
+    'total_pontos': 12,
+    'dias_uteis': 5,
+    'faltas': 2,
+    'dias_atraso': 1,
+    'minutos_trabalhados': 480 + 540 + 485 + 240,
+    'minutos_almoco': 60 + 60,
+    'minutos_extras': 60 + 240,
+    'minutos_devidos': 480 + 480,
+    'minutos_atraso': 20,
+    'saldo_minutos': 300 - 960,
+    'frequencia': 60.0,
+}
+
+
+def test_week_matches_hand_computed_totals(db, make_employee):
+    usuario_id = make_employee('semana1', created_at='2025-01-01 00:00:00')
+    types = ('entrada', 'saida_almoco', 'volta_almoco', 'saida_final')
+    db.executemany('INSERT INTO pontos (usuario_id, data, tipo, hora) VALUES (?, ?, ?, ?)', [
+        (usuario_id, day, tipo, hora)
+        for day, horas in PUNCHES.items()
+        for tipo, hora in zip(types, horas) if hora
+    ])
+    db.commit()
+
+    calendar = WorkCalendar(DEFAULT_WORK_SCHEDULE, holidays=())
+    [row] = timesheet_summary(db, *WEEK, usuario_id, today=date(2025, 12, 31), calendar=calendar)
+    assert {name: row[name] for name in EXPECTED} == EXPECTED
+
+
+def test_short_day_beyond_tolerance_is_owed():
+    # One due day: 08:00-12:00, 13:00-16:30 is 450 worked, 30 owed
+    times = np.array([[[8 * 3600, 12 * 3600, 13 * 3600, 16.5 * 3600]]])
+    daily = daily_metrics(times, due=np.array([480 * 60]), starts=np.array([8 * 3600]), admitted=np.array([0]))
+    assert minutes(daily['worked'][0, 0]) == 450
+    assert minutes(daily['balance'][0, 0]) == -30
+    assert daily['late'][0, 0] == 0
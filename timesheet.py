@@ -0,0 +1,279 @@
+"""Apuração de horas: trabalhadas, almoço, extras, atrasos e banco de horas.
+
+Os pontos do período são lidos em colunas de inteiros (funcionário, dia,
+tipo e segundos desde a meia-noite, punch_store.py) e espalhados em uma matriz
+funcionários x dias x 4 tipos. Todas as métricas saem de operações NumPy
+sobre essa matriz, sem laço em Python por ponto ou por dia.
+
+A jornada esperada de cada dia vem do calendário (WorkCalendar): a jornada
+semanal WORK_SCHEDULE menos os feriados nacionais e os de HOLIDAYS,
+pré-calculada por período. Dias depois de hoje, e os anteriores ao cadastro
+do funcionário, não contam como devidos.
+
+As regras de tolerância seguem a CLT (art. 58, § 1º): atrasos de até
+LATE_TOLERANCE_MINUTES na entrada e saldos diários de até
+DAILY_TOLERANCE_MINUTES não são computados.
+
+O saldo do dia é trabalhadas menos devidas; as horas extras e as devidas do
+período somam os saldos positivos e os negativos (uma falta deve o dia
+inteiro) e o banco de horas é a diferença. O atraso é informado à parte e
+não é descontado de novo do saldo, que já reflete o tempo não trabalhado.
+
+Aqui também fica o fuso horário de Brasília (BRASIL_TZ, brasilia_today),
+usado pelas rotas para saber que dia é hoje. O NumPy só é importado quando a
+primeira apuração roda, para não pesar na inicialização dos workers.
+"""
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+
+from punch_store import day_number, load_punches
+
+# Jornada por dia da semana (0 = segunda): (horário de entrada, minutos devidos).
+# Pode ser trocada com WORK_SCHEDULE='{"0": ["08:00", 480], ..., "5": ["08:00", 240]}'
+DEFAULT_WORK_SCHEDULE = {weekday: ('08:00', 480) for weekday in range(5)}
+WORK_SCHEDULE = DEFAULT_WORK_SCHEDULE
+if os.environ.get('WORK_SCHEDULE'):
+    WORK_SCHEDULE = {int(weekday): tuple(day) for weekday, day in json.loads(os.environ['WORK_SCHEDULE']).items()}
+
+# Feriados além dos nacionais (estaduais, municipais, pontes), em YYYY-MM-DD separados por vírgula
+HOLIDAYS = frozenset(day.strip() for day in os.environ.get('HOLIDAYS', '').split(',') if day.strip())
+
+LATE_TOLERANCE_MINUTES = int(os.environ.get('LATE_TOLERANCE_MINUTES', 5))
+DAILY_TOLERANCE_MINUTES = int(os.environ.get('DAILY_TOLERANCE_MINUTES', 10))
+
+# Funcionários x dias apurados por vez (cada célula ocupa ~100 bytes entre a matriz e as métricas)
+TIMESHEET_BLOCK_CELLS = int(os.environ.get('TIMESHEET_BLOCK_CELLS', 1_000_000))
+
+# Feriados nacionais de data fixa (mês, dia); a Sexta-feira Santa é calculada pela Páscoa
+FIXED_HOLIDAYS = ((1, 1), (4, 21), (5, 1), (9, 7), (10, 12), (11, 2), (11, 15), (11, 20), (12, 25))
+
+# Fuso horário do Brasil (UTC-3), para saber até que dia a jornada é devida
+BRASIL_TZ = timezone(timedelta(hours=-3))
+
+# Posição de cada tipo de ponto na última dimensão da matriz
+ENTRADA, SAIDA_ALMOCO, VOLTA_ALMOCO, SAIDA_FINAL = range(4)
+
+def easter(year):
+    """Domingo de Páscoa (algoritmo de Meeus/Jones/Butcher)"""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return date(year, month, day)
+
+def parse_clock(value):
+    """'HH:MM' em segundos desde a meia-noite"""
+    hours, minutes = value.split(':')[:2]
+    return int(hours) * 3600 + int(minutes) * 60
+
+def brasilia_today():
+    return datetime.now(BRASIL_TZ).date()
+
+def due_until(end_date_db, today=None):
+    """Último dia do período em que a jornada já é devida (YYYY-MM-DD)"""
+    return min(end_date_db, (today or brasilia_today()).isoformat())
+
+class WorkCalendar:
+    """Jornada esperada por dia, pré-calculada em arrays por período"""
+
+    def __init__(self, schedule=WORK_SCHEDULE, holidays=HOLIDAYS):
+        self.start_seconds = [0] * 7
+        self.due_seconds = [0] * 7
+        for weekday, (start, minutes) in schedule.items():
+            self.start_seconds[weekday] = parse_clock(start)
+            self.due_seconds[weekday] = int(minutes) * 60
+        self.holidays = frozenset(holidays)
+
+    def holidays_between(self, start, end):
+        days = set()
+        for year in range(start.year, end.year + 1):
+            days.update(date(year, month, day) for month, day in FIXED_HOLIDAYS)
+            days.add(easter(year) - timedelta(days=2))
+        days.update(date.fromisoformat(day) for day in self.holidays)
+        return sorted(day for day in days if start <= day <= end)
+
+    @lru_cache(maxsize=128)
+    def arrays(self, start_date_db, end_date_db, due_until_db):
+        """(segundos devidos, horário de entrada) de cada dia do período.
+
+        Os arrays são somente leitura porque ficam em cache.
+        """
+        import numpy as np
+
+        start = np.datetime64(start_date_db, 'D')
+        days = np.arange(start, np.datetime64(end_date_db, 'D') + 1)
+        # 1970-01-01 foi uma quinta-feira (weekday 3)
+        weekdays = (days.astype(np.int64) + 3) % 7
+        due = np.array(self.due_seconds, dtype=np.int64)[weekdays]
+        holidays = np.array(self.holidays_between(date.fromisoformat(start_date_db),
+                                                  date.fromisoformat(end_date_db)), dtype='datetime64[D]')
+        due[np.isin(days, holidays) | (days > np.datetime64(due_until_db, 'D'))] = 0
+        starts = np.array(self.start_seconds, dtype=np.int64)[weekdays]
+        due.setflags(write=False)
+        starts.setflags(write=False)
+        return due, starts
+
+work_calendar = WorkCalendar()
+
+def punch_matrix(db, employee_ids, start_date_db, end_date_db, id_range=None):
+    """Horários (segundos, NaN sem ponto) em uma matriz funcionários x dias x tipos.
+
+    ``id_range`` (menor, maior) restringe a leitura aos pontos desses ids.
+    """
+    employee_id = employee_ids[0] if len(employee_ids) == 1 else None
+    punches = load_punches(db, start_date_db, end_date_db, employee_id, id_range)
+    n_days = (date.fromisoformat(end_date_db) - date.fromisoformat(start_date_db)).days + 1
+    return punches.matrix(employee_ids, day_number(start_date_db), n_days)
+
+def daily_metrics(times, due, starts, admitted):
+    """Métricas por funcionário e dia, em segundos (arrays funcionários x dias).
+
+    ``admitted`` é o índice do dia de cadastro de cada funcionário: antes
+    dele (e do primeiro ponto, para quem foi cadastrado depois de começar)
+    a jornada não é devida.
+    """
+    import numpy as np
+
+    entrada, saida_almoco, volta_almoco, saida_final = (times[..., k] for k in range(4))
+    punched = ~np.isnan(times)
+    punches = punched.sum(axis=2)
+
+    n_days = times.shape[1]
+    first_punch = np.where(punches.any(axis=1), (punches > 0).argmax(axis=1), n_days)
+    admitted = np.minimum(admitted, first_punch)
+    due = np.where(np.arange(n_days) >= admitted[:, None], due, 0)
+
+    # Mesma regra de resumo_diario: sem almoço registrado conta entrada -> saída final
+    no_lunch = np.isnan(saida_almoco) & np.isnan(volta_almoco)
+    split = np.fmax(saida_almoco - entrada, 0) + np.fmax(saida_final - volta_almoco, 0)
+    worked = np.where(no_lunch, np.fmax(saida_final - entrada, 0), split)
+    lunch = np.fmax(volta_almoco - saida_almoco, 0)
+
+    balance = worked - due
+    balance[np.abs(balance) <= DAILY_TOLERANCE_MINUTES * 60] = 0
+
+    late = np.nan_to_num(entrada - starts, nan=0.0)
+    late[(late <= LATE_TOLERANCE_MINUTES * 60) | (due == 0)] = 0
+
+    return {
+        'worked': worked,
+        'lunch': lunch,
+        'balance': balance,
+        'late': late,
+        'punches': punches,
+        'present': punched[..., ENTRADA],
+        'due': due,
+    }
+
+def period_totals(daily):
+    """Soma as métricas diárias por funcionário (segundos e contagens)"""
+    import numpy as np
+
+    workday = daily['due'] > 0
+    balance = daily['balance']
+    return {
+        'dias_trabalhados': daily['present'].sum(axis=1),
+        'dias_com_registro': (daily['punches'] > 0).sum(axis=1),
+        'total_pontos': daily['punches'].sum(axis=1),
+        'dias_uteis': workday.sum(axis=1),
+        'presencas': (workday & daily['present']).sum(axis=1),
+        'faltas': (workday & (daily['punches'] == 0)).sum(axis=1),
+        'dias_atraso': (daily['late'] > 0).sum(axis=1),
+        'minutos_trabalhados': daily['worked'].sum(axis=1),
+        'minutos_almoco': daily['lunch'].sum(axis=1),
+        'minutos_extras': np.fmax(balance, 0).sum(axis=1),
+        'minutos_devidos': np.fmax(-balance, 0).sum(axis=1),
+        'minutos_atraso': daily['late'].sum(axis=1),
+        'saldo_minutos': balance.sum(axis=1),
+    }
+
+def minutes(seconds):
+    return int(round(seconds / 60))
+
+def parse_period(start_date_db, end_date_db):
+    try:
+        return date.fromisoformat(start_date_db), date.fromisoformat(end_date_db)
+    except (TypeError, ValueError):
+        raise ValueError('Período inválido!')
+
+def load_employees(db, employee_id=None):
+    """Colaboradores ordenados por nome (ou só o ``employee_id``), com a data de cadastro"""
+    if employee_id:
+        return db.execute(
+            'SELECT id, nome, funcao, date(created_at) as admissao FROM usuarios WHERE id = ?',
+            (employee_id,)
+        ).fetchall()
+    return db.execute(
+        "SELECT id, nome, funcao, date(created_at) as admissao FROM usuarios "
+        "WHERE perfil = 'colaborador' ORDER BY nome"
+    ).fetchall()
+
+def timesheet_blocks(db, employees, start_date_db, end_date_db, today=None, calendar=work_calendar):
+    """Apura o período em blocos de ids consecutivos, para limitar o tamanho da matriz.
+
+    Gera (members, times, daily): as posições dos funcionários do bloco em
+    ``employees``, a matriz de horários e as métricas de daily_metrics.
+    """
+    import numpy as np
+
+    start, end = parse_period(start_date_db, end_date_db)
+    if not employees or start > end:
+        return
+
+    due, starts = calendar.arrays(start_date_db, end_date_db, due_until(end_date_db, today))
+    ids = [employee['id'] for employee in employees]
+    admitted = np.array([(date.fromisoformat(employee['admissao']) - start).days
+                         if employee['admissao'] else 0 for employee in employees])
+    order = sorted(range(len(ids)), key=ids.__getitem__)
+    block = max(1, TIMESHEET_BLOCK_CELLS // len(due))
+    for first in range(0, len(order), block):
+        members = order[first:first + block]
+        block_ids = [ids[i] for i in members]
+        id_range = (block_ids[0], block_ids[-1]) if len(members) < len(order) else None
+        times = punch_matrix(db, block_ids, start_date_db, end_date_db, id_range)
+        yield members, times, daily_metrics(times, due, starts, admitted[members])
+
+def summary_row(employee, totals, i):
+    """Linha de totais do funcionário ``i`` a partir dos arrays de period_totals"""
+    row = {'id': employee['id'], 'nome': employee['nome'], 'funcao': employee['funcao']}
+    for name, values in totals.items():
+        value = values[i].item()
+        row[name] = minutes(value) if name.startswith(('minutos', 'saldo')) else int(value)
+    row['frequencia'] = round(row.pop('presencas') / row['dias_uteis'] * 100, 1) if row['dias_uteis'] else 0
+    return row
+
+def timesheet_summary(db, start_date_db, end_date_db, employee_id=None, today=None, calendar=work_calendar):
+    """Totais do período por colaborador (ou só do ``employee_id``), ordenados por nome.
+
+    Cada linha traz nome, funcao, dias_trabalhados, dias_com_registro,
+    total_pontos, dias_uteis, faltas, dias_atraso, frequencia (% dos dias
+    úteis com entrada) e, em minutos, minutos_trabalhados, minutos_almoco,
+    minutos_extras, minutos_devidos, minutos_atraso e saldo_minutos (o banco
+    de horas do período). Levanta ValueError para datas inválidas.
+    """
+    import numpy as np
+
+    employees = load_employees(db, employee_id)
+
+    totals = {}
+    for members, times, daily in timesheet_blocks(db, employees, start_date_db, end_date_db,
+                                                  today, calendar):
+        for name, values in period_totals(daily).items():
+            totals.setdefault(name, np.zeros(len(employees)))[members] = values
+    if not totals:
+        return []
+    return [summary_row(employee, totals, i) for i, employee in enumerate(employees)]
+
+def format_minutes(value):
+    """Minutos como H:MM, com sinal quando negativo (banco de horas)"""
+    sign = '-' if value < 0 else ''
+    hours, mins = divmod(abs(int(value)), 60)
+    return f'{sign}{hours}:{mins:02d}'